@@ -2,8 +2,10 @@ from django.contrib import admin
 
 
 from django.contrib import admin
+from django.db import transaction
 
-from api.models import GarbageReport, WorkerProfile
+from api import transitions
+from api.models import GarbageReport, WorkerProfile, ZoneNotification
 
 @admin.register(WorkerProfile)
 class WorkerProfileAdmin(admin.ModelAdmin):
@@ -17,4 +19,23 @@ class GarbageReportAdmin(admin.ModelAdmin):
     list_filter = ('status', 'zone', 'reported_at')
     search_fields = ('user__username', 'description')
     readonly_fields = ('reported_at', 'completed_at')
+    actions = ['unlink_duplicates']
+
+    @admin.action(description='Reopen selected duplicates as reports of their own')
+    def unlink_duplicates(self, request, queryset):
+        reopened = 0
+        for report in queryset.filter(duplicate_of__isnull=False, status='CLOSED'):
+            try:
+                with transaction.atomic():
+                    transitions.unlink_duplicate(report)
+                reopened += 1
+            except transitions.TransitionConflict:
+                pass
+        self.message_user(request, f'Reopened {reopened} report(s)')
+
+@admin.register(ZoneNotification)
+class ZoneNotificationAdmin(admin.ModelAdmin):
+    list_display = ('report', 'zone', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'zone')
+    readonly_fields = ('created_at', 'sent_at')
 # Register your models here.
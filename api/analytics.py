@@ -0,0 +1,117 @@
+"""
+Per-zone and per-worker dashboard figures, read from the rollup tables in
+api/rollups.py. Each query touches one row per day/zone/worker/status (or
+bucket), so the cost doesn't grow with the number of reports.
+"""
+from collections import defaultdict
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DailyCompletionRollup, DailyStatusRollup, WorkerProfile
+from .rollups import UNASSIGNED, percentile
+
+OPEN_STATUSES = ('SENT', 'RECEIVED', 'IN_PROGRESS')
+
+
+def _in_range(queryset, start, end):
+    if start:
+        queryset = queryset.filter(day__gte=start)
+    if end:
+        queryset = queryset.filter(day__lte=end)
+    return queryset
+
+
+def _hours(value):
+    return round(value, 1) if value is not None else None
+
+
+def summarize(statuses, histogram, backlog, today):
+    open_reports = sum(backlog.values())
+    return {
+        'statuses': dict(statuses),
+        'total': sum(statuses.values()),
+        'completed': sum(histogram.values()),
+        'median_hours_to_complete': _hours(percentile(histogram, 0.5)),
+        'p90_hours_to_complete': _hours(percentile(histogram, 0.9)),
+        'backlog': {
+            'open': open_reports,
+            'oldest_days': (today - min(backlog)).days if open_reports else None,
+            'mean_age_days': (
+                round(sum((today - day).days * count for day, count in backlog.items()) / open_reports, 1)
+                if open_reports else None
+            ),
+        },
+    }
+
+
+def zone_analytics(start=None, end=None):
+    """
+    Status counts of reports reported between start and end, time to
+    complete of reports completed between start and end, and the current
+    backlog of open reports, per zone and per worker
+    """
+    statuses = {'zone': defaultdict(lambda: defaultdict(int)), 'worker': defaultdict(lambda: defaultdict(int))}
+    histograms = {'zone': defaultdict(lambda: defaultdict(int)), 'worker': defaultdict(lambda: defaultdict(int))}
+    backlogs = {'zone': defaultdict(lambda: defaultdict(int)), 'worker': defaultdict(lambda: defaultdict(int))}
+
+    rows = (
+        _in_range(DailyStatusRollup.objects.all(), start, end)
+        .values_list('zone', 'worker', 'status').annotate(total=Sum('count')).order_by()
+    )
+    for zone, worker, status, total in rows:
+        if not total:
+            continue
+        statuses['zone'][zone][status] += total
+        statuses['worker'][worker][status] += total
+
+    rows = (
+        _in_range(DailyCompletionRollup.objects.all(), start, end)
+        .values_list('zone', 'worker', 'bucket').annotate(total=Sum('count')).order_by()
+    )
+    for zone, worker, bucket, total in rows:
+        histograms['zone'][zone][bucket] += total
+        histograms['worker'][worker][bucket] += total
+
+    # The backlog is what is open now, whenever it was reported
+    rows = (
+        DailyStatusRollup.objects.filter(status__in=OPEN_STATUSES, count__gt=0)
+        .values_list('zone', 'worker', 'day').annotate(total=Sum('count')).order_by()
+    )
+    for zone, worker, day, total in rows:
+        backlogs['zone'][zone][day] += total
+        backlogs['worker'][worker][day] += total
+
+    today = timezone.localdate()
+
+    def entries(level):
+        keys = set(statuses[level]) | set(histograms[level]) | set(backlogs[level])
+        return {
+            key: summarize(statuses[level][key], histograms[level][key], backlogs[level][key], today)
+            for key in keys
+        }
+
+    zones = [{'zone': zone, **summary} for zone, summary in sorted(entries('zone').items())]
+
+    worker_summaries = entries('worker')
+    worker_summaries.pop(UNASSIGNED, None)
+    profiles = WorkerProfile.objects.filter(id__in=worker_summaries).select_related('user').only(
+        'id', 'zone', 'user__username'
+    )
+    names = {profile.id: (profile.user.username, profile.zone) for profile in profiles}
+    workers = [
+        {
+            'worker': worker_id,
+            'username': names.get(worker_id, (None, None))[0],
+            'worker_zone': names.get(worker_id, (None, None))[1],
+            **summary,
+        }
+        for worker_id, summary in sorted(worker_summaries.items())
+    ]
+
+    return {
+        'from': start.isoformat() if start else None,
+        'to': end.isoformat() if end else None,
+        'zones': zones,
+        'workers': workers,
+    }
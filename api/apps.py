@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Parse zone.json once at startup instead of on the first report
+        from .zones import get_zone_index
+        try:
+            get_zone_index()
+        except Exception as e:
+            print(f"Error loading zone index: {str(e)}")
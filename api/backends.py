@@ -0,0 +1,24 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+
+class EmailBackend(ModelBackend):
+    """
+    Log in with email and password, loading the user and their worker
+    profile in one query so the login view needs nothing else.
+
+    Users sharing an email are tried oldest first, as User.objects.get()
+    would otherwise fail for them.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        user = User.objects.select_related('workerprofile').filter(email=email).order_by('id').first()
+        if user is None:
+            # Hash anyway so a missing account takes as long as a wrong password
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,11 @@
+"""
+Benchmarks for the report API's hot paths.
+
+seed fills a database with users, one worker per zone and reports placed
+inside the zone.json polygons; micro times zone lookup, serializer
+rendering and password hashing; load drives the API from several threads
+in-process and reports latency percentiles, throughput and queries per
+request. `manage.py run_benchmarks` runs them all against a throwaway
+database and writes one JSON document, so runs on different commits can
+be compared.
+"""
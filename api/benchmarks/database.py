@@ -0,0 +1,41 @@
+"""Throwaway database for the benchmark commands"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from api.directory import get_zone_directory
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Run the block against a freshly migrated test database, with its own
+    media directory and cache, and destroy them afterwards. Yields the
+    scratch directory.
+    """
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    if connection.vendor == 'sqlite':
+        # A file rather than shared-cache memory, so threads wait on
+        # locks (busy timeout) instead of failing
+        connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    isolated = override_settings(
+        MEDIA_ROOT=os.path.join(workdir, 'media'),
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}},
+        DATABASE_ROUTERS=[],
+        IMAGE_PROCESSING_ASYNC=False,
+    )
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with isolated:
+            get_zone_directory().invalidate_workers()
+            yield workdir
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(workdir, ignore_errors=True)
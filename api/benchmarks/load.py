@@ -0,0 +1,129 @@
+"""
+In-process concurrent load driver.
+
+Each scenario is a function (client, i) -> response for the i-th request.
+drive() spreads the requests over threads, each with its own test client
+and database connection, and records latency, status and the number of
+queries of every request.
+"""
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ..models import GarbageReport
+from .seed import sample_points
+from .stats import summarize
+
+PHOTOS = 8
+
+
+def bearer(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+
+def make_photo(seed, size=(1280, 960)):
+    """A noisy JPEG about the size of a phone upload after resizing"""
+    rng = random.Random(seed)
+    image = Image.effect_noise(size, 64).convert('RGB')
+    image.paste(tuple(rng.randrange(256) for _ in range(3)), (0, 0, size[0] // 2, size[1] // 2))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def scenarios(data, rng, requests):
+    """The benchmarked endpoints, keyed by name, for data returned by seed.seed()"""
+    reporters = [bearer(user) for user in data['users'][:50]]
+    workers = [(bearer(worker.user), worker) for worker in data['workers'].values()]
+    points = sample_points(requests, rng)
+    photos = [make_photo(seed) for seed in range(PHOTOS)]
+
+    # SENT reports to move to IN_PROGRESS, round robin over the workers;
+    # repeats are same-status updates, which are allowed
+    pending = []
+    for headers, worker in workers:
+        ids = GarbageReport.objects.filter(assigned_worker=worker, status='SENT').values_list('id', flat=True)
+        pending.append([(headers, report_id) for report_id in ids[:requests]])
+    updates = [pair for batch in zip(*[p for p in pending if p]) for pair in batch] or [None]
+
+    def create_report(client, i):
+        latitude, longitude, _ = points[i % len(points)]
+        return client.post('/api/reports/', {
+            'image': SimpleUploadedFile(f'bench-{i}.jpg', photos[i % PHOTOS], content_type='image/jpeg'),
+            'description': 'benchmark report',
+            'latitude': latitude,
+            'longitude': longitude,
+        }, secure=True, **reporters[i % len(reporters)])
+
+    def list_reports(client, i):
+        # Alternate reporter and worker lists
+        headers = reporters[i % len(reporters)] if i % 2 else workers[i % len(workers)][0]
+        return client.get('/api/reports/', secure=True, **headers)
+
+    def update_status(client, i):
+        headers, report_id = updates[i % len(updates)]
+        return client.post(
+            f'/api/reports/{report_id}/update_status/', {'status': 'IN_PROGRESS'}, secure=True, **headers
+        )
+
+    def unviewed_reports(client, i):
+        return client.get('/api/unviewed-reports/', secure=True, **workers[i % len(workers)][0])
+
+    result = {
+        'create_report': create_report,
+        'list_reports': list_reports,
+        'update_status': update_status,
+        'unviewed_reports': unviewed_reports,
+    }
+    if updates == [None]:
+        del result['update_status']
+    return result
+
+
+def drive(call, requests, threads):
+    """Run requests calls over threads; returns the latency and query summary"""
+    def run(indices):
+        client = Client()
+        results = []
+        try:
+            for i in indices:
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = call(client, i)
+                    elapsed = (time.perf_counter() - started) * 1000
+                results.append((elapsed, len(queries), response.status_code))
+        finally:
+            connection.close()
+        return results
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = [
+            result
+            for part in pool.map(run, [range(t, requests, threads) for t in range(threads)])
+            for result in part
+        ]
+    elapsed = time.perf_counter() - started
+
+    summary = summarize([ms for ms, _, _ in results], elapsed)
+    summary['errors'] = sum(1 for _, _, code in results if code >= 400)
+    summary['status_codes'] = {str(code): n for code, n in sorted(Counter(c for _, _, c in results).items())}
+    summary['queries_per_request'] = round(statistics.fmean(q for _, q, _ in results), 2)
+    return summary
+
+
+def run(data, rng, requests=200, threads=4):
+    return {
+        name: drive(call, requests, threads)
+        for name, call in scenarios(data, rng, requests).items()
+    }
@@ -0,0 +1,58 @@
+"""Microbenchmarks of single operations on the request path"""
+import time
+
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ..models import GarbageReport
+from ..serializers import GarbageReportSerializer
+from ..views import GarbageReportViewSet
+from .seed import sample_points
+from .stats import summarize
+
+
+def timed(fn, runs):
+    timings = []
+    started = time.perf_counter()
+    for i in range(runs):
+        t0 = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return summarize(timings, time.perf_counter() - started)
+
+
+def determine_zone(rng, runs=5000):
+    """GarbageReport.determine_zone on points inside the zones"""
+    reports = [
+        GarbageReport(latitude=latitude, longitude=longitude)
+        for latitude, longitude, _ in sample_points(runs, rng)
+    ]
+    return timed(lambda i: reports[i].determine_zone(), runs)
+
+
+def serializer_rendering(runs=50, page_size=50):
+    """GarbageReportSerializer over one list page, as the list view renders it"""
+    request = Request(APIRequestFactory().get('/api/reports/', secure=True))
+    page = list(GarbageReportViewSet().base_queryset()[:page_size])
+    result = timed(
+        lambda i: GarbageReportSerializer(page, many=True, context={'request': request}).data, runs
+    )
+    result['page_size'] = len(page)
+    return result
+
+
+def password_hashing(runs=5):
+    """check_password with the default hasher from PASSWORD_HASHERS"""
+    encoded = make_password('bench-password-1')
+    result = timed(lambda i: check_password('bench-password-1', encoded), runs)
+    result['hasher'] = type(get_hasher()).__name__
+    return result
+
+
+def run(rng, scale=1.0):
+    return {
+        'determine_zone': determine_zone(rng, max(int(5000 * scale), 2)),
+        'serializer_rendering': serializer_rendering(max(int(50 * scale), 2)),
+        'password_hashing': password_hashing(max(int(5 * scale), 2)),
+    }
@@ -0,0 +1,93 @@
+"""Reproducible seed data for the benchmarks"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .. import geo, rollups, unviewed
+from ..models import GarbageReport, WorkerProfile
+from ..zones import get_zone_index
+
+PASSWORD = 'bench-password-1'
+BATCH_SIZE = 1000
+# Rough share of reports per status in production
+STATUS_WEIGHTS = {'SENT': 3, 'RECEIVED': 1, 'IN_PROGRESS': 1, 'COMPLETED': 3, 'CLOSED': 4}
+
+
+def sample_points(count, rng):
+    """(latitude, longitude, zone number) uniformly inside the zone polygons"""
+    index = get_zone_index()
+    min_x, min_y, max_x, max_y = index.bbox
+    points = []
+    while len(points) < count:
+        longitude, latitude = rng.uniform(min_x, max_x), rng.uniform(min_y, max_y)
+        zone = index.locate(longitude, latitude)
+        if zone is not None:
+            points.append((latitude, longitude, zone))
+    return points
+
+
+def seed(reports=2000, users=200, days=90, rng=None):
+    """
+    Create users, a worker per zone and reports spread over the last days.
+    Returns {'users': [...], 'workers': {zone: WorkerProfile}, 'reports': count}.
+    """
+    rng = rng or random.Random(0)
+    password = make_password(PASSWORD)  # Hashed once, shared by every user
+
+    reporters = User.objects.bulk_create([
+        User(username=f'bench-user-{i}', email=f'bench-user-{i}@example.com', password=password)
+        for i in range(users)
+    ])
+    zones = sorted({polygon.zone_number for polygon in get_zone_index().polygons})
+    worker_users = User.objects.bulk_create([
+        User(username=f'bench-je-{zone}', email=f'bench-je-{zone}@example.com', password=password)
+        for zone in zones
+    ])
+    workers = {
+        worker.zone: worker
+        for worker in WorkerProfile.objects.bulk_create([
+            WorkerProfile(user=user, zone=zone) for zone, user in zip(zones, worker_users)
+        ])
+    }
+
+    statuses, weights = zip(*STATUS_WEIGHTS.items())
+    now = timezone.now()
+    created = 0
+    points = sample_points(reports, rng)
+    for start in range(0, reports, BATCH_SIZE):
+        batch = []
+        times = []
+        for latitude, longitude, zone in points[start:start + BATCH_SIZE]:
+            status = rng.choices(statuses, weights)[0]
+            reported_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            times.append(reported_at)
+            batch.append(GarbageReport(
+                user=rng.choice(reporters),
+                image='garbage_reports/bench.jpg',
+                description='benchmark report',
+                latitude=latitude,
+                longitude=longitude,
+                geohash=geo.encode(latitude, longitude),
+                zone=f'Zone {zone}',
+                assigned_worker=workers[zone],
+                status=status,
+                is_viewed=status != 'SENT' or rng.random() < 0.5,
+                completed_at=(
+                    min(reported_at + timedelta(hours=rng.uniform(1, 96)), now) if status == 'COMPLETED' else None
+                ),
+                image_hash=f'{rng.getrandbits(64):016x}',
+            ))
+        batch = GarbageReport.objects.bulk_create(batch)
+        # reported_at is auto_now_add, so it is only settable after the insert
+        for report, reported_at in zip(batch, times):
+            report.reported_at = reported_at
+        GarbageReport.objects.bulk_update(batch, ['reported_at'])
+        created += len(batch)
+
+    # bulk_create skips save(): bring the derived counters in line
+    rollups.rebuild()
+    unviewed.recount()
+    return {'users': reporters, 'workers': workers, 'reports': created}
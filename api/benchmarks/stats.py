@@ -0,0 +1,25 @@
+"""Summaries shared by the micro and load benchmarks"""
+import statistics
+
+
+def percentiles(values):
+    """(p50, p95, p99) of a list of numbers"""
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+def summarize(timings_ms, elapsed=None):
+    """Latency percentiles in ms, plus throughput when the wall time is known"""
+    p50, p95, p99 = percentiles(timings_ms)
+    summary = {
+        'runs': len(timings_ms),
+        'mean_ms': round(statistics.fmean(timings_ms), 4),
+        'p50_ms': round(p50, 4),
+        'p95_ms': round(p95, 4),
+        'p99_ms': round(p99, 4),
+    }
+    if elapsed:
+        summary['throughput_per_s'] = round(len(timings_ms) / elapsed, 2)
+    return summary
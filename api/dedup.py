@@ -0,0 +1,93 @@
+"""
+Duplicate report detection.
+
+Each report photo gets a 64-bit difference hash (dHash): the image is
+shrunk to 9x8 grey pixels and each bit says whether a pixel is brighter
+than its right neighbour. Re-encoded, resized or slightly re-framed copies
+of a photo land within a few bits of each other.
+
+A new report is a duplicate of an open, canonical report taken within
+DEDUP_RADIUS metres and DEDUP_WINDOW hours whose hash differs in at most
+DEDUP_MAX_BITS bits. Candidates come from one query on the geohash index
+(the few cells around the point) and the reported_at window, returning
+(id, hash, latitude, longitude) tuples only; hashes are compared as ints
+with XOR and a popcount, so matching costs microseconds per candidate.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import geo, metrics
+
+HASH_SIZE = 8
+RADIUS = getattr(settings, 'DEDUP_RADIUS', 50)  # metres
+WINDOW = timedelta(hours=getattr(settings, 'DEDUP_WINDOW', 72))
+MAX_BITS = getattr(settings, 'DEDUP_MAX_BITS', 10)  # of 64
+MAX_CANDIDATES = 200
+# Reports that still stand for outstanding work
+OPEN_STATUSES = ('SENT', 'RECEIVED', 'IN_PROGRESS')
+
+
+@metrics.timed('image_hash')
+def image_hash(file):
+    """dHash of an image file or path as 16 hex digits, '' if it can't be read"""
+    try:
+        with Image.open(file) as image:
+            # JPEGs decode straight at a fraction of their size
+            image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+            # Upright first, so the hash matches the rotated copy api/images.py stores
+            image = ImageOps.exif_transpose(image)
+            pixels = list(image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS).getdata())
+    except Exception as e:
+        print(f"Error hashing image: {str(e)}")
+        return ''
+    finally:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            value = value << 1 | (left > pixels[row * (HASH_SIZE + 1) + col + 1])
+    return f'{value:016x}'
+
+
+def candidates(latitude, longitude, now=None):
+    """(id, image_hash, latitude, longitude) of open canonical reports near the point"""
+    from .models import GarbageReport
+
+    now = now or timezone.now()
+    return (
+        GarbageReport.objects
+        .filter(
+            geo.bbox_q(*geo.radius_bbox(latitude, longitude, RADIUS)),
+            reported_at__gte=now - WINDOW,
+            reported_at__lt=now,
+            duplicate_of__isnull=True,
+            status__in=OPEN_STATUSES,
+        )
+        .exclude(image_hash='')
+        .order_by('-reported_at')
+        .values_list('id', 'image_hash', 'latitude', 'longitude')[:MAX_CANDIDATES]
+    )
+
+
+def find_duplicate(latitude, longitude, photo_hash, now=None):
+    """Id of the report a submission with this photo hash duplicates, or None"""
+    if not photo_hash:
+        return None
+    value = int(photo_hash, 16)
+    best = None
+    for report_id, other, lat, lng in candidates(latitude, longitude, now):
+        bits = (value ^ int(other, 16)).bit_count()
+        if bits > MAX_BITS:
+            continue
+        distance = geo.distance(latitude, longitude, lat, lng)
+        if distance > RADIUS:
+            continue
+        if best is None or (bits, distance) < best[:2]:
+            best = (bits, distance, report_id)
+    return best[2] if best else None
@@ -0,0 +1,117 @@
+"""
+In-process directory of zone number -> notification email and assigned worker.
+
+Emails come from api/email.json and are reloaded only when the file's mtime
+changes. The zone -> worker mapping is built with one query and dropped by the
+WorkerProfile post_save/post_delete receivers in models.py. The mapping and an
+invalidation version live in the ZONE_DIRECTORY_CACHE cache alias ('default'
+unless set), so every process sharing that cache sees an invalidation made by
+any other process. Set it to None for a purely in-process mapping.
+"""
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+WORKERS_CACHE_KEY = 'zone-directory:workers'
+VERSION_CACHE_KEY = 'zone-directory:version'
+
+
+def get_email_config_path():
+    return getattr(settings, 'ZONE_EMAIL_CONFIG_PATH', os.path.join(settings.BASE_DIR, 'api', 'email.json'))
+
+
+class ZoneDirectory:
+    def __init__(self, email_path=None, cache_alias=None):
+        self.email_path = email_path or get_email_config_path()
+        self.cache_alias = cache_alias
+        self._lock = threading.Lock()
+        self._emails = None
+        self._emails_mtime = None
+        self._workers = None
+        self._workers_version = None
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def _load_emails(self):
+        mtime = os.stat(self.email_path).st_mtime_ns
+        if self._emails is None or mtime != self._emails_mtime:
+            with self._lock:
+                with open(self.email_path, 'r') as f:
+                    config = json.load(f)
+                self._emails = {zone['zone_number']: zone['email'] for zone in config['zones']}
+                self._emails_mtime = mtime
+        return self._emails
+
+    def _query_workers(self):
+        from .models import WorkerProfile
+
+        workers = {}
+        # Deterministic choice when a zone has several workers: the oldest
+        # active worker profile wins
+        for worker_id, zone in (
+            WorkerProfile.objects.order_by('-is_worker', 'id').values_list('id', 'zone')
+        ):
+            workers.setdefault(zone, worker_id)
+        return workers
+
+    def _load_workers(self):
+        cache = self.cache
+        if cache is None:
+            if self._workers is None:
+                with self._lock:
+                    if self._workers is None:
+                        self._workers = self._query_workers()
+            return self._workers
+
+        version = cache.get_or_set(VERSION_CACHE_KEY, time.time_ns, None)
+        if self._workers is None or self._workers_version != version:
+            workers = cache.get(WORKERS_CACHE_KEY, version=version)
+            if workers is None:
+                workers = self._query_workers()
+                cache.set(WORKERS_CACHE_KEY, workers, None, version=version)
+            with self._lock:
+                self._workers = workers
+                self._workers_version = version
+        return self._workers
+
+    def get_email(self, zone_number):
+        return self._load_emails().get(zone_number)
+
+    def get_worker_id(self, zone_number):
+        return self._load_workers().get(zone_number)
+
+    def worker_ids(self):
+        return dict(self._load_workers())
+
+    def invalidate_workers(self):
+        with self._lock:
+            self._workers = None
+            self._workers_version = None
+        cache = self.cache
+        if cache is not None:
+            try:
+                cache.incr(VERSION_CACHE_KEY)
+            except ValueError:
+                cache.set(VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+_zone_directory = None
+_zone_directory_lock = threading.Lock()
+
+
+def get_zone_directory():
+    """Return the process-wide ZoneDirectory"""
+    global _zone_directory
+    if _zone_directory is None:
+        with _zone_directory_lock:
+            if _zone_directory is None:
+                _zone_directory = ZoneDirectory(
+                    cache_alias=getattr(settings, 'ZONE_DIRECTORY_CACHE', 'default')
+                )
+    return _zone_directory
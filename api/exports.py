@@ -0,0 +1,142 @@
+"""
+Streaming exports of reports as CSV, NDJSON or GeoJSON.
+
+Rows are read with values_list(...).iterator(chunk_size=...), so only one
+chunk of plain tuples is in memory at a time; no model or serializer
+instances are built. The writers are generators of text chunks that can
+feed a StreamingHttpResponse or a file.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .routers import read_database
+
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+COLUMNS = [
+    ('id', 'id'),
+    ('reported_at', 'reported_at'),
+    ('status', 'status'),
+    ('zone', 'zone'),
+    ('latitude', 'latitude'),
+    ('longitude', 'longitude'),
+    ('description', 'description'),
+    ('username', 'user__username'),
+    ('worker', 'assigned_worker__user__username'),
+    ('is_viewed', 'is_viewed'),
+    ('completed_at', 'completed_at'),
+    ('worker_notes', 'worker_notes'),
+    ('image', 'image'),
+    ('video', 'video'),
+]
+HEADER = [name for name, _ in COLUMNS]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'geojson': 'application/geo+json',
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def export_queryset(zone=None, status=None, start=None, end=None):
+    """
+    Report rows for the filters, oldest first. start and end are dates,
+    both inclusive, in the site time zone.
+    """
+    from .models import GarbageReport
+
+    reports = GarbageReport.objects.using(read_database()).all()
+    if zone:
+        reports = reports.filter(zone=f'Zone {zone}' if str(zone).isdigit() else zone)
+    if status:
+        if status not in dict(GarbageReport.STATUS_CHOICES):
+            raise ExportError('Invalid status')
+        reports = reports.filter(status=status)
+    # Compare the indexed column against datetimes rather than using __date
+    if start:
+        reports = reports.filter(reported_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        reports = reports.filter(
+            reported_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        )
+    return reports.order_by('reported_at', 'id').values_list(*(source for _, source in COLUMNS))
+
+
+def records(queryset):
+    """Export rows as dicts with JSON friendly values"""
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        record = dict(zip(HEADER, row))
+        for name in ('reported_at', 'completed_at'):
+            if record[name] is not None:
+                record[name] = timezone.localtime(record[name]).isoformat()
+        for name in ('image', 'video'):
+            # Signed URLs, see api/media.py
+            record[name] = default_storage.url(record[name]) if record[name] else None
+        yield record
+
+
+class Echo:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+# Text starting with these is run as a formula when the CSV is opened in a spreadsheet
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADER)
+    for record in records(queryset):
+        yield writer.writerow([csv_cell(record[name]) for name in HEADER])
+
+
+def ndjson_chunks(queryset):
+    for record in records(queryset):
+        yield json.dumps(record) + '\n'
+
+
+def geojson_chunks(queryset):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = '\n'
+    for record in records(queryset):
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [record['longitude'], record['latitude']]},
+            'properties': record,
+        }
+        yield separator + json.dumps(feature)
+        separator = ',\n'
+    yield '\n]}\n'
+
+
+WRITERS = {
+    'csv': csv_chunks,
+    'ndjson': ndjson_chunks,
+    'geojson': geojson_chunks,
+}
+
+
+def stream(output, queryset):
+    if output not in WRITERS:
+        raise ExportError(f"Format must be one of {', '.join(WRITERS)}")
+    return WRITERS[output](queryset)
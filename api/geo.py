@@ -0,0 +1,137 @@
+"""
+Geohash helpers for spatial report queries.
+
+Every report stores the geohash of its location (GarbageReport.geohash,
+computed in save). A bounding box is covered by a handful of geohash cells,
+coarsening the precision until few enough cells are needed, and each cell
+becomes an index range on the geohash column. The exact latitude/longitude
+or distance filter then only runs on rows from those cells.
+"""
+import math
+
+from django.db.models import Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # About 5m x 5m
+MAX_CELLS = 16
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            bounds[0] = mid
+        else:
+            bits = bits * 2
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) of a geohash cell in degrees"""
+    lat_bits = 5 * precision // 2
+    lng_bits = (5 * precision + 1) // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def _span(low, high, origin, size, count):
+    first = min(int((low - origin) // size), count - 1)
+    last = min(int((high - origin) // size), count - 1)
+    return first, last
+
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng, max_cells=MAX_CELLS):
+    """Geohash prefixes that together cover the bounding box"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = _span(min_lat, max_lat, -90.0, height, round(180.0 / height))
+        cols = _span(min_lng, max_lng, -180.0, width, round(360.0 / width))
+        if (rows[1] - rows[0] + 1) * (cols[1] - cols[0] + 1) <= max_cells:
+            break
+
+    cells = set()
+    for row in range(rows[0], rows[1] + 1):
+        for col in range(cols[0], cols[1] + 1):
+            # Encoding the cell's centre gives the cell's own hash
+            cells.add(encode(-90.0 + (row + 0.5) * height, -180.0 + (col + 0.5) * width, precision))
+    return sorted(cells)
+
+
+def cells_q(cells, field='geohash'):
+    """
+    Match rows whose geohash starts with any of the cells. Written as index
+    ranges rather than LIKE, which SQLite can't serve from the index.
+    """
+    q = Q()
+    for cell in cells:
+        q |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '{'})  # '{' sorts after 'z'
+    return q
+
+
+def bbox_q(min_lat, min_lng, max_lat, max_lng):
+    return cells_q(covering_cells(min_lat, min_lng, max_lat, max_lng)) & Q(
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lng, longitude__lte=max_lng,
+    )
+
+
+def radius_bbox(latitude, longitude, radius):
+    """Bounding box around a circle of radius metres"""
+    lat_delta = radius / METERS_PER_DEGREE
+    lng_delta = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (
+        max(latitude - lat_delta, -90.0),
+        max(longitude - lng_delta, -180.0),
+        min(latitude + lat_delta, 90.0),
+        min(longitude + lng_delta, 180.0),
+    )
+
+
+def distance_expression(latitude, longitude):
+    """Haversine distance in metres from the point to each row's location"""
+    lat = Radians('latitude')
+    lat0 = math.radians(latitude)
+    return 2 * EARTH_RADIUS_M * ASin(Sqrt(
+        Power(Sin((lat - lat0) / 2), 2)
+        + math.cos(lat0) * Cos(lat) * Power(Sin((Radians('longitude') - math.radians(longitude)) / 2), 2)
+    ))
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """Haversine distance in metres between two points"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def decode_bbox(geohash):
+    """(min_lat, min_lng, max_lat, max_lng) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lng_range if even else lat_range
+            mid = (bounds[0] + bounds[1]) / 2
+            if bits >> shift & 1:
+                bounds[0] = mid
+            else:
+                bounds[1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count taken from
+    PASSWORD_HASH_ITERATIONS (Django's default when unset).
+
+    The algorithm name is unchanged, so existing hashes keep verifying and
+    are re-hashed at the configured count on the user's next login.
+    """
+    iterations = getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
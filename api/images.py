@@ -0,0 +1,124 @@
+"""
+Ingestion of uploaded report photos.
+
+render_variants works on plain filesystem paths so it can run in a process
+pool: it rotates the photo upright, drops EXIF (GPS, device data),
+recompresses it, and writes a fixed-size WebP thumbnail plus a full-size
+WebP copy next to it under variants/. process_report_images wires the
+results into the report's variant fields.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from . import listcache, metrics, storage
+from .storage import is_blob_name, store_file
+
+MAX_DIMENSION = getattr(settings, 'IMAGE_MAX_DIMENSION', 1920)
+THUMBNAIL_SIZE = getattr(settings, 'IMAGE_THUMBNAIL_SIZE', (320, 320))
+JPEG_QUALITY = getattr(settings, 'IMAGE_JPEG_QUALITY', 82)
+WEBP_QUALITY = getattr(settings, 'IMAGE_WEBP_QUALITY', 80)
+
+# Source image field -> (thumbnail field, webp field)
+VARIANT_FIELDS = {
+    'image': ('image_thumbnail', 'image_webp'),
+    'completion_image': ('completion_thumbnail', 'completion_webp'),
+}
+
+
+def variant_names(name):
+    """Storage names of the thumbnail and WebP copies of an image"""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    variants = os.path.join(directory, 'variants')
+    return (
+        os.path.join(variants, f'{stem}_thumb.webp'),
+        os.path.join(variants, f'{stem}.webp'),
+    )
+
+
+def render_variants(media_root, name):
+    """
+    Normalize the image stored at media_root/name and write its variants.
+    Returns (name, thumbnail_name, webp_name). Plain files are recompressed
+    in place; a blob in content-addressed storage (api/storage.py) can't
+    change, so the result is stored as a new blob and name changes.
+    """
+    path = os.path.join(media_root, name)
+
+    with Image.open(path) as original:
+        source_format = original.format
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        image.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+
+        # Re-encoding without passing exif= drops the metadata. A unique temp
+        # name, as several reports can share one blob.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            if source_format == 'JPEG':
+                image.convert('RGB').save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                image.save(tmp_path, source_format, optimize=True)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        if is_blob_name(name):
+            # Blobs are named by content: the result is a new blob
+            name = store_file(media_root, tmp_path, os.path.splitext(name)[1])
+        else:
+            os.replace(tmp_path, path)
+
+        thumbnail_name, webp_name = variant_names(name)
+        os.makedirs(os.path.dirname(os.path.join(media_root, thumbnail_name)), exist_ok=True)
+
+        image.save(os.path.join(media_root, webp_name), 'WEBP', quality=WEBP_QUALITY, method=4)
+
+        thumbnail = ImageOps.fit(image, THUMBNAIL_SIZE)
+        thumbnail.save(os.path.join(media_root, thumbnail_name), 'WEBP', quality=WEBP_QUALITY, method=4)
+
+    return name, thumbnail_name, webp_name
+
+
+def process_report_images(report, fields=None):
+    """
+    Render variants for the report's photos that don't have them yet and
+    save the variant names. Returns the list of updated fields.
+    """
+    updated = []
+    replaced = set()
+    for source, (thumbnail_field, webp_field) in VARIANT_FIELDS.items():
+        if fields is not None and source not in fields:
+            continue
+        image = getattr(report, source)
+        if not image or getattr(report, thumbnail_field):
+            continue
+        try:
+            with metrics.span('image_variants'):
+                name, thumbnail_name, webp_name = render_variants(settings.MEDIA_ROOT, image.name)
+        except Exception as e:
+            print(f"Error processing {image.name}: {str(e)}")
+            continue
+        if name != image.name and not storage.keep(name):
+            print(f"Error processing {image.name}: result was collected, retrying later")
+            continue
+        if name != image.name:
+            replaced |= {image.name, name}
+            setattr(report, source, name)
+            updated.append(source)
+        setattr(report, thumbnail_field, thumbnail_name)
+        setattr(report, webp_field, webp_name)
+        updated += [thumbnail_field, webp_field]
+
+    if updated:
+        type(report).objects.filter(pk=report.pk).update(
+            **{field: getattr(report, field).name for field in updated}
+        )
+        listcache.invalidate_report(report)
+        storage.release(replaced)
+    return updated
+
@@ -0,0 +1,103 @@
+"""
+Response cache for the report list.
+
+Each list is cached per scope: 'all' for anonymous clients, 'worker:<id>'
+for a worker's assigned reports and 'user:<id>' for a reporter's own. The
+cache key holds the scope's version and the query parameters, so a change
+never has to find and delete cached pages; it bumps the versions of the
+scopes the report appears in ('all', its reporter and its worker) and old
+pages just stop being read. An epoch version in every key drops all of
+them at once, for commands that rewrite reports in bulk.
+
+The key doubles as the ETag, so a client repeating a request with
+If-None-Match gets a 304 after a couple of cache reads, but only while the
+page itself is still cached: LIST_CACHE_TIMEOUT bounds how stale a 304 can
+be. Pages read from the replica are kept for LIST_REPLICA_CACHE_TIMEOUT
+only, since one built just after a bump may predate the change that
+bumped it. Only get, set, add and
+get_many/set_many are used, so any Django cache backend works (locmem in
+tests, Redis or Memcached in production).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import media
+
+TIMEOUT = getattr(settings, 'LIST_CACHE_TIMEOUT', 300)
+REPLICA_TIMEOUT = getattr(settings, 'LIST_REPLICA_CACHE_TIMEOUT', 10)
+EPOCH = 'epoch'
+ANONYMOUS = 'all'
+
+
+def version_key(scope):
+    return f'report-list:version:{scope}'
+
+
+def scopes_for(user_id, worker_id):
+    """Scopes whose lists contain a report with this reporter and worker"""
+    scopes = {ANONYMOUS, f'user:{user_id}'}
+    if worker_id is not None:
+        scopes.add(f'worker:{worker_id}')
+    return scopes
+
+
+def versions(scopes):
+    keys = [version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    for key, value in missing.items():
+        # add() so concurrent first readers agree on one value
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+        found[key] = value
+    return [found[key] for key in keys]
+
+
+def link_bucket(now=None):
+    """
+    Changes every MEDIA_URL_BUCKET seconds, so a page and its ETag are
+    rebuilt while the signed media links in it have most of their TTL left
+    """
+    if not media.SIGNED:
+        return 0
+    return int(now if now is not None else time.time()) // media.URL_BUCKET
+
+
+def page_key(scope, request):
+    """Cache key (and ETag) of one list page for this scope and request"""
+    epoch, version = versions([EPOCH, scope])
+    # Links in the page are absolute, so the host is part of the key
+    params = f'{request.build_absolute_uri("/")}?{request.query_params.urlencode()}'
+    digest = hashlib.sha256(params.encode()).hexdigest()[:32]
+    return f'report-list:{scope}:{epoch}.{version}.{link_bucket()}:{digest}'
+
+
+def etag_for(key):
+    return '"%s"' % hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def bump(scopes):
+    """Give the scopes new versions once the current transaction commits"""
+    keys = [version_key(scope) for scope in scopes]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, None))
+
+
+def invalidate_reports(rows):
+    """rows: (user_id, assigned_worker_id) of the changed reports"""
+    scopes = set()
+    for user_id, worker_id in rows:
+        scopes |= scopes_for(user_id, worker_id)
+    bump(scopes)
+
+
+def invalidate_report(report):
+    invalidate_reports([(report.user_id, report.assigned_worker_id)])
+
+
+def invalidate_all():
+    bump([EPOCH])
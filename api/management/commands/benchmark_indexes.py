@@ -0,0 +1,138 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmarks.database import throwaway_database
+from api.models import GarbageReport, WorkerProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed N reports into a throwaway database and compare query plans and '
+        'timings of the report access patterns without and with the '
+        'GarbageReport indexes. The configured database is never touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=10000, help='Number of reports to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query when timing')
+        parser.add_argument('--no-explain', action='store_true', help='Only print timings')
+
+    def handle(self, *args, **options):
+        if options['reports'] < 1:
+            raise CommandError('--reports must be positive')
+
+        with throwaway_database():
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        worker, reporter = self.seed(options['reports'])
+        queries = self.queries(worker, reporter)
+
+        self.drop_indexes()
+        self.analyze()
+        before = self.run(queries, 'without indexes', options)
+
+        self.create_indexes()
+        self.analyze()
+        after = self.run(queries, 'with indexes', options)
+
+        self.stdout.write('\nSummary (median ms)')
+        for name in queries:
+            self.stdout.write(
+                f"  {name:<22} {before[name]:>9.3f} -> {after[name]:>9.3f}"
+            )
+
+    def seed(self, count):
+        rng = random.Random(0)
+        suffix = int(time.time())
+        users = User.objects.bulk_create([
+            User(username=f'bench-user-{suffix}-{i}', email=f'bench{i}@example.com')
+            for i in range(50)
+        ])
+        worker_users = User.objects.bulk_create([
+            User(username=f'bench-je-{suffix}-{zone}', email=f'je{zone}@example.com')
+            for zone in range(1, 17)
+        ])
+        workers = WorkerProfile.objects.bulk_create([
+            WorkerProfile(user=user, zone=zone)
+            for zone, user in enumerate(worker_users, start=1)
+        ])
+
+        statuses = [choice for choice, _ in GarbageReport.STATUS_CHOICES]
+        batch = []
+        for i in range(count):
+            worker = rng.choice(workers)
+            batch.append(GarbageReport(
+                user=rng.choice(users),
+                image='garbage_reports/bench.jpg',
+                description='benchmark report',
+                latitude=19.13 + rng.random() * 0.01,
+                longitude=72.91 + rng.random() * 0.01,
+                status=rng.choices(statuses, weights=[3, 1, 1, 3, 4])[0],
+                zone=f'Zone {worker.zone}',
+                assigned_worker=worker,
+                is_viewed=rng.random() < 0.7,
+            ))
+            if len(batch) == 1000:
+                GarbageReport.objects.bulk_create(batch)
+                batch = []
+        GarbageReport.objects.bulk_create(batch)
+        self.stdout.write(f'Seeded {count} reports')
+        return workers[0], users[0]
+
+    def queries(self, worker, reporter):
+        recent = ('-reported_at', '-id')
+        return {
+            'anonymous list': lambda: GarbageReport.objects.order_by(*recent)[:50],
+            'worker list': lambda: GarbageReport.objects.filter(assigned_worker=worker).order_by(*recent)[:50],
+            'reporter list': lambda: GarbageReport.objects.filter(user=reporter).order_by(*recent)[:50],
+            'unviewed count': lambda: GarbageReport.objects.filter(
+                assigned_worker=worker, is_viewed=False, status='SENT'
+            ),
+            'admin status filter': lambda: GarbageReport.objects.filter(status='COMPLETED').order_by('-reported_at')[:100],
+            'admin zone filter': lambda: GarbageReport.objects.filter(zone='Zone 1').order_by('-reported_at')[:100],
+        }
+
+    def run(self, queries, label, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {label} =='))
+        medians = {}
+        for name, build in queries.items():
+            if not options['no_explain']:
+                self.stdout.write(f'-- {name}')
+                self.stdout.write(build().explain())
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                if name == 'unviewed count':
+                    build().count()
+                else:
+                    list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            medians[name] = statistics.median(timings)
+            self.stdout.write(f'{name}: median {medians[name]:.3f} ms over {len(timings)} runs')
+        return medians
+
+    # Plain SQL rather than a schema editor context, which SQLite refuses to
+    # open inside a transaction such as a test's
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for index in GarbageReport._meta.indexes:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+
+    def create_indexes(self):
+        schema_editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for index in GarbageReport._meta.indexes:
+                cursor.execute(str(index.create_sql(GarbageReport, schema_editor)))
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'ANALYZE {GarbageReport._meta.db_table}')
+            else:
+                cursor.execute('ANALYZE')
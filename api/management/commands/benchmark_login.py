@@ -0,0 +1,112 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import get_hashers, make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from api import views
+from api.models import WorkerProfile
+
+PASSWORD = 'bench-password-1'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure password verification throughput of each configured hasher, '
+        'serially and from several threads, then time the login view end to end '
+        'against seeded users. The seeded users are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help='Verifications or logins per measurement')
+        parser.add_argument('--threads', type=int, default=4, help='Threads for the concurrent hashing run')
+        parser.add_argument('--users', type=int, default=1000, help='Users to seed for the end to end run')
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1 or options['threads'] < 1 or options['users'] < 1:
+            raise CommandError('--logins, --threads and --users must be positive')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('== Password hashers (PASSWORD_HASHERS) =='))
+        for hasher in get_hashers():
+            self.bench_hasher(hasher, options)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\n== Login view, default hasher =='))
+        try:
+            with transaction.atomic():
+                self.bench_login(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Rolled back seeded users')
+
+    def bench_hasher(self, hasher, options):
+        name = type(hasher).__name__
+        try:
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+        except ValueError as e:
+            # Argon2, bcrypt and friends need optional libraries
+            self.stdout.write(f'{name:<32} skipped: {e}')
+            return
+
+        logins, threads = options['logins'], options['threads']
+        started = time.perf_counter()
+        for _ in range(logins):
+            hasher.verify(PASSWORD, encoded)
+        serial = time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            started = time.perf_counter()
+            list(pool.map(lambda _: hasher.verify(PASSWORD, encoded), range(logins)))
+            threaded = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{name:<32} {serial / logins * 1000:8.2f} ms/verify '
+            f'{logins / serial:8.1f}/s serial {logins / threaded:8.1f}/s with {threads} threads'
+        )
+
+    def bench_login(self, options):
+        suffix = int(time.time())
+        # Hash once; every seeded user shares the password
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create([
+            User(username=f'bench-login-{suffix}-{i}', email=f'bench-login-{suffix}-{i}@example.com',
+                 password=password)
+            for i in range(options['users'])
+        ])
+        WorkerProfile.objects.bulk_create([
+            WorkerProfile(user=user, zone=i % 16 + 1) for i, user in enumerate(users[::10])
+        ])
+        self.stdout.write(f"Seeded {len(users)} users")
+
+        factory = APIRequestFactory()
+        cases = {
+            'user login': ('user', users[1]),
+            'worker login': ('worker', users[0]),
+        }
+        for label, (user_type, user) in cases.items():
+            timings = []
+            queries = 0
+            for _ in range(options['logins']):
+                request = factory.post('/api/login/', {
+                    'email': user.email, 'password': PASSWORD, 'user_type': user_type,
+                }, format='json')
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = views.login(request)
+                    timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'{label} failed: {response.status_code} {response.data}')
+                queries = len(captured)
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            self.stdout.write(
+                f'{label:<14} median {statistics.median(timings):8.2f} ms p95 {p95:8.2f} ms '
+                f'{1000 / statistics.mean(timings):7.1f} logins/s {queries} queries/login'
+            )
@@ -0,0 +1,108 @@
+import os
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import listcache, storage
+from api.images import VARIANT_FIELDS, variant_names
+from api.models import GarbageReport
+
+COLUMNS = [*storage.MEDIA_FIELDS, *(f for pair in VARIANT_FIELDS.values() for f in pair)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Move report media stored under upload_to paths into content-addressed '
+        'storage, keeping one copy of identical files. Thumbnail and WebP variants '
+        'move along with their photo. Files are copied first and the originals '
+        'removed once the rows naming the copies commit, so an interrupted run '
+        'can simply be started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Reports updated per batch')
+
+    def handle(self, *args, **options):
+        media_root = settings.MEDIA_ROOT
+        moved = {}  # Legacy name -> blob name, for files several reports share
+        reports_updated = missing = 0
+        last_id = 0
+
+        while True:
+            reports = list(
+                GarbageReport.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', *COLUMNS)[:options['chunk_size']]
+            )
+            if not reports:
+                break
+            last_id = reports[-1].id
+
+            updated = []
+            legacy = set()  # Names this chunk stops using
+            for report in reports:
+                changed = False
+                for field in storage.MEDIA_FIELDS:
+                    name = getattr(report, field).name
+                    if not name or storage.is_blob_name(name):
+                        continue
+                    if name not in moved:
+                        path = os.path.join(media_root, name)
+                        if not os.path.exists(path):
+                            self.stderr.write(f"Report {report.id}: {name} is missing")
+                            missing += 1
+                            continue
+                        moved[name] = storage.copy_blob(media_root, path, os.path.splitext(name)[1])
+                    legacy.add(name)
+                    setattr(report, field, moved[name])
+                    changed = True
+
+                    if field in VARIANT_FIELDS:
+                        for variant_field, target in zip(VARIANT_FIELDS[field], variant_names(moved[name])):
+                            legacy.add(self.copy_variant(report, variant_field, target))
+                if changed:
+                    updated.append(report)
+
+            if updated:
+                with transaction.atomic():
+                    GarbageReport.objects.bulk_update(updated, COLUMNS)
+                    storage.release({getattr(r, f).name for r in updated for f in storage.MEDIA_FIELDS})
+                    listcache.invalidate_all()
+                    transaction.on_commit(partial(self.remove_legacy, legacy - {None}))
+            reports_updated += len(updated)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {len(moved)} files into {len(set(moved.values()))} blobs "
+            f"for {reports_updated} reports ({missing} missing)"
+        ))
+
+    def copy_variant(self, report, field, target):
+        """Point the variant column at target; returns the name it stops using"""
+        current = getattr(report, field).name
+        if not current or current == target:
+            return None
+        source = os.path.join(settings.MEDIA_ROOT, current)
+        destination = os.path.join(settings.MEDIA_ROOT, target)
+        if os.path.exists(source):
+            if not os.path.exists(destination):
+                storage.copy_into(source, destination)
+        elif not os.path.exists(destination):
+            # Nothing to move; process_images renders it again
+            target = ''
+        setattr(report, field, target)
+        return current
+
+    def remove_legacy(self, names):
+        """Delete the old files no committed row names any more"""
+        still_used = set()
+        for column in COLUMNS:
+            still_used.update(
+                GarbageReport.objects.filter(**{f'{column}__in': names}).values_list(column, flat=True)
+            )
+        for name in names - still_used:
+            try:
+                os.remove(os.path.join(settings.MEDIA_ROOT, name))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream reports as CSV, NDJSON or GeoJSON to a file or stdout, in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='output', choices=sorted(exports.WRITERS), default='csv')
+        parser.add_argument('--zone', help='Zone number or name, e.g. 3 or "Zone 3"')
+        parser.add_argument('--status', help='Only reports with this status')
+        parser.add_argument('--from', dest='start', type=date.fromisoformat,
+                            help='First reported date, YYYY-MM-DD')
+        parser.add_argument('--to', dest='end', type=date.fromisoformat,
+                            help='Last reported date, YYYY-MM-DD')
+        parser.add_argument('--output', dest='path', help='File to write instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            queryset = exports.export_queryset(
+                options['zone'], options['status'], options['start'], options['end']
+            )
+            chunks = exports.stream(options['output'], queryset)
+        except exports.ExportError as e:
+            raise CommandError(str(e))
+
+        if not options['path']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['path'], 'w', encoding='utf-8', newline='') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Wrote {options['path']}"))
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import storage
+from api.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount references of every stored media blob and delete the ones no '
+        'report uses any more, with their variants. Files on disk without a '
+        'blob row get one, so they are collected on a later run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=int(storage.GRACE_PERIOD.total_seconds()),
+                            help='Keep unreferenced blobs saved less than this many seconds ago')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List what would be deleted without changing anything')
+
+    def handle(self, *args, **options):
+        grace = timedelta(seconds=options['grace'])
+        known = set(MediaBlob.objects.values_list('name', flat=True))
+        untracked = [name for name in storage.stored_names(settings.MEDIA_ROOT) if name not in known]
+
+        if options['dry_run']:
+            referenced = storage.references()
+            orphans = [
+                name for name in MediaBlob.objects.filter(saved_at__lt=timezone.now() - grace)
+                .order_by('name').values_list('name', flat=True)
+                if name not in referenced
+            ]
+            for name in orphans:
+                self.stdout.write(name)
+            self.stdout.write(self.style.WARNING(
+                f"{len(orphans)} blobs would be deleted, {len(untracked)} files have no blob row"
+            ))
+            return
+
+        storage.touch(untracked)
+        collected = storage.recount(grace=grace)
+        for name in collected:
+            self.stdout.write(name)
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {len(collected)} unreferenced blobs, tracked {len(untracked)} untracked files"
+        ))
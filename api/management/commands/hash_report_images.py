@@ -0,0 +1,43 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import dedup
+from api.models import GarbageReport
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the duplicate-detection hash of report photos that have none yet, '
+        'so new submissions can be matched against older reports.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Reports updated per batch')
+
+    def handle(self, *args, **options):
+        hashed = failed = 0
+        last_id = 0
+        while True:
+            reports = list(
+                GarbageReport.objects.filter(image_hash='', id__gt=last_id).exclude(image='')
+                .order_by('id').only('id', 'image')[:options['chunk_size']]
+            )
+            if not reports:
+                break
+            last_id = reports[-1].id
+
+            updated = []
+            for report in reports:
+                report.image_hash = dedup.image_hash(os.path.join(settings.MEDIA_ROOT, report.image.name))
+                if report.image_hash:
+                    updated.append(report)
+                else:
+                    self.stderr.write(f"Report {report.id}: could not hash {report.image.name}")
+                    failed += 1
+            GarbageReport.objects.bulk_update(updated, ['image_hash'])
+            hashed += len(updated)
+
+        self.stdout.write(self.style.SUCCESS(f"Hashed {hashed} images ({failed} failed)"))
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.zones import GEOMETRY_TABLE, get_zone_geojson_path, postgis_available
+
+
+class Command(BaseCommand):
+    help = (
+        'Load zone.json into a GiST-indexed PostGIS table, for '
+        "ZONE_LOOKUP_BACKEND = 'postgis'. Replaces whatever was loaded before."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None,
+                            help='GeoJSON file to load (defaults to ZONE_GEOJSON_PATH)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('PostGIS zone lookup needs the PostgreSQL backend')
+        if not postgis_available(connection):
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS postgis')
+
+        with open(options['path'] or get_zone_geojson_path()) as f:
+            features = json.load(f).get('features', [])
+
+        rows = [
+            (position, feature['properties']['Zone_No'], json.dumps(feature['geometry']))
+            for position, feature in enumerate(features)
+            if feature['geometry']['type'] in ('Polygon', 'MultiPolygon')
+        ]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {GEOMETRY_TABLE} ("
+                "position integer PRIMARY KEY, "
+                "zone_number integer NOT NULL, "
+                "geom geometry(MultiPolygon, 4326) NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {GEOMETRY_TABLE}_geom_idx "
+                f"ON {GEOMETRY_TABLE} USING GIST (geom)"
+            )
+            cursor.execute(f"TRUNCATE {GEOMETRY_TABLE}")
+            cursor.executemany(
+                f"INSERT INTO {GEOMETRY_TABLE} (position, zone_number, geom) "
+                "VALUES (%s, %s, ST_Multi(ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326)))",
+                rows,
+            )
+            cursor.execute(f"ANALYZE {GEOMETRY_TABLE}")
+
+        self.stdout.write(self.style.SUCCESS(f"Loaded {len(rows)} zone geometries"))
@@ -0,0 +1,99 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api import listcache, storage
+from api.images import VARIANT_FIELDS, render_variants
+from api.models import GarbageReport
+
+VARIANT_COLUMNS = [field for pair in VARIANT_FIELDS.values() for field in pair]
+
+
+class Command(BaseCommand):
+    help = (
+        'Render thumbnails/WebP copies and recompress report photos that have '
+        'not been processed yet, in parallel. Also serves as the background '
+        'worker when IMAGE_PROCESSING_ASYNC is enabled.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Size of the process pool')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Reports handed to the pool per batch')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new uploads instead of exiting when done')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls with --loop')
+
+    def pending(self):
+        missing = Q()
+        for source, (thumbnail_field, _) in VARIANT_FIELDS.items():
+            missing |= Q(**{thumbnail_field: ''}) & Q(**{f'{source}__gt': ''})
+        return GarbageReport.objects.filter(missing).order_by('id')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        processed = failed = 0
+        # Failed images stay unprocessed; don't retry them within one run
+        skipped = set()
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                reports = list(
+                    self.pending().exclude(id__in=skipped)
+                    .only('id', *VARIANT_FIELDS, *VARIANT_COLUMNS)
+                    [:options['chunk_size']]
+                )
+                if not reports:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+
+                futures = {}
+                for report in reports:
+                    for source, (thumbnail_field, webp_field) in VARIANT_FIELDS.items():
+                        image = getattr(report, source)
+                        if image and not getattr(report, thumbnail_field):
+                            future = pool.submit(render_variants, settings.MEDIA_ROOT, image.name)
+                            futures[future] = (report, source, thumbnail_field, webp_field)
+
+                updated = {}
+                replaced = set()
+                for future in as_completed(futures):
+                    report, source, thumbnail_field, webp_field = futures[future]
+                    try:
+                        name, thumbnail_name, webp_name = future.result()
+                    except Exception as e:
+                        self.stderr.write(f"Report {report.id}: {str(e)}")
+                        skipped.add(report.id)
+                        failed += 1
+                        continue
+                    if name != getattr(report, source).name and not storage.keep(name):
+                        self.stderr.write(f"Report {report.id}: result was collected, retrying later")
+                        skipped.add(report.id)
+                        failed += 1
+                        continue
+                    if name != getattr(report, source).name:
+                        # Normalized into a new blob, see api/storage.py
+                        replaced |= {getattr(report, source).name, name}
+                        setattr(report, source, name)
+                    setattr(report, thumbnail_field, thumbnail_name)
+                    setattr(report, webp_field, webp_name)
+                    updated[report.id] = report
+                    processed += 1
+
+                if updated:
+                    GarbageReport.objects.bulk_update(updated.values(), [*VARIANT_FIELDS, *VARIANT_COLUMNS])
+                    listcache.invalidate_all()
+                    storage.release(replaced)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} images ({failed} failed) in {elapsed:.2f}s"
+        ))
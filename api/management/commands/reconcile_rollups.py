@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the analytics rollups from the reports table, fix any rows '
+        'that drifted and report them. Meant to run nightly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        drift = rebuild(dry_run=options['dry_run'])
+        for (kind, key), (stored, expected) in sorted(drift.items(), key=str):
+            self.stdout.write(f"{kind} {' '.join(str(part) for part in key)}: {stored} -> {expected}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Rollups are in sync'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} rollup rows drifted"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted rollup rows"))
@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import listcache, rollups, unviewed
+from api.directory import get_zone_directory
+from api.models import GarbageReport
+from api.zones import get_zone_index, reset_zone_index
+
+
+class Command(BaseCommand):
+    help = 'Recompute zone and assigned worker for existing reports from zone.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of reports classified per batch')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the zone/worker changes without writing them')
+
+    def handle(self, *args, **options):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            raise CommandError('rezone_reports requires NumPy (pip install numpy)')
+
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        # Always re-read zone.json, that's the point of re-zoning
+        reset_zone_index()
+        index = get_zone_index()
+
+        workers = get_zone_directory().worker_ids()
+
+        scanned = changed = 0
+        last_id = 0
+        started = time.perf_counter()
+
+        while True:
+            # Keyset pagination on id so each chunk is an indexed range scan
+            reports = list(
+                GarbageReport.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'latitude', 'longitude', 'zone', 'assigned_worker_id', 'duplicate_of_id')[:chunk_size]
+            )
+            if not reports:
+                break
+            last_id = reports[-1].id
+            scanned += len(reports)
+
+            zone_numbers = index.locate_many(
+                [r.longitude for r in reports],
+                [r.latitude for r in reports],
+            )
+
+            updates = []
+            for report, zone_number in zip(reports, zone_numbers.tolist()):
+                new_zone = f"Zone {zone_number}" if zone_number else "Unknown Zone"
+                new_worker_id = report.assigned_worker_id
+                # Duplicates are no new work, so like GarbageReport.save
+                # leave them unassigned
+                if report.duplicate_of_id is None and (new_zone != report.zone or new_worker_id is None):
+                    new_worker_id = workers.get(zone_number)
+
+                if new_zone == report.zone and new_worker_id == report.assigned_worker_id:
+                    continue
+
+                if dry_run:
+                    self.stdout.write(
+                        f"Report {report.id}: {report.zone or '-'} -> {new_zone}, "
+                        f"worker {report.assigned_worker_id} -> {new_worker_id}"
+                    )
+                report.zone = new_zone
+                report.assigned_worker_id = new_worker_id
+                updates.append(report)
+
+            changed += len(updates)
+            if updates and not dry_run:
+                with transaction.atomic():
+                    GarbageReport.objects.bulk_update(updates, ['zone', 'assigned_worker'])
+
+        if changed and not dry_run:
+            # bulk_update bypasses GarbageReport.save, so rebuild the counters
+            unviewed.recount()
+            rollups.rebuild()
+            listcache.invalidate_all()
+
+        elapsed = time.perf_counter() - started
+        rate = scanned / elapsed if elapsed else 0
+        verb = 'would change' if dry_run else 'changed'
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} reports, {verb} {changed} in {elapsed:.2f}s ({rate:.0f} rows/sec)"
+        ))
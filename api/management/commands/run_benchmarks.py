@@ -0,0 +1,86 @@
+import json
+import platform
+import random
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmarks import load, micro, seed
+from api.benchmarks.database import throwaway_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and run the microbenchmarks and the concurrent '
+        'API load test, printing one JSON document to compare between commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=2000, help='Reports to seed')
+        parser.add_argument('--users', type=int, default=200, help='Reporters to seed')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per load scenario')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent clients in the load test')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible data')
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for microbenchmark runs')
+        parser.add_argument('--skip-load', action='store_true', help='Only run the microbenchmarks')
+        parser.add_argument('--output', help='Write the JSON here instead of stdout')
+
+    def handle(self, *args, **options):
+        for name in ('reports', 'users', 'requests', 'threads'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be positive')
+
+        with throwaway_database():
+            result = self.run(options)
+
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        data = seed.seed(reports=options['reports'], users=options['users'], rng=rng)
+        result = {
+            'meta': self.meta(options),
+            'seed': {
+                'reports': data['reports'],
+                'users': len(data['users']),
+                'workers': len(data['workers']),
+                'seconds': round(time.perf_counter() - started, 2),
+            },
+        }
+        self.stderr.write(f"Seeded {data['reports']} reports in {result['seed']['seconds']}s")
+
+        result['micro'] = micro.run(rng, options['scale'])
+        if not options['skip_load']:
+            result['load'] = load.run(data, rng, options['requests'], options['threads'])
+        return result
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'options': {
+                name: options[name]
+                for name in ('reports', 'users', 'requests', 'threads', 'seed', 'scale')
+            },
+        }
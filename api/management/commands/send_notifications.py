@@ -0,0 +1,58 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.notifications import drain_outbox
+
+# Longest pause after repeated errors, in seconds
+MAX_BACKOFF = 300
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued zone notification emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Maximum notifications picked up per drain')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox instead of draining once')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls when the outbox is empty')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.report(*drain_outbox(batch_size=options['batch_size']))
+            return
+
+        # One mail connection across batches; closed while the outbox is
+        # idle, so the server doesn't drop it under us
+        connection = get_connection()
+        errors = 0
+        try:
+            while True:
+                try:
+                    sent, failed = drain_outbox(batch_size=options['batch_size'], connection=connection)
+                except Exception as e:
+                    # A locked database or dropped connection must not end the worker
+                    errors += 1
+                    delay = min(options['interval'] * 2 ** errors, MAX_BACKOFF)
+                    self.stderr.write(f"Error draining the outbox, retrying in {delay:.0f}s: {e!r}")
+                    connection.close()
+                    close_old_connections()
+                    time.sleep(delay)
+                    continue
+                errors = 0
+                self.report(sent, failed)
+
+                # A full batch means there is probably more waiting
+                if sent + failed < options['batch_size']:
+                    connection.close()
+                    time.sleep(options['interval'])
+        finally:
+            connection.close()
+
+    def report(self, sent, failed):
+        if sent or failed:
+            self.stdout.write(f"Sent {sent} notifications, {failed} failed")
@@ -0,0 +1,149 @@
+"""
+Delivery of files under MEDIA_ROOT.
+
+Media URLs carry an expiry and an HMAC (?e=<unix time>&s=<signature>, see
+sign), so only clients that were handed a report's URLs by the API can
+fetch its photos and videos. Expiries are rounded up to MEDIA_URL_BUCKET so
+a file keeps one URL for a while and browsers can cache it; cached list
+pages change with the bucket (api/listcache.py), so they never hand out
+links that have run out.
+
+This stops guessing and hotlinking, not reading: the report list still
+serializes every report for anonymous callers, with signed links, so media
+is no more private than the list. Reports have no notion of private yet.
+
+serve hands a checked request to the front proxy when MEDIA_ACCEL is set:
+'x-accel-redirect' for nginx (an internal location aliased to MEDIA_ROOT
+at MEDIA_ACCEL_PREFIX) or 'x-sendfile' for Apache/lighttpd. The proxy then
+sends the bytes and handles Range itself. Otherwise the file is sent from
+Python, with single byte-range (206) support so video players can seek
+without downloading the whole file, and ETag/Last-Modified validators.
+Content-addressed blobs (api/storage.py) never change, so they are cached
+as immutable for a year.
+"""
+import mimetypes
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.http import parse_etags, parse_http_date_safe
+from django.utils._os import safe_join
+
+from .storage import is_blob_name
+
+SIGNED = getattr(settings, 'MEDIA_SIGNED_URLS', True)
+URL_TTL = getattr(settings, 'MEDIA_URL_TTL', 6 * 3600)
+URL_BUCKET = getattr(settings, 'MEDIA_URL_BUCKET', 3600)
+ACCEL = getattr(settings, 'MEDIA_ACCEL', '')
+ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MAX_AGE = getattr(settings, 'MEDIA_MAX_AGE', 3600)
+READ_SIZE = 64 * 1024
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class MediaError(Exception):
+    def __init__(self, message, status, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def signature(name, expires):
+    return salted_hmac('api.media', f'{name}:{expires}', algorithm='sha256').hexdigest()[:32]
+
+
+def sign(name, now=None):
+    """Query string that grants access to name until a bucketed expiry"""
+    now = int(now if now is not None else time.time())
+    expires = -(-(now + URL_TTL) // URL_BUCKET) * URL_BUCKET
+    return f'e={expires}&s={signature(name, expires)}'
+
+
+def check_signature(name, params, now=None):
+    try:
+        expires = int(params.get('e', ''))
+    except ValueError:
+        raise MediaError('Missing or invalid signature', 403)
+    if expires < (now if now is not None else time.time()):
+        raise MediaError('Link expired', 403)
+    if not constant_time_compare(params.get('s', ''), signature(name, expires)):
+        raise MediaError('Missing or invalid signature', 403)
+
+
+def open_media(name):
+    """(path, os.stat_result) of a media file, or MediaError 404"""
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise MediaError('Not found', 404)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise MediaError('Not found', 404)
+    if not os.path.isfile(path):
+        raise MediaError('Not found', 404)
+    return path, stat
+
+
+def validators(name, stat):
+    """(ETag, Cache-Control) for a file"""
+    if is_blob_name(name):
+        # The name is the content's hash
+        etag = '"%s"' % os.path.splitext(os.path.basename(name))[0]
+        return etag, f'private, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', f'private, max-age={MAX_AGE}'
+
+
+def not_modified(request, etag, stat):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(stat.st_mtime) <= since
+
+
+def byte_range(request, etag, stat, size):
+    """
+    (start, end) inclusive of a satisfiable single Range request, None to
+    send the whole file. Multiple ranges are answered with the whole file.
+    """
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(stat.st_mtime):
+        return None
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        raise MediaError('Range not satisfiable', 416, {'Content-Range': f'bytes */{size}'})
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def content_type(name):
+    mime, encoding = mimetypes.guess_type(name)
+    return mime or 'application/octet-stream'
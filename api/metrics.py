@@ -0,0 +1,153 @@
+"""
+In-process metrics in the Prometheus text format.
+
+MetricsMiddleware (api/middleware.py) records, per view: latency, number
+and time of DB queries, request (upload) and response sizes. span() times
+named steps inside a request, like zone lookup, image writes and email
+sends. The metrics view renders everything for a Prometheus scrape.
+
+Values live in the memory of one process. Under several worker processes
+each is scraped separately (one target per worker) or summed by the
+collector; nothing here needs the prometheus_client package.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_label_text(self.labelnames, labels)} {value}'
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0))
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def count(self, *labels):
+        counts, _ = self._values.get(labels, ((), 0))
+        return sum(counts)
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        names = (*self.labelnames, 'le')
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_label_text(names, (*labels, bound))} {cumulative}'
+            yield f'{self.name}_sum{_label_text(self.labelnames, labels)} {total}'
+            yield f'{self.name}_count{_label_text(self.labelnames, labels)} {cumulative}'
+
+
+REQUEST_LABELS = ('view', 'method')
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response (first byte for streams)',
+    (*REQUEST_LABELS, 'status'),
+)
+request_queries = Histogram(
+    'http_request_db_queries', 'Database queries per request', REQUEST_LABELS, QUERY_BUCKETS,
+)
+request_db_time = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per request', REQUEST_LABELS,
+)
+request_size = Histogram(
+    'http_request_size_bytes', 'Request body size, e.g. photo and video uploads', REQUEST_LABELS, SIZE_BUCKETS,
+)
+response_size = Histogram(
+    'http_response_size_bytes', 'Response body size (streams with a known length only)',
+    REQUEST_LABELS, SIZE_BUCKETS,
+)
+slow_requests = Counter(
+    'http_slow_requests_total', 'Requests slower than METRICS_SLOW_REQUEST_SECONDS', REQUEST_LABELS,
+)
+span_duration = Histogram(
+    'span_duration_seconds', 'Time spent in named steps such as zone lookup and image writes', ('span',),
+)
+
+REGISTRY = [
+    request_duration, request_queries, request_db_time, request_size, response_size,
+    slow_requests, span_duration,
+]
+
+
+@contextmanager
+def span(name):
+    """Time the block into span_duration_seconds{span=name}"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        span_duration.observe(time.perf_counter() - started, name)
+
+
+def timed(name):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,130 @@
+import heapq
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('api.slow_requests')
+
+SLOW_REQUEST_SECONDS = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', 1.0)
+TRACE_QUERIES = getattr(settings, 'METRICS_TRACE_QUERIES', 10)
+SKIPPED_VIEWS = {'metrics'}
+
+
+class QueryRecorder:
+    """
+    Execute wrapper that counts queries and their time, keeping the slowest
+    few as a sampled trace for the slow-request log
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []  # heap of (duration, order, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            entry = (elapsed, self.count, sql)
+            if len(self.slowest) < TRACE_QUERIES:
+                heapq.heappush(self.slowest, entry)
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def trace(self):
+        return [
+            {'ms': round(elapsed * 1000, 2), 'order': order, 'sql': sql[:500]}
+            for elapsed, order, sql in sorted(self.slowest, reverse=True)
+        ]
+
+
+def view_label(request):
+    """URL name of the matched view, so labels don't grow with ids in paths"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.url_name or 'unnamed'
+
+
+def response_length(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """
+    Latency, DB queries, payload sizes and a slow-request log per view; see
+    api/metrics.py. Placed first in MIDDLEWARE so it times the whole stack.
+    Under ASGI the async path records latency and sizes but not queries,
+    which run on sync_to_async threads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, None)
+        return response
+
+    def record(self, request, response, duration, recorder):
+        view = view_label(request)
+        if view in SKIPPED_VIEWS:
+            return
+        labels = (view, request.method)
+        metrics.request_duration.observe(duration, *labels, response.status_code)
+        try:
+            uploaded = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            uploaded = 0
+        if uploaded:
+            metrics.request_size.observe(uploaded, *labels)
+        length = response_length(response)
+        if length is not None:
+            metrics.response_size.observe(length, *labels)
+        if recorder is not None:
+            metrics.request_queries.observe(recorder.count, *labels)
+            metrics.request_db_time.observe(recorder.duration, *labels)
+
+        if duration >= SLOW_REQUEST_SECONDS:
+            metrics.slow_requests.inc(*labels)
+            logger.warning('Slow request %s', {
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'ms': round(duration * 1000, 1),
+                'queries': recorder.count if recorder else None,
+                'db_ms': round(recorder.duration * 1000, 1) if recorder else None,
+                'slowest_queries': recorder.trace() if recorder else None,
+            })
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_zonenotification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='garbagereport',
+            index=models.Index(fields=['-reported_at', '-id'], name='report_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='garbagereport',
+            index=models.Index(fields=['assigned_worker', '-reported_at', '-id'], name='report_worker_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='garbagereport',
+            index=models.Index(fields=['user', '-reported_at', '-id'], name='report_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='garbagereport',
+            index=models.Index(condition=models.Q(('is_viewed', False), ('status', 'SENT')), fields=['assigned_worker'], name='report_worker_unviewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='garbagereport',
+            index=models.Index(fields=['status', '-reported_at'], name='report_status_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='garbagereport',
+            index=models.Index(fields=['zone', '-reported_at'], name='report_zone_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_garbagereport_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workerprofile',
+            name='unviewed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_workerprofile_unviewed_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='garbagereport',
+            name='completion_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='completion_reports/variants/'),
+        ),
+        migrations.AddField(
+            model_name='garbagereport',
+            name='completion_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='completion_reports/variants/'),
+        ),
+        migrations.AddField(
+            model_name='garbagereport',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='garbage_reports/variants/'),
+        ),
+        migrations.AddField(
+            model_name='garbagereport',
+            name='image_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='garbage_reports/variants/'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_videoupload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='garbagereport',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='garbagereport',
+            index=models.Index(fields=['geohash'], name='report_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_garbagereport_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCompletionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('zone', models.CharField(max_length=100)),
+                ('worker', models.PositiveIntegerField()),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'zone', 'worker', 'bucket'), name='completion_rollup_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('zone', models.CharField(max_length=100)),
+                ('worker', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('SENT', 'Sent'), ('RECEIVED', 'Received'), ('IN_PROGRESS', 'In Progress'), ('COMPLETED', 'Completed'), ('CLOSED', 'Closed')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'zone', 'worker', 'status'), name='status_rollup_key')],
+            },
+        ),
+    ]
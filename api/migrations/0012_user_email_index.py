@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 21:10
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    auth_user.email has no index, and login and send_otp look users up by
+    it. auth's User model can't take a Meta index from here, so the index
+    is created with SQL that both SQLite and PostgreSQL accept.
+    """
+
+    dependencies = [
+        ('api', '0011_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS api_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX IF EXISTS api_user_email_idx',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_user_email_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='garbagereport',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='api.garbagereport'),
+        ),
+        migrations.AddField(
+            model_name='garbagereport',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+def backfill_unviewed_count(apps, schema_editor):
+    WorkerProfile = apps.get_model('api', 'WorkerProfile')
+    GarbageReport = apps.get_model('api', 'GarbageReport')
+    counts = (
+        GarbageReport.objects.filter(status='SENT', is_viewed=False, assigned_worker__isnull=False)
+        .values('assigned_worker')
+        .annotate(count=models.Count('id'))
+    )
+    for row in counts:
+        WorkerProfile.objects.filter(id=row['assigned_worker']).update(unviewed_count=row['count'])
+
+
+class Migration(migrations.Migration):
+    """
+    Data step of 0007, moved out of it so the schema change and the backfill
+    run in separate transactions. Sets absolute counts, so it is also safe
+    on databases that ran the backfill as part of 0007.
+    """
+
+    dependencies = [
+        ('api', '0014_mediablob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unviewed_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-18 23:40
+
+from django.db import migrations
+
+# A frozen copy of api.geo.encode, so later changes there can't alter this migration
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(latitude, longitude, precision=9):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            bounds[0] = mid
+        else:
+            bits = bits * 2
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = bit_count = 0
+    return ''.join(chars)
+
+
+def backfill_geohash(apps, schema_editor):
+    GarbageReport = apps.get_model('api', 'GarbageReport')
+    reports = []
+    for report in GarbageReport.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        report.geohash = encode(report.latitude, report.longitude)
+        reports.append(report)
+    GarbageReport.objects.bulk_update(reports, ['geohash'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+    """
+    Data step of 0010, moved out of it so the schema change and the backfill
+    run in separate transactions. Recomputes every geohash, so it is also
+    safe on databases that ran the backfill as part of 0010.
+    """
+
+    dependencies = [
+        ('api', '0015_backfill_unviewed_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-import json
-import os
+from django.utils import timezone
+import uuid
+
+from . import geo, listcache, metrics, rollups, storage, tiles, unviewed
+from .directory import get_zone_directory
+from .zones import get_zone_locator, point_in_ring
 
 class WorkerProfile(models.Model):
     """
@@ -16,6 +18,7 @@ class WorkerProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     zone = models.IntegerField(choices=ZONE_CHOICES)
     is_worker = models.BooleanField(default=True)  # Identifies the user as a worker
+    unviewed_count = models.PositiveIntegerField(default=0)  # Unviewed SENT reports, see api/unviewed.py
 
     def __str__(self):
         return f"{self.user.username} - Zone {self.zone}"
@@ -42,10 +45,16 @@ class GarbageReport(models.Model):
     description = models.TextField()
     latitude = models.FloatField()
     longitude = models.FloatField()
+    geohash = models.CharField(max_length=12, blank=True, editable=False)  # Spatial queries, see api/geo.py
     reported_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='SENT')
     zone = models.CharField(max_length=100, blank=True)
     completion_image = models.ImageField(upload_to='completion_reports/', null=True, blank=True)
+    # Derived copies written by api/images.py
+    image_thumbnail = models.ImageField(upload_to='garbage_reports/variants/', blank=True, editable=False)
+    image_webp = models.ImageField(upload_to='garbage_reports/variants/', blank=True, editable=False)
+    completion_thumbnail = models.ImageField(upload_to='completion_reports/variants/', blank=True, editable=False)
+    completion_webp = models.ImageField(upload_to='completion_reports/variants/', blank=True, editable=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     is_viewed = models.BooleanField(default=False)
     worker_notes = models.TextField(blank=True, null=True)
@@ -56,43 +65,118 @@ class GarbageReport(models.Model):
         blank=True,
         related_name='assigned_reports'
     )
+    # Duplicate detection, see api/dedup.py
+    image_hash = models.CharField(max_length=16, blank=True, editable=False)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )
 
     def save(self, *args, **kwargs):
+        previous_geohash = self.geohash
+        self.geohash = geo.encode(self.latitude, self.longitude)
+
         # Determine zone and auto-assign worker if this is a new report
         if not self.zone:
             self.zone = self.determine_zone()
-            
-            # Auto-assign worker based on zone
-            if self.zone != "Unknown Zone":
-                zone_number = int(self.zone.split()[-1])
-                try:
-                    worker = WorkerProfile.objects.get(zone=zone_number)
-                    self.assigned_worker = worker
-                except WorkerProfile.DoesNotExist:
-                    pass
-                    
+
+            # Auto-assign worker based on zone; duplicates are no new work
+            zone_number = self.get_zone_number()
+            if zone_number is not None and self.duplicate_of_id is None:
+                worker_id = get_zone_directory().get_worker_id(zone_number)
+                if worker_id is not None:
+                    self.assigned_worker_id = worker_id
+
+        previous = None if self._state.adding else self._unviewed_worker_id
+        rollup_before = None if self._state.adding else self._rollup_state
+        if rollup_before is self.UNKNOWN:
+            rollup_before = rollups.states(type(self).objects.filter(pk=self.pk)).get(self.pk)
+        listed_worker = None if self._state.adding else self._listed_worker_id
+        if listed_worker is self.UNKNOWN:
+            listed_worker = (
+                type(self).objects.filter(pk=self.pk).values_list('assigned_worker_id', flat=True).first()
+            )
         super().save(*args, **kwargs)
+        if listed_worker != self.assigned_worker_id:
+            # The post_save receiver only bumps the new worker's list
+            listcache.invalidate_reports([(self.user_id, listed_worker)])
+        self._listed_worker_id = self.assigned_worker_id
+        self.sync_unviewed_count(previous)
+        self.sync_rollups(rollup_before)
+        tiles.invalidate({previous_geohash, self.geohash})
+        self.sync_media()
+
+    # Worker whose unviewed counter includes this report, as last loaded/saved
+    _unviewed_worker_id = UNKNOWN = object()
+    # What the report contributes to the analytics rollups, as last loaded/saved
+    _rollup_state = UNKNOWN
+    # Blobs the media columns named, as last loaded/saved
+    _media_names = frozenset()
+    # Worker whose report list includes this report, as last loaded/saved
+    _listed_worker_id = UNKNOWN
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        deferred = instance.get_deferred_fields()
+        if not {'status', 'is_viewed', 'assigned_worker_id'} & deferred:
+            instance._unviewed_worker_id = instance.unviewed_worker_id()
+        if not {'reported_at', 'zone', 'assigned_worker_id', 'status', 'completed_at'} & deferred:
+            instance._rollup_state = rollups.state_of(instance)
+        if not set(storage.MEDIA_FIELDS) & deferred:
+            instance._media_names = storage.media_names(instance)
+        if 'assigned_worker_id' not in deferred:
+            instance._listed_worker_id = instance.assigned_worker_id
+        return instance
+
+    def sync_media(self):
+        """Recount the blobs this save stopped or started referencing"""
+        current = storage.media_names(self)
+        storage.release(current ^ self._media_names)
+        self._media_names = current
+
+    def sync_rollups(self, previous):
+        current = rollups.state_of(self)
+        rollups.move(previous, current)
+        self._rollup_state = current
+
+    def unviewed_worker_id(self):
+        """Worker whose unviewed count this report belongs in, if any"""
+        if self.status == 'SENT' and not self.is_viewed:
+            return self.assigned_worker_id
+        return None
+
+    def sync_unviewed_count(self, previous):
+        current = self.unviewed_worker_id()
+        # unviewed.tracking() settles the counts for bulk operations
+        if not unviewed.suspended():
+            if previous is self.UNKNOWN:
+                unviewed.recount([current])
+            elif previous != current:
+                unviewed.adjust(previous, -1)
+                unviewed.adjust(current, 1)
+        self._unviewed_worker_id = current
+
+    def get_zone_number(self):
+        """Zone number from the zone field (e.g., "Zone 5" -> 5), or None"""
+        if not self.zone or self.zone == "Unknown Zone":
+            return None
+        try:
+            return int(self.zone.split()[-1])
+        except ValueError:
+            return None
 
     def get_zone_email(self):
         """Get email address for the current zone from email.json"""
         try:
-            # Get the zone number from the zone field (e.g., "Zone 5" -> 5)
-            if not self.zone or self.zone == "Unknown Zone":
+            zone_number = self.get_zone_number()
+            if zone_number is None:
                 return None
-                
-            zone_number = int(self.zone.split()[-1])
-            
-            # Load email configuration
-            email_config_path = os.path.join(settings.BASE_DIR, 'api', 'email.json')
-            with open(email_config_path, 'r') as f:
-                config = json.load(f)
-            
-            # Find matching zone
-            for zone in config['zones']:
-                if zone['zone_number'] == zone_number:
-                    return zone['email']
-            
-            return None
+
+            return get_zone_directory().get_email(zone_number)
         except Exception as e:
             print(f"Error getting zone email: {str(e)}")
             return None
@@ -104,81 +188,222 @@ class GarbageReport(models.Model):
         Determine if a point is inside a polygon using ray casting algorithm
         """
         x, y = point
-        n = len(polygon)
-        inside = False
-
-        p1x, p1y = polygon[0]
-        for i in range(1, n + 1):
-            p2x, p2y = polygon[i % n]
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                            if p1x == p2x or x <= xinters:
-                                inside = not inside
-            p1x, p1y = p2x, p2y
-
-        return inside
+        return point_in_ring(x, y, polygon)
 
     def determine_zone(self):
-        import json
-        from django.conf import settings
-        import os
-
-        geojson_path = os.path.join(settings.BASE_DIR, 'zone.json')
-        
+        """Resolve the zone from the preloaded zone index (or PostGIS)"""
         try:
-            with open(geojson_path) as f:
-                zones_data = json.load(f)
-
-            point = (self.longitude, self.latitude)
-            
-            for feature in zones_data['features']:
-                # Get the first polygon coordinates
-                coordinates = feature['geometry']['coordinates'][0][0]
-                
-                if self.point_in_polygon(point, coordinates):
-                    return f"Zone {feature['properties']['Zone_No']}"
-                    
+            with metrics.span('determine_zone'):
+                zone_number = get_zone_locator().locate(self.longitude, self.latitude)
+            if zone_number is not None:
+                return f"Zone {zone_number}"
         except Exception as e:
             print(f"Error determining zone: {str(e)}")
-            
+
         return "Unknown Zone"
 
     def __str__(self):
         return f"Report by {self.user.username} at {self.reported_at}"
 
+    class Meta:
+        indexes = [
+            # Anonymous list and cursor pagination order
+            models.Index(fields=['-reported_at', '-id'], name='report_recent_idx'),
+            # Worker and reporter lists in get_queryset
+            models.Index(fields=['assigned_worker', '-reported_at', '-id'], name='report_worker_recent_idx'),
+            models.Index(fields=['user', '-reported_at', '-id'], name='report_user_recent_idx'),
+            # get_unviewed_reports_count only ever looks at unviewed SENT reports
+            models.Index(
+                fields=['assigned_worker'],
+                condition=models.Q(status='SENT', is_viewed=False),
+                name='report_worker_unviewed_idx',
+            ),
+            # Admin list_filter
+            models.Index(fields=['status', '-reported_at'], name='report_status_recent_idx'),
+            models.Index(fields=['zone', '-reported_at'], name='report_zone_recent_idx'),
+            # bbox= / near= filters: geohash prefix ranges
+            models.Index(fields=['geohash'], name='report_geohash_idx'),
+        ]
+
+class ZoneNotification(models.Model):
+    """
+    Outbox row for a zone email, written alongside the report and delivered
+    later by the send_notifications worker
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    report = models.ForeignKey(GarbageReport, on_delete=models.CASCADE, related_name='notifications')
+    zone = models.CharField(max_length=100)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.zone} notification for report {self.report_id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+class VideoUpload(models.Model):
+    """
+    A resumable, chunked upload of a report video. Chunks are appended to a
+    partial file until offset reaches size, then the file is attached to the
+    report. See api/uploads.py.
+    """
+    STATUS_CHOICES = [
+        ('UPLOADING', 'Uploading'),
+        ('COMPLETE', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report = models.ForeignKey(GarbageReport, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)  # Optional checksum of the whole file
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='UPLOADING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Video upload {self.id} for report {self.report_id} ({self.offset}/{self.size})"
+
+class MediaBlob(models.Model):
+    """A file in content-addressed storage and its reference count. See api/storage.py."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    saved_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+    class Meta:
+        indexes = [
+            # collect(): unreferenced blobs past the grace period
+            models.Index(fields=['refcount', 'saved_at'], name='blob_orphan_idx'),
+        ]
+
+class DailyStatusRollup(models.Model):
+    """Reports per reported day, zone, worker and current status. See api/rollups.py."""
+    KEY_FIELDS = ('day', 'zone', 'worker', 'status')
+
+    day = models.DateField()
+    zone = models.CharField(max_length=100)
+    worker = models.PositiveIntegerField()  # WorkerProfile id, 0 when unassigned
+    status = models.CharField(max_length=20, choices=GarbageReport.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.zone} worker {self.worker} {self.status}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'zone', 'worker', 'status'], name='status_rollup_key'),
+        ]
+
+class DailyCompletionRollup(models.Model):
+    """Completed reports per completion day, zone, worker and time-to-complete bucket"""
+    KEY_FIELDS = ('day', 'zone', 'worker', 'bucket')
+
+    day = models.DateField()
+    zone = models.CharField(max_length=100)
+    worker = models.PositiveIntegerField()  # WorkerProfile id, 0 when unassigned
+    bucket = models.PositiveSmallIntegerField()  # Index into rollups.BUCKET_EDGES
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.zone} worker {self.worker} bucket {self.bucket}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'zone', 'worker', 'bucket'], name='completion_rollup_key'),
+        ]
+
+
+def queue_zone_notification(report):
+    """Queue the zone email for a report that is new work"""
+    try:
+        zone_email = report.get_zone_email()
+
+        if zone_email:
+            # Delivered by `manage.py send_notifications`, not on the request thread
+            ZoneNotification.objects.create(
+                report=report,
+                zone=report.zone,
+                recipient=zone_email,
+            )
+
+    except Exception as e:
+        print(f"Error queueing zone notification: {str(e)}")
+
+
 @receiver(post_save, sender=GarbageReport)
 def send_zone_notification(sender, instance, created, **kwargs):
-    """Send email notification when a new report is created"""
-    if created:  # Only send email when a new report is created
-        try:
-            zone_email = instance.get_zone_email()
-            
-            if zone_email:
-                # Prepare email content
-                subject = f'New Garbage Report in {instance.zone}'
-                message = f"""
-A new garbage report has been submitted in your zone.
-
-Details:
-- Reporter: {instance.user.username}
-- Location: {instance.latitude}, {instance.longitude}
-- Description: {instance.description}
-- Reported at: {instance.reported_at}
-
-Please take necessary action.
-"""
-                
-                # Send email
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[zone_email],
-                    fail_silently=False,
-                )
-                
-        except Exception as e:
-            print(f"Error sending zone notification: {str(e)}")
\ No newline at end of file
+    """Queue an email notification for the zone when a new report is created"""
+    # Only notify when a new report is created, and not for duplicates
+    if created and instance.duplicate_of_id is None:
+        queue_zone_notification(instance)
+
+
+@receiver(post_save, sender=WorkerProfile)
+@receiver(post_delete, sender=WorkerProfile)
+def invalidate_zone_workers(sender, **kwargs):
+    """
+    Drop the cached zone -> worker mapping once worker profile changes
+    commit, so no request reloads it from uncommitted or rolled-back rows
+    """
+    transaction.on_commit(get_zone_directory().invalidate_workers)
+
+
+@receiver(post_delete, sender=GarbageReport)
+def release_unviewed_count(sender, instance, **kwargs):
+    """Take a deleted report out of its worker's unviewed count"""
+    if unviewed.suspended():
+        return
+    previous = instance._unviewed_worker_id
+    if previous is GarbageReport.UNKNOWN:
+        previous = instance.unviewed_worker_id()
+    unviewed.adjust(previous, -1)
+
+
+@receiver(post_delete, sender=GarbageReport)
+def invalidate_report_tiles(sender, instance, **kwargs):
+    tiles.invalidate([instance.geohash])
+
+
+@receiver(post_save, sender=GarbageReport)
+@receiver(post_delete, sender=GarbageReport)
+def invalidate_report_lists(sender, instance, **kwargs):
+    listcache.invalidate_report(instance)
+
+
+@receiver(post_delete, sender=GarbageReport)
+def release_media(sender, instance, **kwargs):
+    """Collect the report's blobs once nothing else references them"""
+    storage.release(storage.media_names(instance))
+
+
+@receiver(post_delete, sender=GarbageReport)
+def release_rollups(sender, instance, **kwargs):
+    previous = instance._rollup_state
+    if previous is GarbageReport.UNKNOWN:
+        previous = rollups.state_of(instance)
+    rollups.move(previous, None)
+
+
+@receiver(post_save, sender=WorkerProfile)
+@receiver(post_delete, sender=WorkerProfile)
+def invalidate_unviewed_count(sender, instance, **kwargs):
+    unviewed.invalidate([instance.user_id])
@@ -0,0 +1,154 @@
+"""
+Delivery of queued zone notifications.
+
+send_zone_notification only writes ZoneNotification rows. drain_outbox picks up
+the rows that are due, groups them per recipient into one digest email, and
+sends everything over a single mail connection, which a caller draining in a
+loop passes in to reuse across batches. Failed rows are retried with
+exponential backoff until NOTIFICATION_MAX_ATTEMPTS is reached.
+
+Rows are claimed in a short transaction that pushes their next_attempt_at out
+by CLAIM_SECONDS, so no transaction (and on SQLite no write lock) is held while
+talking to the mail server. A drainer that dies mid-batch leaves its rows to be
+picked up again once the claim runs out.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import ZoneNotification
+
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+RETRY_BASE_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_BASE_SECONDS', 30)
+CLAIM_SECONDS = getattr(settings, 'NOTIFICATION_CLAIM_SECONDS', 600)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: 30s, 60s, 120s, ..."""
+    return timedelta(seconds=RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+
+
+def report_details(report):
+    return f"""- Reporter: {report.user.username}
+- Location: {report.latitude}, {report.longitude}
+- Description: {report.description}
+- Reported at: {report.reported_at}"""
+
+
+def build_message(recipient, notifications):
+    """One email for all pending notifications of a recipient"""
+    # A recipient can cover several zones
+    zone = ', '.join(sorted({n.zone for n in notifications}))
+    if len(notifications) == 1:
+        subject = f'New Garbage Report in {zone}'
+        body = f"""
+A new garbage report has been submitted in your zone.
+
+Details:
+{report_details(notifications[0].report)}
+
+Please take necessary action.
+"""
+    else:
+        subject = f'{len(notifications)} New Garbage Reports in {zone}'
+        details = '\n\n'.join(report_details(n.report) for n in notifications)
+        body = f"""
+{len(notifications)} new garbage reports have been submitted in your zone.
+
+{details}
+
+Please take necessary action.
+"""
+    return EmailMessage(
+        subject=subject,
+        body=body,
+        from_email=settings.EMAIL_HOST_USER,
+        to=[recipient],
+    )
+
+
+def mark_failed(notifications, error, now):
+    for n in notifications:
+        n.attempts += 1
+        n.last_error = str(error)
+        if n.attempts >= MAX_ATTEMPTS:
+            n.status = 'FAILED'
+        else:
+            n.next_attempt_at = now + retry_delay(n.attempts)
+    with transaction.atomic():
+        ZoneNotification.objects.bulk_update(
+            notifications, ['attempts', 'last_error', 'status', 'next_attempt_at']
+        )
+
+
+def mark_sent(notifications):
+    ZoneNotification.objects.filter(id__in=[n.id for n in notifications]).update(
+        status='SENT', sent_at=timezone.now(), attempts=F('attempts') + 1
+    )
+
+
+def claim(batch_size, now):
+    """Due notifications, held off from other drainers for CLAIM_SECONDS"""
+    with transaction.atomic():
+        due = list(
+            ZoneNotification.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .select_related('report__user')
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if due:
+            ZoneNotification.objects.filter(id__in=[n.id for n in due]).update(
+                next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS)
+            )
+    return due
+
+
+def drain_outbox(batch_size=100, connection=None):
+    """
+    Send every due notification once. Returns (sent, failed) row counts.
+    A connection passed in is left open for the next drain; the caller
+    closes it.
+    """
+    now = timezone.now()
+    due = claim(batch_size, now)
+    if not due:
+        return 0, 0
+
+    by_recipient = {}
+    for notification in due:
+        by_recipient.setdefault(notification.recipient, []).append(notification)
+
+    owned = connection is None
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        print(f"Error opening mail connection: {str(e)}")
+        mark_failed(due, e, now)
+        return 0, len(due)
+
+    sent = failed = 0
+    try:
+        for recipient, notifications in by_recipient.items():
+            try:
+                with metrics.span('zone_email'):
+                    connection.send_messages([build_message(recipient, notifications)])
+            except Exception as e:
+                print(f"Error sending zone notification to {recipient}: {str(e)}")
+                mark_failed(notifications, e, now)
+                failed += len(notifications)
+                # The next send reconnects instead of reusing a broken session
+                connection.close()
+            else:
+                mark_sent(notifications)
+                sent += len(notifications)
+    finally:
+        if owned:
+            connection.close()
+
+    return sent, failed
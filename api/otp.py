@@ -0,0 +1,114 @@
+"""
+One-time passwords for sign-up, kept in the cache instead of the session.
+
+The code is stored hashed under the email address with the cache's own
+expiry, so nothing depends on the client keeping a session cookie and no
+session rows are written. Sends are rate limited per email and per client
+IP with fixed-window counters, each code allows a few wrong guesses before
+it is dropped, and codes are compared in constant time. The email goes out
+on a small thread pool so send_otp doesn't wait on SMTP, with a few quick
+retries and a logged error if they all fail. It deliberately doesn't go
+through the zone notification outbox: that would put the plain code in the
+database, and a code lives for minutes, so a lost send is answered by the
+user asking for a new one.
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import send_mail
+
+from . import metrics, ratelimit
+
+OTP_TTL = getattr(settings, 'OTP_TTL', 900)  # 15 minutes
+MAX_ATTEMPTS = getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+# (sends allowed, window in seconds)
+EMAIL_RATE = getattr(settings, 'OTP_EMAIL_RATE', (3, 900))
+IP_RATE = getattr(settings, 'OTP_IP_RATE', (20, 3600))
+RATE_MESSAGE = 'Too many OTP requests, try again later'
+SEND_ATTEMPTS = getattr(settings, 'OTP_SEND_ATTEMPTS', 3)
+RETRY_SECONDS = getattr(settings, 'OTP_RETRY_SECONDS', 2)
+
+logger = logging.getLogger('api.otp')
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'OTP_EMAIL_WORKERS', 4))
+
+
+class OTPError(Exception):
+    pass
+
+
+def email_id(email):
+    """Normalized, hashed email for cache keys"""
+    return hashlib.sha256(email.strip().lower().encode()).hexdigest()
+
+
+def _digest(email, code):
+    return hmac.new(settings.SECRET_KEY.encode(), f'{email_id(email)}:{code}'.encode(), 'sha256').hexdigest()
+
+
+def code_key(email):
+    return f'otp:code:{email_id(email)}'
+
+
+def attempts_key(email):
+    return f'otp:attempts:{email_id(email)}'
+
+
+def deliver(email, code):
+    """Email the code, retrying briefly. Returns whether it was sent."""
+    for attempt in range(1, SEND_ATTEMPTS + 1):
+        try:
+            with metrics.span('otp_email'):
+                send_mail(
+                    'OTP for Garbage Reporting App',
+                    f'Your OTP is: {code}',
+                    settings.EMAIL_HOST_USER,
+                    [email],
+                    fail_silently=False,
+                )
+            return True
+        except Exception:
+            # The hashed id, as in the cache keys, rather than the address
+            if attempt == SEND_ATTEMPTS:
+                logger.exception('OTP email for %s failed after %d attempts', email_id(email)[:12], attempt)
+                return False
+            logger.warning('OTP email for %s failed, retrying', email_id(email)[:12], exc_info=True)
+            time.sleep(RETRY_SECONDS * attempt)
+
+
+def issue(email, client_ip=None):
+    """Create a code for email, replacing any previous one, and email it"""
+    if client_ip:
+        ratelimit.hit('otp-ip', client_ip, *IP_RATE, message=RATE_MESSAGE)
+    ratelimit.hit('otp-email', email_id(email), *EMAIL_RATE, message=RATE_MESSAGE)
+
+    code = f'{secrets.randbelow(1000000):06d}'
+    cache.set_many({code_key(email): _digest(email, code), attempts_key(email): 0}, OTP_TTL)
+    if getattr(settings, 'OTP_SEND_ASYNC', True):
+        _executor.submit(deliver, email, code)
+    else:
+        deliver(email, code)
+    return code
+
+
+def verify(email, code):
+    """Check a code; it is used up on success or after MAX_ATTEMPTS wrong tries"""
+    stored = cache.get(code_key(email))
+    if stored is None:
+        raise OTPError('OTP expired or not found')
+    try:
+        attempts = cache.incr(attempts_key(email))
+    except ValueError:
+        attempts = MAX_ATTEMPTS + 1
+    if attempts > MAX_ATTEMPTS:
+        cache.delete_many([code_key(email), attempts_key(email)])
+        raise OTPError('Too many attempts, request a new OTP')
+    if not hmac.compare_digest(stored, _digest(email, str(code))):
+        raise OTPError('Invalid OTP')
+    cache.delete_many([code_key(email), attempts_key(email)])
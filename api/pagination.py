@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ReportCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (reported_at, id), newest first. Pages cost the same
+    no matter how deep the client scrolls.
+    """
+    ordering = ('-reported_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,75 @@
+"""
+Fixed-window counters in the cache, for throttling OTP sends and logins.
+
+Each (kind, identifier) gets one counter per window, created with the
+window's length as its timeout, so old windows clean themselves up.
+
+Per-IP limits use REMOTE_ADDR. Behind a reverse proxy that is the proxy's
+address, so setting TRUSTED_PROXY_COUNT makes them read the client from
+CLIENT_IP_HEADER instead, trusting only the entries those proxies appended;
+see client_ip.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class RateLimited(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def client_ip(request):
+    """
+    The caller's address for per-IP limits. The forwarding header is only
+    read when TRUSTED_PROXY_COUNT says proxies append to it; otherwise, or
+    when it is missing or too short, the connecting address is used, so a
+    client can neither pick its own address nor skip the limit.
+    """
+    remote = request.META.get('REMOTE_ADDR') or None
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    header = getattr(settings, 'CLIENT_IP_HEADER', '')
+    if not proxies or not header:
+        return remote
+    # Each proxy appends the address it saw; anything further left came from the client
+    hops = [part.strip() for part in request.headers.get(header, '').split(',') if part.strip()]
+    if len(hops) < proxies:
+        return remote
+    return hops[-proxies]
+
+
+def _window(kind, identifier, window):
+    now = int(time.time())
+    start = now - now % window
+    return f'ratelimit:{kind}:{identifier}:{start}', start + window - now
+
+
+def record(kind, identifier, window):
+    """Count one hit in the current window and return the total"""
+    key, _ = _window(kind, identifier, window)
+    cache.add(key, 0, window)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between add and incr: a new window
+        cache.add(key, 1, window)
+        return 1
+
+
+def hit(kind, identifier, limit, window, message='Too many requests, try again later'):
+    """Count one hit; raise RateLimited once the window holds more than limit"""
+    if record(kind, identifier, window) > limit:
+        raise RateLimited(message, retry_after=_window(kind, identifier, window)[1])
+
+
+def check(kind, identifier, limit, window, message='Too many requests, try again later'):
+    """Raise RateLimited if the window already holds limit hits, without counting one"""
+    key, retry_after = _window(kind, identifier, window)
+    if cache.get(key, 0) >= limit:
+        raise RateLimited(message, retry_after=retry_after)
+
+
+def reset(kind, identifier, window):
+    cache.delete(_window(kind, identifier, window)[0])
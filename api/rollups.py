@@ -0,0 +1,211 @@
+"""
+Daily per-zone, per-worker report rollups behind the analytics endpoint.
+
+DailyStatusRollup counts reports by the day they were reported, zone,
+assigned worker and current status. DailyCompletionRollup counts completed
+reports by the day they were completed and a time-to-complete bucket,
+which is enough to estimate the median and p90.
+
+Both are adjusted incrementally: GarbageReport.save, the status transitions
+in transitions.py and the post_delete receiver move a report's counts from
+its old state to its new one, and bulk operations wrap their update() or
+delete() in tracking(). Changes that bypass all of those (raw SQL, a worker
+deleted and reports SET_NULL, rezone_reports) are fixed by rebuild(), run
+nightly by the reconcile_rollups command.
+"""
+import threading
+from bisect import bisect_right
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+UNASSIGNED = 0  # Worker column value for reports without a worker
+
+# Upper edges of the time-to-complete buckets in hours; the last bucket is open
+BUCKET_EDGES = [0.5, 1, 2, 4, 8, 12, 24, 36, 48, 72, 96, 120, 168, 240, 336, 504, 720]
+
+STATE_FIELDS = ('id', 'reported_at', 'zone', 'assigned_worker_id', 'status', 'completed_at')
+
+_state = threading.local()
+
+
+def suspended():
+    """True while tracking() is settling a bulk operation itself"""
+    return getattr(_state, 'suspended', False)
+
+
+def bucket_for(hours):
+    return bisect_right(BUCKET_EDGES, hours)
+
+
+def bucket_bounds(bucket):
+    """(lower, upper) hours of a bucket; upper is None for the open last bucket"""
+    lower = BUCKET_EDGES[bucket - 1] if bucket else 0.0
+    upper = BUCKET_EDGES[bucket] if bucket < len(BUCKET_EDGES) else None
+    return lower, upper
+
+
+def report_state(reported_at, zone, worker_id, status, completed_at):
+    """The (status key, completion key) a report contributes to the rollups"""
+    worker = worker_id or UNASSIGNED
+    status_key = (timezone.localdate(reported_at), zone, worker, status)
+    completion_key = None
+    if completed_at is not None:
+        hours = max((completed_at - reported_at).total_seconds(), 0) / 3600
+        completion_key = (timezone.localdate(completed_at), zone, worker, bucket_for(hours))
+    return status_key, completion_key
+
+
+def state_of(report):
+    return report_state(
+        report.reported_at, report.zone, report.assigned_worker_id, report.status, report.completed_at
+    )
+
+
+def add_state(deltas, state, sign):
+    if state is None:
+        return
+    status_key, completion_key = state
+    deltas[('status', status_key)] += sign
+    if completion_key is not None:
+        deltas[('completion', completion_key)] += sign
+
+
+def increment(model, key, delta):
+    fields = dict(zip(model.KEY_FIELDS, key))
+    if model.objects.filter(**fields).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **fields)
+    except IntegrityError:
+        # Created concurrently
+        model.objects.filter(**fields).update(count=F('count') + delta)
+
+
+def apply_deltas(deltas):
+    from .models import DailyCompletionRollup, DailyStatusRollup
+
+    models = {'status': DailyStatusRollup, 'completion': DailyCompletionRollup}
+    for (kind, key), delta in deltas.items():
+        if delta:
+            increment(models[kind], key, delta)
+
+
+def move(before, after):
+    """Move one report's contribution from state before to state after (either may be None)"""
+    if before == after or suspended():
+        return
+    deltas = Counter()
+    add_state(deltas, before, -1)
+    add_state(deltas, after, 1)
+    apply_deltas(deltas)
+
+
+def states(queryset):
+    return {row[0]: report_state(*row[1:]) for row in queryset.values_list(*STATE_FIELDS)}
+
+
+@contextmanager
+def tracking(queryset):
+    """
+    Wrap a bulk update()/delete() of the reports in queryset, like
+    unviewed.tracking: per-row hooks are off and the net change is applied
+    once per rollup row. queryset should select by primary key.
+    """
+    before = states(queryset)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = False
+    after = states(queryset)
+    deltas = Counter()
+    for report_id in set(before) | set(after):
+        add_state(deltas, before.get(report_id), -1)
+        add_state(deltas, after.get(report_id), 1)
+    apply_deltas(deltas)
+
+
+def expected_counts(reports):
+    """Rollup counts computed from scratch over the reports queryset"""
+    deltas = Counter()
+    for row in reports.values_list(*STATE_FIELDS).order_by().iterator(chunk_size=5000):
+        add_state(deltas, report_state(*row[1:]), 1)
+    return deltas
+
+
+def stored_counts():
+    from .models import DailyCompletionRollup, DailyStatusRollup
+
+    counts = Counter()
+    for kind, model in (('status', DailyStatusRollup), ('completion', DailyCompletionRollup)):
+        for row in model.objects.values_list(*model.KEY_FIELDS, 'count').iterator(chunk_size=5000):
+            counts[(kind, tuple(row[:-1]))] = row[-1]
+    return counts
+
+
+def find_drift():
+    from .models import GarbageReport
+
+    expected = expected_counts(GarbageReport.objects.all())
+    stored = stored_counts()
+    return {
+        key: (stored.get(key, 0), expected.get(key, 0))
+        for key in set(expected) | set(stored)
+        if stored.get(key, 0) != expected.get(key, 0)
+    }
+
+
+def rebuild(dry_run=False):
+    """
+    Recompute every rollup from the reports table and correct the stored
+    rows that differ. Returns {(kind, key): (stored, expected)} for those.
+    The first scan runs outside a transaction, so the usual no-drift run
+    never holds the write lock; only a correction rescans inside one.
+    """
+    from .models import DailyCompletionRollup, DailyStatusRollup
+
+    drift = find_drift()
+    if dry_run or not drift:
+        return drift
+    models = {'status': DailyStatusRollup, 'completion': DailyCompletionRollup}
+    with transaction.atomic():
+        # Lock the rollup rows before the rescan, so an increment() whose
+        # report change the rescan can't see yet waits and lands on top of
+        # the corrected count instead of being overwritten by it
+        for model in models.values():
+            list(model.objects.select_for_update().order_by('id').values_list('id', flat=True))
+        drift = find_drift()
+        for (kind, key), (_, count) in drift.items():
+            model = models[kind]
+            fields = dict(zip(model.KEY_FIELDS, key))
+            if count:
+                model.objects.update_or_create(defaults={'count': count}, **fields)
+            else:
+                model.objects.filter(**fields).delete()
+    return drift
+
+
+def percentile(histogram, fraction):
+    """
+    Estimate a percentile in hours from {bucket: count}, interpolating
+    linearly inside the bucket it falls in
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = fraction * total
+    seen = 0
+    for bucket in sorted(histogram):
+        count = histogram[bucket]
+        if count and seen + count >= target:
+            lower, upper = bucket_bounds(bucket)
+            if upper is None:
+                return lower
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return bucket_bounds(max(histogram))[0]
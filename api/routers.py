@@ -0,0 +1,60 @@
+"""
+Primary/replica routing.
+
+Writes always go to the primary. Reads go to the 'replica' database only
+inside replica_reads(), which wraps the read-heavy paths that can tolerate
+a little replication lag: report list/retrieve and the unviewed count.
+Everything else, including reads that must see a write just made, stays on
+the primary. Without a configured replica this is a no-op.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = 'replica'
+
+_state = threading.local()
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def replica_reads():
+    previous = getattr(_state, 'replica', False)
+    _state.replica = True
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def read_database():
+    """Alias for reads that can explicitly go to the replica, like exports"""
+    return REPLICA if replica_configured() else DEFAULT_DB_ALIAS
+
+
+def reading_from_replica():
+    return getattr(_state, 'replica', False) and replica_configured()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or an instance read from the replica would be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema through replication
+        return db != REPLICA
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import GarbageReport, WorkerProfile
+from .uploads import UploadError, validate_new_upload
 
 class WorkerProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,7 +17,23 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'password', 'worker_profile', 'user_type')
         extra_kwargs = {'password': {'write_only': True}}
 
-class GarbageReportSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Lets GET requests pick the returned fields with ?fields=id,status,...
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        fields = request.query_params.get('fields')
+        if fields:
+            requested = {name.strip() for name in fields.split(',') if name.strip()}
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+class GarbageReportSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     worker_name = serializers.CharField(source='assigned_worker.user.username', read_only=True)
     worker_zone = serializers.IntegerField(source='assigned_worker.zone', read_only=True)
@@ -27,20 +44,22 @@ class GarbageReportSerializer(serializers.ModelSerializer):
             'id', 'image', 'description', 'latitude', 'longitude', 
             'reported_at', 'status', 'zone', 'user', 'username',
             'completion_image', 'completed_at', 'is_viewed',
-            'worker_notes', 'worker_name', 'worker_zone', 'video'
+            'worker_notes', 'worker_name', 'worker_zone', 'video',
+            'image_thumbnail', 'image_webp', 'completion_thumbnail', 'completion_webp',
+            'duplicate_of'
         )
-        read_only_fields = ('user', 'reported_at', 'zone', 'assigned_worker')
-    username = serializers.CharField(source='user.username', read_only=True)
-    worker_name = serializers.CharField(source='assigned_worker.user.username', read_only=True)
-    worker_zone = serializers.IntegerField(source='assigned_worker.zone', read_only=True)
-    
-    class Meta:
-        model = GarbageReport
-        fields = (
-            'id', 'image', 'description', 'latitude', 'longitude', 
-            'reported_at', 'status', 'zone', 'user', 'username',
-            'completion_image', 'completed_at', 'is_viewed',
-            'worker_notes', 'worker_name', 'worker_zone', 'video'
+        # Status and its companions only change through api/transitions.py
+        read_only_fields = (
+            'user', 'reported_at', 'zone', 'assigned_worker', 'status', 'is_viewed', 'completed_at',
+            'image_thumbnail', 'image_webp', 'completion_thumbnail', 'completion_webp',
+            'duplicate_of'
         )
-        read_only_fields = ('user', 'reported_at', 'zone', 'assigned_worker')
-        
\ No newline at end of file
+
+    def validate_video(self, video):
+        """Reject oversized or non-video files before they are stored"""
+        if video:
+            try:
+                validate_new_upload(video.name, video.content_type, video.size)
+            except UploadError as e:
+                raise serializers.ValidationError(str(e))
+        return video
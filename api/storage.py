@@ -0,0 +1,311 @@
+"""
+Content-addressed media storage.
+
+Files are named by the SHA-256 of their bytes, cas/<first two hex
+digits>/<digest><extension>, hashed while the upload streams to a temp
+file. Saving bytes that are already stored just returns the existing name,
+so identical photos and videos are kept once however many reports use
+them, and names never need Django's random collision suffixes.
+
+A MediaBlob row per stored file holds its reference count: the number of
+report image, completion_image and video columns naming it. Counts are
+recomputed from those columns for the names a change touched, after the
+transaction commits, rather than incremented and decremented, so they
+can't drift. A blob whose count reaches zero is deleted together with its
+thumbnail and WebP variants, unless it was saved within BLOB_GRACE_PERIOD:
+a new upload can be on disk before the report naming it commits. The
+gc_media command sweeps those leftovers.
+
+Saving bytes whose blob is being collected must not end up naming a deleted
+file. Savers touch() the row before looking for the file, and collect()
+moves the file aside before its conditional delete of the row: either the
+delete sees the fresh saved_at and the file is put back, or the saver finds
+no file and writes its own copy.
+
+Names outside cas/ (files stored before this backend) are served and
+deleted as before; dedupe_media copies them into the store and removes
+the originals once no committed row names them.
+"""
+import hashlib
+import os
+import re
+import secrets
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import metrics
+
+BLOB_DIR = 'cas'
+GRACE_PERIOD = timedelta(seconds=getattr(settings, 'BLOB_GRACE_PERIOD', 3600))
+# Report columns that reference blobs; the variant columns follow their source
+MEDIA_FIELDS = ('image', 'completion_image', 'video')
+READ_SIZE = 64 * 1024
+
+BLOB_NAME = re.compile(rf'^{BLOB_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.[a-z0-9]+)?$')
+
+
+def blob_name(digest, extension=''):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{extension.lower()}'
+
+
+def is_blob_name(name):
+    return bool(name) and BLOB_NAME.match(name) is not None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def place(media_root, path, name):
+    """Move the file at path to the blob name, unless that blob is already stored"""
+    target = os.path.join(media_root, name)
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+    return name
+
+
+def store_file(media_root, path, extension, digest=None):
+    """
+    Move the file at path into the store and return its blob name. Plain
+    filesystem work so it can run in the image process pool; the caller
+    keep()s the name afterwards.
+    """
+    return place(media_root, path, blob_name(digest or file_sha256(path), extension))
+
+
+def save_blob(media_root, path, extension, digest=None):
+    """store_file() with the row touched first, so collect() can't take the blob"""
+    name = blob_name(digest or file_sha256(path), extension)
+    touch([name], {name: os.path.getsize(path)})
+    return place(media_root, path, name)
+
+
+def copy_into(path, target):
+    """Hard link path to target, or copy it across filesystems; path stays"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copyfile(path, target)
+
+
+def copy_blob(media_root, path, extension):
+    """save_blob() that leaves the file at path, for callers that remove it later"""
+    tmp_path = os.path.join(media_root, BLOB_DIR, 'tmp', f'{secrets.token_hex(8)}.copy')
+    copy_into(path, tmp_path)
+    try:
+        return save_blob(media_root, tmp_path, extension)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save
+        return name
+
+    @metrics.timed('media_write')
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1]
+        tmp_dir = os.path.join(self.location, BLOB_DIR, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            return save_blob(self.location, tmp_path, extension, digest.hexdigest())
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, path, name, digest=None):
+        """Move a finished local file (e.g. a chunked upload) into the store"""
+        return save_blob(self.location, path, os.path.splitext(name)[1], digest)
+
+    def url(self, name):
+        from . import media
+
+        url = super().url(name)
+        # Only signed links are served, see api/media.py
+        return f'{url}?{media.sign(name)}' if media.SIGNED else url
+
+    def delete(self, name):
+        # Blobs can be shared; only collect() removes them
+        if not is_blob_name(name):
+            super().delete(name)
+
+    def retire(self, name):
+        """Move a blob's file aside before collecting it; returns its new path"""
+        trash = os.path.join(self.location, BLOB_DIR, 'tmp', f'{secrets.token_hex(8)}.trash')
+        os.makedirs(os.path.dirname(trash), exist_ok=True)
+        try:
+            os.replace(self.path(name), trash)
+        except FileNotFoundError:
+            return None
+        return trash
+
+    def restore(self, name, trash):
+        # A saver may have written the same bytes back meanwhile; either copy will do
+        os.replace(trash, self.path(name))
+
+    def delete_blob(self, name, trash=None):
+        from .images import variant_names
+
+        if trash:
+            os.remove(trash)
+        for path in (name, *variant_names(name)):
+            super().delete(path)
+
+
+def media_names(report):
+    """Blob names referenced by a report's media columns"""
+    names = set()
+    for field in MEDIA_FIELDS:
+        value = getattr(report, field)
+        if value and is_blob_name(value.name):
+            names.add(value.name)
+    return names
+
+
+def touch(names, sizes=None):
+    """
+    Record blobs as just saved, so collect() gives their report time to
+    commit. sizes: name -> bytes, for files not in place yet.
+    """
+    from .models import MediaBlob
+
+    now = timezone.now()
+    for name in names:
+        if MediaBlob.objects.filter(name=name).update(saved_at=now):
+            continue
+        size = sizes[name] if sizes and name in sizes else _size(name)
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(name=name, saved_at=now, size=size)
+        except IntegrityError:
+            MediaBlob.objects.filter(name=name).update(saved_at=now)
+
+
+def keep(name):
+    """
+    touch() a blob written without a row, like the image pool's. False if
+    collect() took the file meanwhile, so the caller has to write it again.
+    """
+    from django.core.files.storage import default_storage
+
+    touch([name])
+    return default_storage.exists(name)
+
+
+def _size(name):
+    from django.core.files.storage import default_storage
+
+    try:
+        return default_storage.size(name)
+    except OSError:
+        return 0
+
+
+def references(names=None):
+    """name -> number of report columns naming it, for names or every blob"""
+    from django.db.models import Count
+    from .models import GarbageReport
+
+    counts = {}
+    for field in MEDIA_FIELDS:
+        reports = GarbageReport.objects.filter(**{f'{field}__startswith': f'{BLOB_DIR}/'})
+        if names is not None:
+            reports = reports.filter(**{f'{field}__in': names})
+        for name, count in reports.values_list(field).annotate(n=Count('id')).order_by():
+            counts[name] = counts.get(name, 0) + count
+    return counts
+
+
+def recount(names=None, grace=GRACE_PERIOD):
+    """
+    Recompute reference counts for the names (every blob when None) and
+    collect the ones left unreferenced. Returns the collected names.
+    """
+    from .models import MediaBlob
+
+    if names is not None:
+        names = [name for name in names if is_blob_name(name)]
+        if not names:
+            return []
+    counts = references(names)
+
+    blobs = MediaBlob.objects.all() if names is None else MediaBlob.objects.filter(name__in=names)
+    known = set()
+    changed = []
+    for blob in blobs.only('id', 'name', 'refcount'):
+        known.add(blob.name)
+        if blob.refcount != counts.get(blob.name, 0):
+            blob.refcount = counts.get(blob.name, 0)
+            changed.append(blob)
+    MediaBlob.objects.bulk_update(changed, ['refcount'])
+    # Referenced files that predate their row, e.g. written by the image pool
+    for name in set(counts) - known:
+        touch([name])
+        MediaBlob.objects.filter(name=name).update(refcount=counts[name])
+    return collect(names, grace)
+
+
+def collect(names=None, grace=GRACE_PERIOD):
+    """Delete unreferenced blobs saved longer than grace ago; returns their names"""
+    from django.core.files.storage import default_storage
+    from .models import MediaBlob
+
+    orphans = MediaBlob.objects.filter(refcount=0, saved_at__lt=timezone.now() - grace)
+    if names is not None:
+        orphans = orphans.filter(name__in=names)
+    collected = []
+    for blob in orphans.only('id', 'name'):
+        # Out of the way first, so a save of the same bytes from here on
+        # writes its own copy instead of counting on this one
+        trash = default_storage.retire(blob.name) if hasattr(default_storage, 'retire') else None
+        # Conditional delete: a concurrent touch() or recount keeps the blob
+        if MediaBlob.objects.filter(pk=blob.pk, refcount=0, saved_at__lt=timezone.now() - grace).delete()[0]:
+            if hasattr(default_storage, 'delete_blob'):
+                default_storage.delete_blob(blob.name, trash)
+            collected.append(blob.name)
+        elif trash:
+            default_storage.restore(blob.name, trash)
+    return collected
+
+
+def stored_names(media_root):
+    """Blob names of the files on disk under cas/"""
+    root = os.path.join(media_root, BLOB_DIR)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            name = os.path.relpath(os.path.join(directory, filename), media_root).replace(os.sep, '/')
+            if is_blob_name(name):
+                yield name
+
+
+def release(names):
+    """Recount the blobs once the current transaction commits"""
+    names = {name for name in names if is_blob_name(name)}
+    if names:
+        transaction.on_commit(lambda: recount(names))
@@ -1,3 +1,1559 @@
-from django.test import TestCase
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import (
+    dedup, geo, listcache, media, metrics, middleware, otp, rollups, storage, tiles, transitions, unviewed,
+)
+from .benchmarks import seed, stats as bench_stats
+from .directory import ZoneDirectory, get_zone_directory
+from .models import (
+    DailyCompletionRollup, DailyStatusRollup, GarbageReport, MediaBlob, VideoUpload, WorkerProfile,
+    ZoneNotification,
+)
+from .notifications import drain_outbox
+from .routers import ReplicaRouter, replica_reads
+from .zones import ZoneIndex, get_zone_index, point_in_ring
+
+
+class ZoneIndexTests(SimpleTestCase):
+    def setUp(self):
+        with open(os.path.join(settings.BASE_DIR, 'zone.json')) as f:
+            self.geojson = json.load(f)
+
+    def linear_scan(self, x, y):
+        for feature in self.geojson['features']:
+            if point_in_ring(x, y, feature['geometry']['coordinates'][0][0]):
+                return feature['properties']['Zone_No']
+        return None
+
+    def test_matches_linear_scan(self):
+        index = get_zone_index()
+        min_x, min_y, max_x, max_y = index.bbox
+        rng = random.Random(42)
+        for _ in range(2000):
+            x = rng.uniform(min_x - 0.001, max_x + 0.001)
+            y = rng.uniform(min_y - 0.001, max_y + 0.001)
+            self.assertEqual(index.locate(x, y), self.linear_scan(x, y))
+
+    def test_multipolygon_parts_and_holes(self):
+        square = [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]
+        hole = [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]]
+        island = [[20, 20], [22, 20], [22, 22], [20, 22], [20, 20]]
+        index = ZoneIndex({'features': [{
+            'properties': {'Zone_No': 3},
+            'geometry': {'type': 'MultiPolygon', 'coordinates': [[square, hole], [island]]},
+        }]})
+        self.assertEqual(index.locate(1, 1), 3)
+        self.assertIsNone(index.locate(5, 5))
+        self.assertEqual(index.locate(21, 21), 3)
+        self.assertIsNone(index.locate(15, 15))
+
+    def test_locate_many_matches_locate(self):
+        index = get_zone_index()
+        min_x, min_y, max_x, max_y = index.bbox
+        rng = random.Random(7)
+        xs = [rng.uniform(min_x, max_x) for _ in range(2000)]
+        ys = [rng.uniform(min_y, max_y) for _ in range(2000)]
+        expected = [index.locate(x, y) or 0 for x, y in zip(xs, ys)]
+        self.assertEqual(index.locate_many(xs, ys).tolist(), expected)
+
+
+class ReportTestCase(TestCase):
+    """Base class that starts every test with a fresh zone directory"""
+
+    def setUp(self):
+        # Test transactions roll back instead of committing, so on_commit
+        # invalidations from earlier tests never ran
+        get_zone_directory().invalidate_workers()
+        cache.clear()
+        self.user = User.objects.create_user('reporter', 'reporter@iitb.ac.in', 'pass')
+
+    def create_report(self, description='pile', latitude=19.1355, longitude=72.9100, **kwargs):
+        kwargs.setdefault('user', self.user)
+        kwargs.setdefault('image', 'garbage_reports/a.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            return GarbageReport.objects.create(
+                description=description, latitude=latitude, longitude=longitude, **kwargs
+            )
+
+
+class RezoneReportsCommandTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        self.worker = WorkerProfile.objects.create(user=worker_user, zone=1)
+        # A point inside the first Zone 1 polygon, stored with a stale zone
+        self.report = self.create_report('stale', zone='Zone 9')
+
+    def test_dry_run_does_not_write(self):
+        out = StringIO()
+        call_command('rezone_reports', '--dry-run', stdout=out)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.zone, 'Zone 9')
+        self.assertIn(f'Report {self.report.id}: Zone 9 -> Zone 1', out.getvalue())
+
+    def test_rezone_updates_zone_and_worker(self):
+        call_command('rezone_reports', stdout=StringIO())
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.zone, 'Zone 1')
+        self.assertEqual(self.report.assigned_worker, self.worker)
+
+
+    def test_rezone_leaves_duplicates_unassigned(self):
+        duplicate = self.create_report('again', zone='Zone 9', duplicate_of=self.report, status='CLOSED')
+        self.assertIsNone(duplicate.assigned_worker)
+        call_command('rezone_reports', stdout=StringIO())
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.zone, 'Zone 1')
+        self.assertIsNone(duplicate.assigned_worker)
+
+class ZoneNotificationOutboxTests(ReportTestCase):
+    def test_report_creation_only_queues(self):
+        report = self.create_report()
+        self.assertEqual(len(mail.outbox), 0)
+        notification = ZoneNotification.objects.get(report=report)
+        self.assertEqual(notification.recipient, 'ani.pp@iitb.ac.in')
+        self.assertEqual(notification.status, 'PENDING')
+
+    def test_drain_sends_one_digest_per_zone(self):
+        self.create_report('first')
+        self.create_report('second')
+        self.assertEqual(drain_outbox(), (2, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, '2 New Garbage Reports in Zone 1')
+        self.assertIn('first', mail.outbox[0].body)
+        self.assertIn('second', mail.outbox[0].body)
+        self.assertFalse(ZoneNotification.objects.exclude(status='SENT').exists())
+        self.assertEqual(drain_outbox(), (0, 0))
+
+    def test_failed_send_is_rescheduled(self):
+        self.create_report()
+
+        class BrokenConnection:
+            def open(self):
+                pass
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                raise ConnectionError('smtp down')
+
+        self.assertEqual(drain_outbox(connection=BrokenConnection()), (0, 1))
+        notification = ZoneNotification.objects.get()
+        self.assertEqual(notification.status, 'PENDING')
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, notification.created_at)
+        # Not due yet, so nothing is picked up
+        self.assertEqual(drain_outbox(), (0, 0))
+
+    def test_mail_is_sent_outside_a_transaction(self):
+        self.create_report()
+        test = self
+        depth = len(connection.atomic_blocks)
+
+        class CheckingConnection:
+            def open(self):
+                pass
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                # Only the test case's own atomic blocks are open
+                test.assertEqual(len(connection.atomic_blocks), depth)
+                # Claimed rows are not picked up by another drainer meanwhile
+                test.assertEqual(drain_outbox(), (0, 0))
+
+        self.assertEqual(drain_outbox(connection=CheckingConnection()), (1, 0))
+        self.assertEqual(ZoneNotification.objects.get().status, 'SENT')
+
+
+    def test_digest_names_every_zone(self):
+        self.create_report('first')
+        self.create_report('second')
+        ZoneNotification.objects.filter(report__description='second').update(zone='Zone 2')
+        self.assertEqual(drain_outbox(), (2, 0))
+        self.assertEqual(mail.outbox[0].subject, '2 New Garbage Reports in Zone 1, Zone 2')
+
+    def test_loop_survives_errors_and_reuses_the_connection(self):
+        class Stop(Exception):
+            pass
+
+        self.create_report()
+        drains = []
+        real_drain = drain_outbox
+
+        def flaky_drain(batch_size, connection):
+            drains.append(connection)
+            if len(drains) == 1:
+                raise DatabaseError('database is locked')
+            return real_drain(batch_size=batch_size, connection=connection)
+
+        err = StringIO()
+        with mock.patch('api.management.commands.send_notifications.drain_outbox', side_effect=flaky_drain), \
+                mock.patch('api.management.commands.send_notifications.time.sleep', side_effect=[None, None, Stop]):
+            with self.assertRaises(Stop):
+                call_command('send_notifications', '--loop', stdout=StringIO(), stderr=err)
+        self.assertIn('database is locked', err.getvalue())
+        self.assertEqual(len(drains), 3)
+        self.assertIs(drains[1], drains[2])
+        self.assertEqual(ZoneNotification.objects.get().status, 'SENT')
+
+class ZoneDirectoryTests(ReportTestCase):
+    def make_worker(self, username, zone, **kwargs):
+        user = User.objects.create_user(username, f'{username}@iitb.ac.in', 'pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            return WorkerProfile.objects.create(user=user, zone=zone, **kwargs)
+
+    def test_several_workers_in_zone_pick_oldest(self):
+        first = self.make_worker('je1', 1)
+        self.make_worker('je2', 1)
+        self.assertEqual(self.create_report().assigned_worker, first)
+
+    def test_worker_changes_invalidate_directory(self):
+        self.assertIsNone(self.create_report().assigned_worker)
+        worker = self.make_worker('je1', 1)
+        self.assertEqual(self.create_report().assigned_worker, worker)
+        with self.captureOnCommitCallbacks(execute=True):
+            worker.delete()
+        self.assertIsNone(self.create_report().assigned_worker)
+
+    def test_uncommitted_worker_changes_keep_directory(self):
+        worker_id = self.make_worker('je1', 1).id
+        self.assertEqual(get_zone_directory().get_worker_id(1), worker_id)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            WorkerProfile.objects.get(pk=worker_id).delete()
+        # Until the delete commits, requests keep the committed mapping
+        self.assertEqual(get_zone_directory().get_worker_id(1), worker_id)
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(get_zone_directory().get_worker_id(1))
+
+    def test_report_creation_hits_directory_not_database(self):
+        self.make_worker('je1', 1)
+        self.create_report()
+        # INSERTs for the report and its outbox row, the unviewed counter
+        # bump and the user id for its cache key, then the rollup bump
+        with self.assertNumQueries(5):
+            self.create_report()
+
+    def test_worker_changes_reach_other_processes_by_default(self):
+        # Another process's directory, sharing the configured cache
+        other = ZoneDirectory(cache_alias=get_zone_directory().cache_alias)
+        self.assertIsNone(other.get_worker_id(1))
+        worker = self.make_worker('je1', 1)
+        self.assertEqual(other.get_worker_id(1), worker.id)
+
+    def test_shared_cache_invalidation_reaches_other_processes(self):
+        first = ZoneDirectory(cache_alias='default')
+        second = ZoneDirectory(cache_alias='default')
+        self.assertIsNone(second.get_worker_id(2))
+        worker = self.make_worker('je2', 2)
+        first.invalidate_workers()
+        self.assertEqual(second.get_worker_id(2), worker.id)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ReportListTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        for i in range(5):
+            self.create_report(f'report {i}')
+
+    def test_list_is_cursor_paginated(self):
+        response = self.client.get('/api/reports/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['description'] for r in response.data['results']], ['report 4', 'report 3'])
+
+        seen = []
+        url = '/api/reports/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen += [r['description'] for r in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [f'report {i}' for i in range(4, -1, -1)])
+
+    def test_fields_parameter_limits_payload(self):
+        response = self.client.get('/api/reports/', {'fields': 'id,status,latitude,longitude'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status', 'latitude', 'longitude'})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SpatialQueryTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.centre = self.create_report('centre', 19.1355, 72.9100)
+        self.close = self.create_report('close', 19.1370, 72.9100)  # ~170m north
+        self.far = self.create_report('far', 19.1500, 72.9300)  # ~2.6km away
+
+    def descriptions(self, params):
+        response = self.client.get('/api/reports/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {r['description'] for r in response.data['results']}
+
+    def test_geohash_encoding(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(self.centre.geohash, geo.encode(19.1355, 72.9100))
+
+    def test_covering_cells_contain_every_point_in_box(self):
+        cells = geo.covering_cells(19.13, 72.90, 19.14, 72.92)
+        self.assertLessEqual(len(cells), geo.MAX_CELLS)
+        for lat, lng in [(19.13, 72.90), (19.14, 72.92), (19.135, 72.91)]:
+            self.assertTrue(any(geo.encode(lat, lng).startswith(cell) for cell in cells))
+
+    def test_bbox_filter(self):
+        self.assertEqual(self.descriptions({'bbox': '72.905,19.130,72.915,19.140'}), {'centre', 'close'})
+        self.assertEqual(self.descriptions({'bbox': '72.905,19.1360,72.915,19.140'}), {'close'})
+
+    def test_near_filter_uses_exact_distance(self):
+        self.assertEqual(self.descriptions({'near': '19.1355,72.9100', 'radius': 100}), {'centre'})
+        self.assertEqual(self.descriptions({'near': '19.1355,72.9100', 'radius': 300}), {'centre', 'close'})
+        self.assertEqual(
+            self.descriptions({'near': '19.1355,72.9100', 'radius': 5000}), {'centre', 'close', 'far'}
+        )
+
+    def test_invalid_parameters(self):
+        for params in [{'bbox': '1,2,3'}, {'bbox': '72.92,19.13,72.90,19.14'},
+                       {'near': '95,72.91'}, {'near': '19.13,72.91', 'radius': 100000}]:
+            self.assertEqual(self.client.get('/api/reports/', params).status_code, 400, params)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ReportTileTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.report = self.create_report('a', 19.1355, 72.9100)
+        self.create_report('b', 19.1356, 72.9101)
+        self.create_report('c', 19.1380, 72.9150)
+        self.create_report('elsewhere', 19.1500, 72.9300)
+        self.z = 14
+        self.x, self.y = tiles.tile_for(19.1355, 72.9100, self.z)
+
+    def get_tile(self):
+        response = self.client.get(f'/api/reports/tiles/{self.z}/{self.x}/{self.y}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_tile_math(self):
+        south, west, north, east = tiles.tile_bounds(self.z, self.x, self.y)
+        self.assertTrue(south <= 19.1355 <= north and west <= 72.9100 <= east)
+        self.assertEqual(tiles.tile_for(0, 0, 1), (1, 1))
+
+    def test_tile_clusters_reports_by_status(self):
+        tile = self.get_tile()
+        self.assertEqual(tile['count'], 3)
+        nearby = [c for c in tile['clusters'] if c['count'] == 2]
+        self.assertEqual(len(nearby), 1)
+        self.assertEqual(nearby[0]['statuses'], {'SENT': 2})
+        self.assertAlmostEqual(nearby[0]['latitude'], 19.13555)
+
+    def test_tile_is_cached_until_a_report_in_it_changes(self):
+        self.get_tile()
+        with self.assertNumQueries(0):
+            self.get_tile()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transitions.transition(self.report, 'RECEIVED')
+        statuses = {}
+        for cluster in self.get_tile()['clusters']:
+            for name, count in cluster['statuses'].items():
+                statuses[name] = statuses.get(name, 0) + count
+        self.assertEqual(statuses, {'SENT': 2, 'RECEIVED': 1})
+
+    def test_invalid_tile(self):
+        response = self.client.get('/api/reports/tiles/2/4/0/')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ReportQueryCountTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        self.worker = WorkerProfile.objects.create(user=worker_user, zone=1)
+        for i in range(3):
+            other = User.objects.create_user(f'student{i}', f'student{i}@iitb.ac.in', 'pass')
+            for j in range(10):
+                self.create_report(f'report {i}.{j}', user=other)
+        for j in range(10):
+            self.create_report(f'mine {j}')
+
+    def assert_list_queries(self, num, expected_rows):
+        with self.assertNumQueries(num):
+            response = self.client.get('/api/reports/', {'page_size': 200})
+        self.assertEqual(len(response.data['results']), expected_rows)
+        self.assertTrue(all(r['worker_name'] == 'je1' for r in response.data['results']))
+        return response
+
+    def test_anonymous_list(self):
+        # The page itself; nothing per row
+        self.assert_list_queries(1, 40)
+
+    def test_reporter_list(self):
+        self.client.force_authenticate(self.user)
+        # workerprofile lookup + the page
+        self.assert_list_queries(2, 10)
+
+    def test_worker_list(self):
+        # Fresh instance, as JWT authentication would load it
+        self.client.force_authenticate(User.objects.get(pk=self.worker.user_id))
+        self.assert_list_queries(2, 40)
+
+    def test_retrieve(self):
+        report = GarbageReport.objects.filter(user=self.user).first()
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/reports/{report.id}/')
+        self.assertEqual(response.data['worker_zone'], 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class UnviewedCountTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        self.worker = WorkerProfile.objects.create(user=worker_user, zone=1)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=worker_user.pk))
+
+    def assert_count(self, expected):
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, expected)
+        response = self.client.get('/api/unviewed-reports/')
+        self.assertEqual(response.data, {'count': expected})
+
+    def test_counter_follows_report_lifecycle(self):
+        first = self.create_report()
+        second = self.create_report()
+        self.create_report(status='COMPLETED')
+        self.assert_count(2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/reports/{first.id}/mark_viewed/')
+        self.assert_count(1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/reports/{second.id}/update_status/', {'status': 'RECEIVED'})
+        self.assert_count(0)
+
+        third = self.create_report()
+        with self.captureOnCommitCallbacks(execute=True):
+            third.delete()
+        self.assert_count(0)
+
+    def test_count_is_served_from_cache(self):
+        self.create_report()
+        self.assert_count(1)
+        # JWT user lookup is skipped by force_authenticate; nothing else runs
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/unviewed-reports/')
+        self.assertEqual(response.data, {'count': 1})
+
+    def test_non_worker_is_forbidden(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/unviewed-reports/').status_code, 403)
+
+    def test_recount_repairs_drift(self):
+        self.create_report()
+        WorkerProfile.objects.filter(pk=self.worker.pk).update(unviewed_count=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(unviewed.recount(), 1)
+        self.assert_count(1)
+
+    async def test_event_stream_sends_current_count(self):
+        await sync_to_async(self.create_report)()
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.worker.user)))()
+        response = await self.async_client.get('/api/unviewed-reports/stream/', {'token': token})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        first = await anext(aiter(response.streaming_content))
+        self.assertEqual(first, b'event: count\ndata: {"count": 1}\n\n')
+        await response.streaming_content.aclose()
+
+    async def test_event_stream_requires_token(self):
+        response = await self.async_client.get('/api/unviewed-reports/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(UNVIEWED_STREAM_INTERVAL=0.01, UNVIEWED_STREAM_MAX_DURATION=0.05)
+    async def test_event_stream_ends_after_max_duration(self):
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.worker.user)))()
+        response = await self.async_client.get('/api/unviewed-reports/stream/', {'token': token})
+        # The client reconnects; it isn't held open forever
+        events = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(events, [b'event: count\ndata: {"count": 0}\n\n'])
+
+    def test_event_stream_is_refused_under_wsgi(self):
+        self.assertEqual(self.client.get('/api/unviewed-reports/stream/').status_code, 501)
+
+
+def make_jpeg(size=(2400, 1200), orientation=None):
+    image = Image.new('RGB', size, (200, 30, 30))
+    buffer = BytesIO()
+    exif = Image.Exif()
+    exif[0x0110] = 'Phone Model'
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, 'JPEG', exif=exif.tobytes(), quality=95)
+    return buffer.getvalue()
+
+
+class ImageIngestionTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, SECURE_SSL_REDIRECT=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upload_is_normalized_and_gets_variants(self):
+        upload = SimpleUploadedFile('photo.jpg', make_jpeg(orientation=6), content_type='image/jpeg')
+        response = self.client.post('/api/reports/', {
+            'image': upload, 'description': 'pile', 'latitude': 19.1355, 'longitude': 72.91,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        report = GarbageReport.objects.get()
+        # Normalized into a new content-addressed blob, variants named after it
+        digest = storage.file_sha256(report.image.path)
+        self.assertEqual(report.image.name, storage.blob_name(digest, '.jpg'))
+        self.assertIn(f'variants/{digest}_thumb.webp?e=', response.data['image_thumbnail'])
+        with Image.open(report.image.path) as image:
+            # Rotated upright by the orientation tag, scaled down, EXIF gone
+            self.assertEqual(image.size, (960, 1920))
+            self.assertEqual(len(image.getexif()), 0)
+        with Image.open(report.image_thumbnail.path) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (320, 320)))
+        with Image.open(report.image_webp.path) as webp:
+            self.assertEqual(webp.format, 'WEBP')
+
+    def test_process_images_command_backfills(self):
+        os.makedirs(os.path.join(self.media_root, 'garbage_reports'))
+        with open(os.path.join(self.media_root, 'garbage_reports', 'old.jpg'), 'wb') as f:
+            f.write(make_jpeg())
+        report = self.create_report(image='garbage_reports/old.jpg')
+        out = StringIO()
+        call_command('process_images', '--workers', '1', stdout=out)
+        report.refresh_from_db()
+        self.assertEqual(report.image_thumbnail.name, 'garbage_reports/variants/old_thumb.webp')
+        self.assertTrue(os.path.exists(report.image_webp.path))
+        self.assertIn('Processed 1 images', out.getvalue())
+
+
+class VideoUploadTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, SECURE_SSL_REDIRECT=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.report = self.create_report()
+        self.video = b'\x00\x00\x00\x18ftypmp42' + os.urandom(100000)
+
+    def start(self, **data):
+        data = {'filename': 'clip.mp4', 'content_type': 'video/mp4', 'size': len(self.video), **data}
+        return self.client.post(f'/api/reports/{self.report.id}/video_upload/', data)
+
+    def put_chunk(self, upload_id, offset, chunk, checksum=None):
+        return self.client.generic(
+            'PUT', f'/api/video-uploads/{upload_id}/', chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_UPLOAD_CHECKSUM=checksum or hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def test_resumable_upload_attaches_video(self):
+        upload_id = self.start(sha256=hashlib.sha256(self.video).hexdigest()).data['id']
+        first, second = self.video[:60000], self.video[60000:]
+
+        self.assertEqual(self.put_chunk(upload_id, 0, first).data['offset'], 60000)
+        # A corrupted retry is rejected and leaves the offset alone
+        response = self.put_chunk(upload_id, 60000, second, checksum='0' * 64)
+        self.assertEqual((response.status_code, response['Upload-Offset']), (422, '60000'))
+        # Resuming from the wrong place is refused
+        self.assertEqual(self.put_chunk(upload_id, 0, first).status_code, 409)
+        self.assertEqual(self.client.head(f'/api/video-uploads/{upload_id}/')['Upload-Offset'], '60000')
+
+        response = self.put_chunk(upload_id, 60000, second)
+        self.assertEqual(response.data['status'], 'COMPLETE')
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.video.name, storage.blob_name(hashlib.sha256(self.video).hexdigest(), '.mp4'))
+        with open(self.report.video.path, 'rb') as f:
+            self.assertEqual(f.read(), self.video)
+
+    def test_failed_finish_can_be_retried(self):
+        upload_id = self.start().data['id']
+        with mock.patch.object(default_storage, 'adopt', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.put_chunk(upload_id, 0, self.video)
+        self.assertEqual(VideoUpload.objects.get(pk=upload_id).offset, len(self.video))
+
+        response = self.put_chunk(upload_id, len(self.video), b'')
+        self.assertEqual(response.data['status'], 'COMPLETE')
+        self.report.refresh_from_db()
+        with open(self.report.video.path, 'rb') as f:
+            self.assertEqual(f.read(), self.video)
+        # Chunk temp files are gone
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'garbage_videos', 'partial')), [])
+
+    def test_rejects_non_video_and_oversized_uploads(self):
+        self.assertEqual(self.start(filename='notes.txt', content_type='text/plain').status_code, 415)
+        self.assertEqual(self.start(size=10 ** 12).status_code, 413)
+
+        upload_id = self.start().data['id']
+        response = self.put_chunk(upload_id, 0, b'MZ\x90\x00' + os.urandom(96))
+        self.assertEqual(response.status_code, 415)
+
+    def test_only_owner_can_upload(self):
+        other = User.objects.create_user('other', 'other@iitb.ac.in', 'pass')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.start().status_code, 404)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkOperationTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        self.worker = WorkerProfile.objects.create(user=worker_user, zone=1)
+        self.other = User.objects.create_user('other', 'other@iitb.ac.in', 'pass')
+        self.mine = [self.create_report(f'mine {i}') for i in range(3)]
+        self.theirs = self.create_report('theirs', user=self.other)
+        self.client = APIClient()
+
+    def test_bulk_delete_only_touches_own_reports(self):
+        self.client.force_authenticate(self.user)
+        ids = [self.mine[0].id, self.mine[1].id, self.theirs.id, 999999]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/reports/bulk_delete/', {'ids': ids}, format='json')
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (2, 2))
+        self.assertEqual([r['success'] for r in response.data['results']], [True, True, False, False])
+        self.assertEqual(
+            set(GarbageReport.objects.values_list('id', flat=True)),
+            {self.mine[2].id, self.theirs.id},
+        )
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, 2)
+
+    def test_bulk_status_by_worker_is_set_based(self):
+        self.client.force_authenticate(User.objects.get(pk=self.worker.user_id))
+        ids = [r.id for r in self.mine] + [self.theirs.id]
+        # profile, scope, current statuses, savepoint, before counts and
+        # rollup states, update, after states, two rollup updates and a new
+        # rollup row (savepoint, insert, release), after counts, counter
+        # update + its cache key, release; the same for any number of reports
+        with self.assertNumQueries(17):
+            response = self.client.post(
+                '/api/reports/bulk_status/', {'ids': ids, 'status': 'IN_PROGRESS'}, format='json'
+            )
+        self.assertEqual(response.data['succeeded'], 4)
+        self.assertEqual(GarbageReport.objects.filter(status='IN_PROGRESS').count(), 4)
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, 0)
+
+    def test_bulk_close_requires_reporter(self):
+        self.client.force_authenticate(User.objects.get(pk=self.worker.user_id))
+        response = self.client.post(
+            '/api/reports/bulk_status/', {'filter': {'status': 'SENT'}, 'status': 'CLOSED'}, format='json'
+        )
+        self.assertEqual(response.data['succeeded'], 0)
+        self.assertEqual(response.data['results'][0]['error'], 'Not authorized to close this report')
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            '/api/reports/bulk_status/', {'filter': {'status': 'SENT'}, 'status': 'CLOSED'}, format='json'
+        )
+        self.assertEqual(response.data['succeeded'], 3)
+
+    def test_bulk_mark_viewed(self):
+        self.client.force_authenticate(User.objects.get(pk=self.worker.user_id))
+        response = self.client.post(
+            '/api/reports/bulk_mark_viewed/', {'ids': [self.mine[0].id, self.theirs.id]}, format='json'
+        )
+        self.assertEqual(response.data['succeeded'], 2)
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, 2)
+
+    def test_rejects_bad_requests(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post('/api/reports/bulk_delete/', {}, format='json').status_code, 400)
+        response = self.client.post(
+            '/api/reports/bulk_delete/', {'filter': {'description': 'x'}}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(
+            self.client.post('/api/reports/bulk_delete/', {'ids': [1]}, format='json').status_code, 401
+        )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StatusTransitionTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        self.worker = WorkerProfile.objects.create(user=worker_user, zone=1)
+        self.report = self.create_report()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=worker_user.pk))
+
+    def test_update_status_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'/api/reports/{self.report.id}/update_status/', {'status': 'IN_PROGRESS', 'worker_notes': 'on it'}
+            )
+        self.assertEqual(response.data['status'], 'IN_PROGRESS')
+        self.assertEqual(response.data['worker_notes'], 'on it')
+        sqls = [q['sql'] for q in queries]
+        updates = [i for i, sql in enumerate(sqls) if sql.startswith('UPDATE "api_garbagereport"')]
+        self.assertEqual(len(updates), 1)
+        update = sqls[updates[0]]
+        self.assertIn('"status" = \'SENT\'', update.split('WHERE')[1])
+        self.assertNotIn('"description"', update)
+        # The response is built from the instance, not a re-fetch
+        self.assertFalse(any('FROM "api_garbagereport"' in sql for sql in sqls[updates[0] + 1:]))
+
+    def test_invalid_transition_is_rejected(self):
+        transitions.transition(self.report, 'CLOSED')
+        response = self.client.post(f'/api/reports/{self.report.id}/update_status/', {'status': 'SENT'})
+        self.assertEqual(response.status_code, 400)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, 'CLOSED')
+
+    def test_update_cannot_skip_the_state_machine(self):
+        transitions.transition(self.report, 'CLOSED')
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(f'/api/reports/{self.report.id}/', {'status': 'SENT'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/reports/{self.report.id}/', {'is_viewed': True, 'description': 'moved'})
+        self.assertEqual(response.status_code, 200)
+        self.report.refresh_from_db()
+        self.assertEqual((self.report.status, self.report.is_viewed), ('CLOSED', False))
+        self.assertEqual(self.report.description, 'moved')
+
+        other = self.create_report()
+        response = self.client.patch(f'/api/reports/{other.id}/', {'status': 'CLOSED'})
+        self.assertEqual(response.data['status'], 'CLOSED')
+
+    def test_concurrent_change_is_a_conflict(self):
+        stale = GarbageReport.objects.get(pk=self.report.pk)
+        transitions.transition(GarbageReport.objects.get(pk=self.report.pk), 'IN_PROGRESS')
+        with self.assertRaises(transitions.TransitionConflict):
+            transitions.transition(stale, 'RECEIVED')
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, 'IN_PROGRESS')
+
+    def test_failed_side_effect_rolls_back_the_change(self):
+        with mock.patch('api.rollups.move', side_effect=DatabaseError('lost')):
+            with self.assertRaises(DatabaseError):
+                transitions.transition(self.report, 'IN_PROGRESS')
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, 'SENT')
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, 1)
+
+    def test_close_and_mark_viewed_keep_counter(self):
+        self.client.post(f'/api/reports/{self.report.id}/mark_viewed/')
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, 0)
+
+        other = self.create_report()
+        self.client.force_authenticate(self.user)
+        response = self.client.post(f'/api/reports/{other.id}/close_report/')
+        self.assertEqual(response.data['status'], 'CLOSED')
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, 0)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_stay_on_primary_without_replica(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(GarbageReport), 'default')
+
+    @mock.patch('api.routers.replica_configured', return_value=True)
+    def test_only_wrapped_reads_go_to_replica(self, _):
+        self.assertEqual(self.router.db_for_read(GarbageReport), 'default')
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(GarbageReport), 'replica')
+            self.assertEqual(self.router.db_for_write(GarbageReport), 'default')
+        self.assertEqual(self.router.db_for_read(GarbageReport), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'api'))
+        self.assertTrue(self.router.allow_migrate('default', 'api'))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RollupTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        self.worker = WorkerProfile.objects.create(user=worker_user, zone=1)
+        self.reports = [self.create_report(f'report {i}') for i in range(4)]
+
+    def complete(self, report, hours):
+        transitions.transition(report, 'COMPLETED', completed_at=report.reported_at + timedelta(hours=hours))
+
+    def test_rollups_follow_creates_transitions_and_deletes(self):
+        self.complete(self.reports[0], 3)
+        self.complete(self.reports[1], 30)
+        transitions.transition(self.reports[1], 'IN_PROGRESS')  # Reopened
+        self.complete(self.reports[1], 50)
+        self.reports[2].delete()
+
+        counts = dict(DailyStatusRollup.objects.values_list('status').annotate(total=Sum('count')))
+        self.assertEqual(counts, {'SENT': 1, 'COMPLETED': 2, 'IN_PROGRESS': 0})
+        self.assertEqual(DailyCompletionRollup.objects.aggregate(total=Sum('count'))['total'], 2)
+        self.assertEqual(rollups.rebuild(dry_run=True), {})
+
+    def test_bulk_operations_keep_rollups_in_sync(self):
+        self.client.force_authenticate(User.objects.get(pk=self.worker.user_id))
+        ids = [r.id for r in self.reports]
+        self.client.post('/api/reports/bulk_status/', {'ids': ids[:3], 'status': 'RECEIVED'}, format='json')
+        self.client.force_authenticate(self.user)
+        self.client.post('/api/reports/bulk_delete/', {'ids': ids[2:]}, format='json')
+        self.assertEqual(GarbageReport.objects.count(), 2)
+        self.assertEqual(rollups.rebuild(dry_run=True), {})
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        DailyStatusRollup.objects.update(count=F('count') + 2)
+        out = StringIO()
+        call_command('reconcile_rollups', stdout=out)
+        self.assertIn('SENT: 6 -> 4', out.getvalue())
+        self.assertEqual(rollups.rebuild(dry_run=True), {})
+
+    def test_reconcile_without_drift_writes_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rollups.rebuild(), {})
+        self.assertFalse([q for q in queries if not q['sql'].startswith('SELECT')])
+
+    def test_percentile_interpolates_within_bucket(self):
+        histogram = {rollups.bucket_for(3): 1, rollups.bucket_for(30): 1}
+        self.assertEqual(rollups.percentile(histogram, 0.5), 4)  # Top of the 2-4h bucket
+        self.assertEqual(rollups.percentile(histogram, 1.0), 36)
+        self.assertIsNone(rollups.percentile({}, 0.5))
+
+    def test_analytics_endpoint(self):
+        self.complete(self.reports[0], 3)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/analytics/zones/').status_code, 403)
+
+        admin = User.objects.create_user('admin', 'admin@iitb.ac.in', 'pass', is_staff=True)
+        self.client.force_authenticate(admin)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/analytics/zones/')
+        zone = response.data['zones'][0]
+        self.assertEqual(zone['zone'], 'Zone 1')
+        self.assertEqual(zone['statuses'], {'SENT': 3, 'COMPLETED': 1})
+        self.assertEqual(zone['completed'], 1)
+        self.assertEqual(zone['backlog']['open'], 3)
+        self.assertEqual(zone['backlog']['oldest_days'], 0)
+        self.assertEqual(response.data['workers'][0]['username'], 'je1')
+
+        self.assertEqual(self.client.get('/api/analytics/zones/', {'from': 'soon'}).status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ExportTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.admin = User.objects.create_user('admin', 'admin@iitb.ac.in', 'pass', is_staff=True)
+        self.reports = [self.create_report(f'report {i}') for i in range(3)]
+        transitions.transition(self.reports[1], 'RECEIVED')
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get('/api/reports/export/', params)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        response, body = self.export(output='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual([row['description'] for row in rows], ['report 0', 'report 1', 'report 2'])
+        self.assertEqual(rows[0]['zone'], 'Zone 1')
+        self.assertTrue(rows[0]['image'].startswith('/media/garbage_reports/a.jpg?e='))
+
+    def test_csv_cells_are_not_formulas(self):
+        GarbageReport.objects.filter(pk=self.reports[0].pk).update(description='=HYPERLINK("http://x")')
+        GarbageReport.objects.filter(pk=self.reports[1].pk).update(zone='@SUM(A1)', worker_notes='-1+2')
+        _, body = self.export(output='csv')
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(rows[0]['description'], '\'=HYPERLINK("http://x")')
+        self.assertEqual((rows[1]['zone'], rows[1]['worker_notes']), ("'@SUM(A1)", "'-1+2"))
+        # Numbers stay numbers, and other formats keep the raw text
+        self.assertEqual(rows[0]['longitude'], '72.91')
+        _, body = self.export(output='ndjson')
+        self.assertEqual(json.loads(body.splitlines()[0])['description'], '=HYPERLINK("http://x")')
+
+    def test_ndjson_and_geojson_exports_with_filters(self):
+        _, body = self.export(output='ndjson', status='RECEIVED', zone='1')
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([line['id'] for line in lines], [self.reports[1].id])
+
+        today = timezone.localdate().isoformat()
+        _, body = self.export(output='geojson', **{'from': today, 'to': today})
+        collection = json.loads(body)
+        self.assertEqual(len(collection['features']), 3)
+        self.assertEqual(collection['features'][0]['geometry']['coordinates'], [72.9100, 19.1355])
+
+        _, body = self.export(output='ndjson', **{'to': '2000-01-01'})
+        self.assertEqual(body, '')
+
+    def test_export_requires_admin_and_valid_parameters(self):
+        self.assertEqual(self.client.get('/api/reports/export/', {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/export/', {'status': 'LOST'}).status_code, 400)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/reports/export/').status_code, 403)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_reports', '--format', 'ndjson', '--status', 'SENT', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ListCacheTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        self.worker = WorkerProfile.objects.create(user=worker_user, zone=1)
+        self.report = self.create_report('first')
+
+    def test_repeated_anonymous_list_is_served_from_cache(self):
+        first = self.client.get('/api/reports/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/reports/')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertNotEqual(self.client.get('/api/reports/', {'page_size': 1})['ETag'], first['ETag'])
+
+    def test_if_none_match_gets_304_until_a_report_changes(self):
+        etag = self.client.get('/api/reports/')['ETag']
+        response = self.client.get('/api/reports/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transitions.transition(self.report, 'RECEIVED')
+        response = self.client.get('/api/reports/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['status'], 'RECEIVED')
+
+    def test_no_304_once_the_cached_page_expires(self):
+        etag = self.client.get('/api/reports/')['ETag']
+        # Nothing bumped the versions, but the page timed out
+        later = time.time() + listcache.TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            response = self.client.get('/api/reports/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_pages_read_from_the_replica_expire_sooner(self):
+        with mock.patch('api.views.reading_from_replica', return_value=True):
+            etag = self.client.get('/api/reports/')['ETag']
+        later = time.time() + listcache.REPLICA_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            response = self.client.get('/api/reports/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_changes_before_its_media_links_expire(self):
+        etag = self.client.get('/api/reports/')['ETag']
+        later = time.time() + media.URL_BUCKET
+        with mock.patch.object(listcache.time, 'time', return_value=later):
+            response = self.client.get('/api/reports/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_reassigning_a_report_drops_it_from_the_old_workers_list(self):
+        self.client.force_authenticate(User.objects.get(pk=self.worker.user_id))
+        self.assertEqual(len(self.client.get('/api/reports/').data['results']), 1)
+
+        other_user = User.objects.create_user('je2', 'je2@iitb.ac.in', 'pass')
+        other = WorkerProfile.objects.create(user=other_user, zone=2)
+        report = GarbageReport.objects.get(pk=self.report.pk)
+        report.assigned_worker = other
+        with self.captureOnCommitCallbacks(execute=True):
+            report.save()
+        self.assertEqual(self.client.get('/api/reports/').data['results'], [])
+
+    def test_scopes_are_bumped_only_by_their_reports(self):
+        self.client.force_authenticate(User.objects.get(pk=self.worker.user_id))
+        worker_etag = self.client.get('/api/reports/')['ETag']
+
+        # Outside every zone, so not assigned to the worker
+        self.create_report('elsewhere', latitude=10.0, longitude=10.0)
+        self.assertEqual(self.client.get('/api/reports/')['ETag'], worker_etag)
+
+        self.create_report('second')
+        response = self.client.get('/api/reports/')
+        self.assertNotEqual(response['ETag'], worker_etag)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, OTP_SEND_ASYNC=False, TRUSTED_PROXY_COUNT=0)
+class OTPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def send(self, email='new@iitb.ac.in', ip='10.0.0.1', **headers):
+        return self.client.post('/api/send-otp/', {'email': email}, REMOTE_ADDR=ip, format='json', **headers)
+
+    def verify(self, code, email='new@iitb.ac.in'):
+        return self.client.post(
+            '/api/verify-otp/', {'email': email, 'otp': code, 'password': 'secret123'}, format='json'
+        )
+
+    def sent_code(self):
+        return mail.outbox[-1].body.rsplit(' ', 1)[-1]
+
+    def test_sign_up_without_session(self):
+        self.assertEqual(self.send().status_code, 200)
+        self.assertEqual(mail.outbox[-1].to, ['new@iitb.ac.in'])
+        response = self.verify(self.sent_code())
+        self.assertEqual(response.status_code, 200, response.data)
+        user = User.objects.get(email='new@iitb.ac.in')
+        self.assertEqual(user.username, 'new')
+        self.assertTrue(user.check_password('secret123'))
+        self.assertFalse(Session.objects.exists())
+        # Single use
+        self.assertIsNone(cache.get(otp.code_key('new@iitb.ac.in')))
+
+    def test_code_is_dropped_after_too_many_wrong_attempts(self):
+        self.send()
+        code = self.sent_code()
+        wrong = '000000' if code != '000000' else '111111'
+        for _ in range(otp.MAX_ATTEMPTS):
+            self.assertEqual(self.verify(wrong).data['error'], 'Invalid OTP')
+        self.assertEqual(self.verify(code).data['error'], 'Too many attempts, request a new OTP')
+        self.assertFalse(User.objects.filter(email='new@iitb.ac.in').exists())
+
+    def test_sends_are_rate_limited_per_email(self):
+        limit, _ = otp.EMAIL_RATE
+        for _ in range(limit):
+            self.assertEqual(self.send().status_code, 200)
+        response = self.send()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @mock.patch.object(otp, 'IP_RATE', (2, 3600))
+    def test_sends_are_rate_limited_per_ip(self):
+        self.send(email='a@iitb.ac.in')
+        self.send(email='b@iitb.ac.in')
+        self.assertEqual(self.send(email='c@iitb.ac.in').status_code, 429)
+        self.assertEqual(self.send(email='c@iitb.ac.in', ip='10.0.0.2').status_code, 200)
+
+    @mock.patch.object(otp, 'IP_RATE', (2, 3600))
+    @override_settings(TRUSTED_PROXY_COUNT=1, CLIENT_IP_HEADER='X-Forwarded-For')
+    def test_clients_behind_one_proxy_are_limited_separately(self):
+        proxy = '127.0.0.1'
+        for email in ('a@iitb.ac.in', 'b@iitb.ac.in'):
+            self.assertEqual(self.send(email=email, ip=proxy, HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 200)
+        # A spoofed leftmost entry doesn't help; the proxy's own entry counts
+        response = self.send(email='c@iitb.ac.in', ip=proxy, HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7')
+        self.assertEqual(response.status_code, 429)
+        response = self.send(email='c@iitb.ac.in', ip=proxy, HTTP_X_FORWARDED_FOR='198.51.100.9')
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch.object(otp.time, 'sleep')
+    def test_failed_email_is_retried_and_logged(self, sleep):
+        with mock.patch.object(otp, 'send_mail', side_effect=ConnectionError('smtp down')) as send:
+            with self.assertLogs('api.otp', 'WARNING') as logs:
+                self.assertFalse(otp.deliver('new@iitb.ac.in', '123456'))
+        self.assertEqual(send.call_count, otp.SEND_ATTEMPTS)
+        self.assertEqual(logs.records[-1].levelname, 'ERROR')
+        self.assertNotIn('new@iitb.ac.in', '\n'.join(logs.output))
+
+        with mock.patch.object(otp, 'send_mail', side_effect=[ConnectionError('blip'), 1]):
+            with self.assertLogs('api.otp', 'WARNING'):
+                self.assertTrue(otp.deliver('new@iitb.ac.in', '123456'))
+
+    @mock.patch.object(otp, 'IP_RATE', (2, 3600))
+    def test_forwarded_header_is_ignored_without_trusted_proxies(self):
+        # Rotating the header doesn't give a client a fresh limit
+        self.send(email='a@iitb.ac.in', HTTP_X_FORWARDED_FOR='203.0.113.1')
+        self.send(email='b@iitb.ac.in', HTTP_X_FORWARDED_FOR='203.0.113.2')
+        response = self.send(email='c@iitb.ac.in', HTTP_X_FORWARDED_FOR='198.51.100.9')
+        self.assertEqual(response.status_code, 429)
+
+    @mock.patch.object(otp, 'IP_RATE', (2, 3600))
+    @override_settings(TRUSTED_PROXY_COUNT=1, CLIENT_IP_HEADER='X-Forwarded-For')
+    def test_missing_forwarded_header_falls_back_to_the_connection(self):
+        self.send(email='a@iitb.ac.in')
+        self.send(email='b@iitb.ac.in')
+        self.assertEqual(self.send(email='c@iitb.ac.in').status_code, 429)
+
+    def test_rejected_sign_up_keeps_the_code(self):
+        User.objects.create_user('new', 'new@other.example', 'pass')
+        self.send()
+        response = self.verify(self.sent_code())
+        self.assertIn('username', response.data)
+        self.assertIsNotNone(cache.get(otp.code_key('new@iitb.ac.in')))
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    LOGIN_FAILURE_RATE=(3, 900),
+)
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('je', email='je@iitb.ac.in', password='secret123')
+        WorkerProfile.objects.create(user=self.user, zone=2)
+
+    def login(self, password='secret123', email='je@iitb.ac.in', user_type='worker'):
+        return self.client.post(
+            '/api/login/', {'email': email, 'password': password, 'user_type': user_type}, format='json'
+        )
+
+    def test_worker_login_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.login()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['user']['worker_profile'], {'zone': 2, 'is_worker': True})
+
+    def test_errors(self):
+        missing = self.login(email='nobody@iitb.ac.in')
+        wrong = self.login(password='wrong')
+        self.assertEqual((missing.status_code, missing.data), (wrong.status_code, wrong.data))
+        self.assertEqual(wrong.status_code, 401)
+        User.objects.create_user('plain', email='plain@iitb.ac.in', password='secret123')
+        self.assertEqual(self.login(email='plain@iitb.ac.in').status_code, 403)
+        self.assertEqual(self.login(email='plain@iitb.ac.in', user_type='user').status_code, 200)
+
+    def test_failed_logins_are_throttled_per_account(self):
+        for _ in range(3):
+            self.assertEqual(self.login(password='wrong').status_code, 401)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Other accounts are unaffected
+        User.objects.create_user('other', email='other@iitb.ac.in', password='secret123')
+        self.assertEqual(self.login(email='other@iitb.ac.in', user_type='user').status_code, 200)
+
+    def test_successful_login_clears_failures(self):
+        self.login(password='wrong')
+        self.login(password='wrong')
+        self.assertEqual(self.login().status_code, 200)
+        self.login(password='wrong')
+        self.login(password='wrong')
+        self.assertEqual(self.login().status_code, 200)
+
+
+def make_photo(seed, size=(800, 600)):
+    """JPEG of random coloured blocks, distinct per seed"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', size)
+    block = 50
+    for x in range(0, size[0], block):
+        for y in range(0, size[1], block):
+            colour = tuple(rng.randrange(256) for _ in range(3))
+            image.paste(colour, (x, y, x + block, y + block))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class DuplicateDetectionTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, SECURE_SSL_REDIRECT=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        self.worker = WorkerProfile.objects.create(user=worker_user, zone=1)
+
+    def submit(self, photo, latitude=19.1355, longitude=72.9100):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/reports/', {
+                'image': SimpleUploadedFile('photo.jpg', photo, content_type='image/jpeg'),
+                'description': 'pile', 'latitude': latitude, 'longitude': longitude,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return GarbageReport.objects.get(pk=response.data['id'])
+
+    def test_resubmitted_photo_is_linked_to_open_report(self):
+        first = self.submit(make_photo(1))
+        self.assertEqual(first.assigned_worker, self.worker)
+        self.assertIsNone(first.duplicate_of)
+
+        # Same pile, photo re-encoded smaller, a few metres away
+        copy = BytesIO()
+        Image.open(BytesIO(make_photo(1))).resize((400, 300)).save(copy, 'JPEG', quality=60)
+        second = self.submit(copy.getvalue(), latitude=19.13555, longitude=72.91003)
+        self.assertEqual(second.duplicate_of, first)
+        self.assertEqual(second.status, 'CLOSED')
+        self.assertIsNone(second.assigned_worker)
+        self.assertEqual(ZoneNotification.objects.filter(report=second).count(), 0)
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, 1)
+
+    def test_wrong_duplicate_can_be_reopened(self):
+        first = self.submit(make_photo(1))
+        second = self.submit(make_photo(1), latitude=19.13555)
+        self.assertEqual(second.duplicate_of, first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/reports/{second.id}/unlink_duplicate/')
+        self.assertEqual(response.status_code, 200, response.data)
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.duplicate_of, second.assigned_worker), ('SENT', None, self.worker))
+        self.assertEqual(ZoneNotification.objects.filter(report=second).count(), 1)
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.unviewed_count, 2)
+        self.assertEqual(rollups.rebuild(dry_run=True), {})
+
+        # Only once, and only for duplicates
+        response = self.client.post(f'/api/reports/{second.id}/unlink_duplicate/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_photos_places_and_times_are_not_duplicates(self):
+        first = self.submit(make_photo(1))
+        self.assertIsNone(self.submit(make_photo(2)).duplicate_of)
+        # About 500m north
+        self.assertIsNone(self.submit(make_photo(1), latitude=19.1400).duplicate_of)
+
+        GarbageReport.objects.filter(pk=first.pk).update(reported_at=timezone.now() - timedelta(days=7))
+        self.assertIsNone(self.submit(make_photo(1)).duplicate_of)
+
+    def test_completed_reports_are_not_matched(self):
+        first = self.submit(make_photo(1))
+        GarbageReport.objects.filter(pk=first.pk).update(status='COMPLETED')
+        self.assertIsNone(self.submit(make_photo(1)).duplicate_of)
+
+    def test_hash_command_backfills(self):
+        os.makedirs(os.path.join(self.media_root, 'garbage_reports'))
+        with open(os.path.join(self.media_root, 'garbage_reports', 'old.jpg'), 'wb') as f:
+            f.write(make_photo(3))
+        report = self.create_report(image='garbage_reports/old.jpg')
+        call_command('hash_report_images', stdout=StringIO())
+        report.refresh_from_db()
+        self.assertEqual(report.image_hash, dedup.image_hash(BytesIO(make_photo(3))))
+
+
+class ContentAddressedStorageTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, SECURE_SSL_REDIRECT=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, photo, latitude=19.1355):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/reports/', {
+                'image': SimpleUploadedFile('photo.jpg', photo, content_type='image/jpeg'),
+                'description': 'pile', 'latitude': latitude, 'longitude': 72.91,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return GarbageReport.objects.get(pk=response.data['id'])
+
+    def blob_files(self):
+        return sorted(storage.stored_names(self.media_root))
+
+    def test_identical_uploads_are_stored_once_and_collected_with_last_report(self):
+        # Far apart, so duplicate detection leaves both reports alone
+        first = self.submit(make_jpeg())
+        second = self.submit(make_jpeg(), latitude=19.1400)
+        self.assertEqual(first.image.name, second.image.name)
+        blob = MediaBlob.objects.get(name=first.image.name)
+        self.assertEqual(blob.refcount, 2)
+        files = self.blob_files()
+        # The raw upload is kept for the grace period
+        self.assertEqual(len(files), 2)
+        MediaBlob.objects.update(saved_at=timezone.now() - timedelta(days=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+        self.assertTrue(os.path.exists(second.image.path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=second.image.name).exists())
+        self.assertFalse(os.path.exists(second.image.path))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, second.image_thumbnail.name)))
+
+        call_command('gc_media', '--grace', '0', stdout=StringIO())
+        self.assertEqual(self.blob_files(), [])
+
+    def test_completion_images_are_counted_and_released(self):
+        worker_user = User.objects.create_user('je1', 'je1@iitb.ac.in', 'pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkerProfile.objects.create(user=worker_user, zone=1)
+        report = self.submit(make_jpeg())
+        self.client.force_authenticate(worker_user)
+
+        def complete(photo):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/api/reports/{report.id}/update_status/', {
+                    'status': 'COMPLETED',
+                    'completion_image': SimpleUploadedFile('done.jpg', photo, content_type='image/jpeg'),
+                }, format='multipart')
+            self.assertEqual(response.status_code, 200, response.data)
+            report.refresh_from_db()
+            return report.completion_image.name
+
+        first = complete(make_photo(1))
+        self.assertEqual(MediaBlob.objects.get(name=first).refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            transitions.transition(report, 'IN_PROGRESS')
+        second = complete(make_photo(2))
+        self.assertNotEqual(first, second)
+        self.assertEqual(MediaBlob.objects.get(name=second).refcount, 1)
+        self.assertEqual(MediaBlob.objects.get(name=first).refcount, 0)
+
+    def test_save_racing_collect_keeps_the_file(self):
+        photo = make_jpeg()
+        name = default_storage.save('garbage_reports/a.jpg', ContentFile(photo))
+        MediaBlob.objects.update(saved_at=timezone.now() - timedelta(days=1))
+        retire = default_storage.retire
+
+        def retire_during_save(blob_name):
+            trash = retire(blob_name)
+            # Another upload of the same bytes lands between the move and the delete
+            self.assertEqual(default_storage.save('garbage_reports/b.jpg', ContentFile(photo)), name)
+            return trash
+
+        with mock.patch.object(default_storage, 'retire', side_effect=retire_during_save):
+            self.assertEqual(storage.collect(grace=timedelta(hours=1)), [])
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
+        with default_storage.open(name) as f:
+            self.assertEqual(f.read(), photo)
+        tmp = os.path.join(self.media_root, storage.BLOB_DIR, 'tmp')
+        self.assertFalse([f for f in os.listdir(tmp) if f.endswith('.trash')])
+
+    def test_dedupe_media_moves_legacy_files(self):
+        os.makedirs(os.path.join(self.media_root, 'garbage_reports'))
+        for name in ('old.jpg', 'old_Wqoyx.jpg'):
+            with open(os.path.join(self.media_root, 'garbage_reports', name), 'wb') as f:
+                f.write(make_jpeg())
+        first = self.create_report(image='garbage_reports/old.jpg')
+        second = self.create_report(image='garbage_reports/old_Wqoyx.jpg')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_media', stdout=StringIO())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(storage.is_blob_name(first.image.name))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.blob_files(), [first.image.name])
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'garbage_reports')), [])
+
+    def test_interrupted_dedupe_media_can_be_rerun(self):
+        os.makedirs(os.path.join(self.media_root, 'garbage_reports'))
+        for seed, name in enumerate(('one.jpg', 'two.jpg')):
+            with open(os.path.join(self.media_root, 'garbage_reports', name), 'wb') as f:
+                f.write(make_photo(seed))
+        reports = [self.create_report(image=f'garbage_reports/{n}') for n in ('one.jpg', 'two.jpg')]
+
+        with mock.patch.object(GarbageReport.objects, 'bulk_update', side_effect=DatabaseError('lost')):
+            with self.assertRaises(DatabaseError):
+                call_command('dedupe_media', '--chunk-size', '1', stdout=StringIO())
+        # Rows still name the originals, which are still there
+        for report in reports:
+            report.refresh_from_db()
+            self.assertTrue(os.path.exists(report.image.path))
+
+        err = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_media', stdout=StringIO(), stderr=err)
+        self.assertEqual(err.getvalue(), '')
+        for report in reports:
+            report.refresh_from_db()
+            self.assertTrue(storage.is_blob_name(report.image.name))
+            self.assertTrue(os.path.exists(report.image.path))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'garbage_reports')), [])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, SECURE_SSL_REDIRECT=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.data = bytes(range(256)) * 40
+        self.digest = hashlib.sha256(self.data).hexdigest()
+        self.name = storage.blob_name(self.digest, '.mp4')
+        os.makedirs(os.path.dirname(os.path.join(self.media_root, self.name)))
+        with open(os.path.join(self.media_root, self.name), 'wb') as f:
+            f.write(self.data)
+
+    def get(self, name=None, **headers):
+        name = name or self.name
+        return self.client.get(default_storage.url(name), **headers)
+
+    def test_unsigned_tampered_and_expired_links_are_refused(self):
+        self.assertEqual(self.client.get(f'/media/{self.name}').status_code, 403)
+        url = default_storage.url(self.name)
+        self.assertEqual(self.client.get(url[:-1] + ('0' if url[-1] != '0' else '1')).status_code, 403)
+        expired = f"/media/{self.name}?{media.sign(self.name, now=time.time() - 2 * media.URL_TTL)}"
+        self.assertEqual(self.client.get(expired).status_code, 403)
+        self.assertEqual(self.get('../secret.txt').status_code, 404)
+
+    def test_blob_is_immutable_and_revalidates(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['ETag'], f'"{self.digest}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_range_requests(self):
+        response = self.get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+
+        response = self.get(HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+        self.assertEqual(self.get(HTTP_RANGE=f'bytes={len(self.data)}-').status_code, 416)
+        # A stale If-Range gets the whole file
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"').status_code, 200)
+
+    @mock.patch.object(media, 'ACCEL', 'x-accel-redirect')
+    def test_handoff_to_proxy(self):
+        response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        get_zone_directory().invalidate_workers()
+        cache.clear()
+
+    def test_seed_places_reports_in_their_zones(self):
+        data = seed.seed(reports=50, users=5, rng=random.Random(1))
+        self.assertEqual(GarbageReport.objects.count(), 50)
+        index = get_zone_index()
+        for report in GarbageReport.objects.select_related('assigned_worker'):
+            self.assertEqual(report.zone, f'Zone {index.locate(report.longitude, report.latitude)}')
+            self.assertEqual(report.assigned_worker, data['workers'][report.get_zone_number()])
+            self.assertEqual(report.geohash, geo.encode(report.latitude, report.longitude))
+        # Derived counters were rebuilt after the bulk insert
+        self.assertEqual(rollups.rebuild(dry_run=True), {})
+        unviewed_total = WorkerProfile.objects.aggregate(n=Sum('unviewed_count'))['n']
+        self.assertEqual(unviewed_total, GarbageReport.objects.filter(status='SENT', is_viewed=False).count())
+
+    def test_index_benchmark_runs(self):
+        out = StringIO()
+        # The test database is already a throwaway one
+        with mock.patch('api.management.commands.benchmark_indexes.throwaway_database', contextlib.nullcontext):
+            call_command('benchmark_indexes', '--reports', '20', '--repeat', '1', '--no-explain', stdout=out)
+        self.assertIn('Summary (median ms)', out.getvalue())
+        index_names = {index.name for index in GarbageReport._meta.indexes}
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, GarbageReport._meta.db_table)
+        self.assertLessEqual(index_names, set(constraints))
+
+    def test_index_benchmark_uses_a_throwaway_database(self):
+        with mock.patch('api.management.commands.benchmark_indexes.throwaway_database') as throwaway:
+            with mock.patch('api.management.commands.benchmark_indexes.Command.benchmark') as benchmark:
+                call_command('benchmark_indexes', stdout=StringIO())
+        throwaway.assert_called_once_with()
+        self.assertTrue(throwaway.return_value.__enter__.called)
+        benchmark.assert_called_once()
+
+    def test_summary_percentiles(self):
+        summary = bench_stats.summarize([float(ms) for ms in range(1, 101)], elapsed=2.0)
+        self.assertEqual((summary['p50_ms'], summary['p95_ms'], summary['p99_ms']), (50.5, 95.05, 99.01))
+        self.assertEqual(summary['throughput_per_s'], 50.0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_request_is_recorded_per_view(self):
+        labels = ('report-tile', 'GET')
+        before = metrics.request_duration.count(*labels, 200), metrics.request_queries.count(*labels)
+        self.assertEqual(self.client.get('/api/reports/tiles/3/4/2/').status_code, 200)
+        after = metrics.request_duration.count(*labels, 200), metrics.request_queries.count(*labels)
+        self.assertEqual(after, (before[0] + 1, before[1] + 1))
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="report-tile",method="GET",status="200",le="+Inf"}', body)
+        # Scrapes aren't measured themselves
+        self.assertNotIn('view="metrics"', body)
+
+    def test_endpoint_requires_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        # No token configured: closed, even under DEBUG and to local addresses
+        with override_settings(METRICS_TOKEN='', DEBUG=True):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+    @mock.patch.object(middleware, 'SLOW_REQUEST_SECONDS', 0)
+    def test_slow_request_logs_query_trace(self):
+        before = metrics.slow_requests.value('report-tile', 'GET')
+        with self.assertLogs('api.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/reports/tiles/3/4/2/')
+        self.assertEqual(metrics.slow_requests.value('report-tile', 'GET'), before + 1)
+        self.assertIn("'view': 'report-tile'", logs.output[0])
+        self.assertIn("'slowest_queries': [", logs.output[0])
+
+    def test_span_times_named_steps(self):
+        before = metrics.span_duration.count('determine_zone')
+        GarbageReport(latitude=0, longitude=0).determine_zone()
+        self.assertEqual(metrics.span_duration.count('determine_zone'), before + 1)
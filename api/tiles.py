@@ -0,0 +1,124 @@
+"""
+Report density tiles for the map.
+
+Tiles use the usual web map z/x/y scheme. A tile is the reports inside
+its bounds grouped by a geohash prefix about an eighth of the tile wide,
+with per-status counts and the mean position of each group, so a
+zoomed-out map gets a few dozen clusters instead of every report. Tiles
+are cached until a report inside them is created, deleted, moved or
+changes status; only the tiles containing that report are dropped.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count
+from django.db.models.functions import Substr
+
+from . import geo
+
+MIN_ZOOM = 0
+MAX_ZOOM = 20
+CLUSTER_GRID = 8  # Clusters across a tile
+MAX_LATITUDE = 85.0511287798  # Web Mercator limit
+TILE_CACHE_TIMEOUT = getattr(settings, 'TILE_CACHE_TIMEOUT', 3600)
+
+
+def valid_tile(z, x, y):
+    return MIN_ZOOM <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z, x, y):
+    """(south, west, north, east) of a tile in degrees"""
+    n = 2 ** z
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return latitude(y + 1), x / n * 360.0 - 180.0, latitude(y), (x + 1) / n * 360.0 - 180.0
+
+
+def tile_for(latitude, longitude, z):
+    """(x, y) of the tile containing the point at zoom z"""
+    n = 2 ** z
+    lat = math.radians(min(max(latitude, -MAX_LATITUDE), MAX_LATITUDE))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def cluster_precision(z):
+    """Shortest geohash prefix whose cells fit CLUSTER_GRID times across a tile"""
+    width = 360.0 / 2 ** z / CLUSTER_GRID
+    for precision in range(1, geo.GEOHASH_PRECISION + 1):
+        if geo.cell_size(precision)[1] <= width:
+            return precision
+    return geo.GEOHASH_PRECISION
+
+
+def cache_key(z, x, y):
+    return f'report-tile:{z}:{x}:{y}'
+
+
+def build_tile(z, x, y):
+    from .models import GarbageReport
+
+    south, west, north, east = tile_bounds(z, x, y)
+    precision = cluster_precision(z)
+    rows = (
+        GarbageReport.objects.filter(geo.bbox_q(south, west, north, east))
+        .annotate(cell=Substr('geohash', 1, precision))
+        .values('cell', 'status')
+        .annotate(count=Count('id'), latitude=Avg('latitude'), longitude=Avg('longitude'))
+        .order_by()
+    )
+
+    clusters = {}
+    for row in rows:
+        cluster = clusters.setdefault(row['cell'], {
+            'geohash': row['cell'], 'count': 0, 'latitude': 0.0, 'longitude': 0.0, 'statuses': {},
+        })
+        cluster['statuses'][row['status']] = row['count']
+        # Running weighted mean over the per-status groups
+        cluster['count'] += row['count']
+        weight = row['count'] / cluster['count']
+        cluster['latitude'] += (row['latitude'] - cluster['latitude']) * weight
+        cluster['longitude'] += (row['longitude'] - cluster['longitude']) * weight
+
+    return {
+        'z': z, 'x': x, 'y': y,
+        'bounds': [west, south, east, north],
+        'count': sum(c['count'] for c in clusters.values()),
+        'clusters': [clusters[cell] for cell in sorted(clusters)],
+    }
+
+
+def get_tile(z, x, y):
+    key = cache_key(z, x, y)
+    tile = cache.get(key)
+    if tile is None:
+        tile = build_tile(z, x, y)
+        cache.set(key, tile, TILE_CACHE_TIMEOUT)
+    return tile
+
+
+def tile_keys(geohashes):
+    """Cache keys of every tile, at every zoom, that can hold a point in these cells"""
+    keys = set()
+    for geohash in geohashes:
+        if not geohash:
+            continue
+        min_lat, min_lng, max_lat, max_lng = geo.decode_bbox(geohash)
+        for z in range(MIN_ZOOM, MAX_ZOOM + 1):
+            for latitude in (min_lat, max_lat):
+                for longitude in (min_lng, max_lng):
+                    keys.add(cache_key(z, *tile_for(latitude, longitude, z)))
+    return keys
+
+
+def invalidate(geohashes):
+    """Drop the cached tiles covering these report locations once the transaction commits"""
+    keys = list(tile_keys(geohashes))
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,109 @@
+"""
+Status state machine for GarbageReport.
+
+Every change goes out as one UPDATE ... WHERE id = ? AND <expected state>,
+touching only the changed columns, so two people acting on the same report
+at once can't silently overwrite each other: the slower one gets a
+TransitionConflict instead. The instance passed in is updated in place, so
+callers can serialize it without fetching the row again.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import listcache, rollups, storage, tiles
+from .directory import get_zone_directory
+from .models import GarbageReport, queue_zone_notification
+
+# Allowed moves; staying in the same status is always allowed
+TRANSITIONS = {
+    'SENT': {'RECEIVED', 'IN_PROGRESS', 'COMPLETED', 'CLOSED'},
+    'RECEIVED': {'IN_PROGRESS', 'COMPLETED', 'CLOSED'},
+    'IN_PROGRESS': {'COMPLETED', 'CLOSED'},
+    'COMPLETED': {'IN_PROGRESS', 'CLOSED'},  # Reopened if the work was not done
+    'CLOSED': set(),  # Except a suspected duplicate, see unlink_duplicate
+}
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+class TransitionConflict(Exception):
+    pass
+
+
+def can_transition(current, new_status):
+    return new_status == current or new_status in TRANSITIONS.get(current, set())
+
+
+def sources_for(new_status):
+    """Statuses a report may move to new_status from"""
+    return {current for current in TRANSITIONS if can_transition(current, new_status)}
+
+
+def apply_changes(report, expected, changes):
+    """
+    UPDATE only the changed columns of report, provided the row still holds
+    the expected values. Keeps the unviewed counter and rollups in step.
+    """
+    rollup_before = report._rollup_state
+    if rollup_before is GarbageReport.UNKNOWN:
+        rollup_before = rollups.state_of(report)
+    # One transaction, so the counters never move without the row or the
+    # row without the counters
+    with transaction.atomic():
+        updated = GarbageReport.objects.filter(pk=report.pk, **expected).update(**changes)
+        if not updated:
+            raise TransitionConflict('Report was changed by someone else, reload and try again')
+
+        previous = report._unviewed_worker_id
+        for field, value in changes.items():
+            setattr(report, field, value)
+        report.sync_unviewed_count(previous)
+        report.sync_rollups(rollup_before)
+        if set(storage.MEDIA_FIELDS) & set(changes):
+            # Recount the new blob and the one it replaces, as save() does
+            report.sync_media()
+        if 'status' in changes:
+            tiles.invalidate([report.geohash])
+        listcache.invalidate_report(report)
+    return report
+
+
+def transition(report, new_status, **changes):
+    """Move report to new_status, setting any extra fields in the same UPDATE"""
+    if new_status not in dict(GarbageReport.STATUS_CHOICES):
+        raise InvalidTransition('Invalid status')
+    if not can_transition(report.status, new_status):
+        raise InvalidTransition(f'Cannot change status from {report.status} to {new_status}')
+
+    if new_status == 'COMPLETED' and report.status != 'COMPLETED':
+        changes.setdefault('completed_at', timezone.now())
+    changes['status'] = new_status
+    return apply_changes(report, {'status': report.status}, changes)
+
+
+def mark_viewed(report):
+    if report.is_viewed:
+        return report
+    return apply_changes(report, {'status': report.status, 'is_viewed': False}, {'is_viewed': True})
+
+
+def unlink_duplicate(report):
+    """
+    Reopen a report closed as a suspected duplicate as new work of its own,
+    for when the photo match was wrong: clears duplicate_of, assigns the
+    zone's worker and queues the zone email a new report gets
+    """
+    if report.duplicate_of_id is None or report.status != 'CLOSED':
+        raise InvalidTransition('Report is not closed as a duplicate')
+    zone_number = report.get_zone_number()
+    worker_id = None if zone_number is None else get_zone_directory().get_worker_id(zone_number)
+    apply_changes(
+        report,
+        {'status': 'CLOSED', 'duplicate_of_id': report.duplicate_of_id},
+        {'status': 'SENT', 'is_viewed': False, 'duplicate_of_id': None, 'assigned_worker_id': worker_id},
+    )
+    report._listed_worker_id = worker_id
+    queue_zone_notification(report)
+    return report
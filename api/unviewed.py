@@ -0,0 +1,131 @@
+"""
+Per-worker count of unviewed SENT reports.
+
+WorkerProfile.unviewed_count is kept in step by GarbageReport.save and the
+post_delete receiver in models.py. Reads go through the cache, keyed by the
+worker's user id, so a poll of /api/unviewed-reports/ (or a tick of the
+event stream) is one cache hit. Writes drop the cached value once the
+transaction commits; UNVIEWED_CACHE_TIMEOUT bounds staleness where that
+can't reach every process (locmem). Cache misses are read from the replica when one is
+configured.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .routers import reading_from_replica, replica_reads
+
+NOT_A_WORKER = -1
+# Per-process caches like locmem never see other processes' invalidations
+CACHE_TIMEOUT = getattr(settings, 'UNVIEWED_CACHE_TIMEOUT', 60)
+REPLICA_CACHE_TIMEOUT = getattr(settings, 'UNVIEWED_REPLICA_CACHE_TIMEOUT', 10)
+
+_state = threading.local()
+
+
+def suspended():
+    """True while a set-based operation is adjusting counters itself"""
+    return getattr(_state, 'suspended', False)
+
+
+def unviewed_by_worker(queryset):
+    return dict(
+        queryset.filter(status='SENT', is_viewed=False, assigned_worker__isnull=False)
+        .order_by()
+        .values('assigned_worker')
+        .annotate(count=Count('id'))
+        .values_list('assigned_worker', 'count')
+    )
+
+
+@contextmanager
+def tracking(queryset):
+    """
+    Wrap a bulk update()/delete() of the reports in queryset: per-row counter
+    hooks are switched off and each affected worker gets one adjustment for
+    the net change. Pass a queryset by primary key, so it selects the same
+    rows before and after the change.
+    """
+    before = unviewed_by_worker(queryset)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = False
+    after = unviewed_by_worker(queryset)
+    for worker_id in set(before) | set(after):
+        adjust(worker_id, after.get(worker_id, 0) - before.get(worker_id, 0))
+
+
+def cache_key(user_id):
+    return f'unviewed-count:{user_id}'
+
+
+def invalidate(user_ids):
+    keys = [cache_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def adjust(worker_id, delta):
+    """Add delta to a worker's counter, never going below zero"""
+    from .models import WorkerProfile
+
+    if worker_id is None or not delta:
+        return
+    WorkerProfile.objects.filter(id=worker_id).update(
+        unviewed_count=Greatest(F('unviewed_count') + delta, 0)
+    )
+    invalidate(WorkerProfile.objects.filter(id=worker_id).values_list('user_id', flat=True))
+
+
+def recount(worker_ids=None):
+    """Rebuild counters from the reports table, for all or some workers"""
+    from .models import WorkerProfile
+
+    workers = WorkerProfile.objects.all()
+    if worker_ids is not None:
+        workers = workers.filter(id__in=[w for w in worker_ids if w is not None])
+    counts = dict(
+        workers.annotate(
+            actual=Count(
+                'assigned_reports',
+                filter=Q(assigned_reports__status='SENT', assigned_reports__is_viewed=False),
+            )
+        ).values_list('id', 'actual')
+    )
+    stale = [w for w in workers.only('id', 'user_id', 'unviewed_count') if w.unviewed_count != counts[w.id]]
+    for worker in stale:
+        worker.unviewed_count = counts[worker.id]
+    WorkerProfile.objects.bulk_update(stale, ['unviewed_count'])
+    invalidate([w.user_id for w in stale])
+    return len(stale)
+
+
+def get_count(user):
+    """Unviewed count for a worker user, or NOT_A_WORKER"""
+    from .models import WorkerProfile
+
+    key = cache_key(user.id)
+    count = cache.get(key)
+    if count is None:
+        # Not user.workerprofile: long-lived callers like the event stream
+        # would keep reading the same cached instance
+        with replica_reads():
+            count = (
+                WorkerProfile.objects.filter(user_id=user.id)
+                .values_list('unviewed_count', flat=True)
+                .first()
+            )
+            # A lagging replica may not have the latest change yet, which
+            # the invalidation has already run for; don't keep that for long
+            timeout = REPLICA_CACHE_TIMEOUT if reading_from_replica() else CACHE_TIMEOUT
+        if count is None:
+            count = NOT_A_WORKER
+        cache.set(key, count, timeout)
+    return count
@@ -0,0 +1,187 @@
+"""
+Resumable, chunked uploads of report videos.
+
+A client creates a VideoUpload with the file's name, type and size, then
+PUTs consecutive chunks with the byte offset they start at and their
+SHA-256. Each chunk is streamed from the request to a temp file under
+MEDIA_ROOT, checked, and appended to the upload's partial file; nothing is
+buffered in memory. A chunk that fails its checksum is dropped and the
+client retries it from the last acknowledged offset. When the last byte
+arrives the file is moved into storage and attached to the report. If that
+fails, a PUT at the final offset (an empty body will do) tries again.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files import File, locks
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import listcache, storage
+from .models import GarbageReport, VideoUpload
+
+MAX_VIDEO_SIZE = getattr(settings, 'VIDEO_MAX_UPLOAD_SIZE', 500 * 1024 * 1024)
+MAX_CHUNK_SIZE = getattr(settings, 'VIDEO_UPLOAD_MAX_CHUNK_SIZE', 8 * 1024 * 1024)
+VIDEO_EXTENSIONS = {'.mp4', '.m4v', '.mov', '.3gp', '.webm', '.mkv'}
+PARTIAL_DIR = 'garbage_videos/partial'
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def looks_like_video(head):
+    """Check container magic bytes: ISO BMFF (mp4/mov/3gp) or Matroska/WebM"""
+    return (len(head) >= 12 and head[4:8] == b'ftyp') or head[:4] == b'\x1a\x45\xdf\xa3'
+
+
+def validate_new_upload(filename, content_type, size):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in VIDEO_EXTENSIONS or not (content_type or '').startswith('video/'):
+        raise UploadError('Only video files can be uploaded', status=415)
+    if size <= 0:
+        raise UploadError('Size must be positive')
+    if size > MAX_VIDEO_SIZE:
+        raise UploadError(f'Video is larger than {MAX_VIDEO_SIZE} bytes', status=413)
+
+
+def partial_path(upload):
+    return os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR, f'{upload.id}.part')
+
+
+def discard(upload):
+    path = partial_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
+    upload.delete()
+
+
+def receive(upload, stream, length, offset):
+    """
+    Stream one chunk into its own temp file beside the partial file.
+    Returns (path, sha256 hex digest); the caller removes the file.
+    """
+    directory = os.path.dirname(partial_path(upload))
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, prefix=f'{upload.id}.', suffix='.chunk')
+    digest = hashlib.sha256()
+    received = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while received < length:
+                data = stream.read(min(READ_SIZE, length - received))
+                if not data:
+                    break
+                if received == 0 and offset == 0 and not looks_like_video(data):
+                    raise UploadError('File is not a supported video', status=415)
+                digest.update(data)
+                f.write(data)
+                received += len(data)
+        if received != length:
+            raise UploadError(f'Chunk incomplete: got {received} of {length} bytes')
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def append_chunk(upload, stream, length, offset, checksum=None):
+    """
+    Append one chunk read from stream at the given offset. Returns the
+    upload, which is COMPLETE once the last chunk is in.
+
+    No transaction is open while the client sends the chunk: it goes to a
+    temp file first, then is copied into the partial file under a file lock
+    and acknowledged with a conditional UPDATE of the offset. Of two requests
+    racing for the same offset only one gets to append.
+    """
+    upload.refresh_from_db()
+    if upload.status != 'UPLOADING':
+        raise UploadError('Upload already complete', status=409)
+    if offset != upload.offset:
+        raise UploadError(f'Expected offset {upload.offset}', status=409)
+    if upload.offset == upload.size:
+        # Every byte is in but finish() failed last time: try it again
+        finish(upload)
+        return upload
+    if length <= 0:
+        raise UploadError('Empty chunk')
+    if length > MAX_CHUNK_SIZE or offset + length > upload.size:
+        raise UploadError('Chunk too large', status=413)
+
+    chunk_path, digest = receive(upload, stream, length, offset)
+    try:
+        if checksum and digest != checksum.lower():
+            raise UploadError('Chunk checksum mismatch', status=422)
+        with open(partial_path(upload), 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                pending = VideoUpload.objects.filter(pk=upload.pk, status='UPLOADING', offset=offset)
+                if not pending.exists():
+                    upload.refresh_from_db()
+                    raise UploadError(f'Expected offset {upload.offset}', status=409)
+                # Drop bytes left behind by an interrupted chunk
+                f.truncate(offset)
+                f.seek(offset)
+                with open(chunk_path, 'rb') as chunk:
+                    shutil.copyfileobj(chunk, f, READ_SIZE)
+                f.flush()
+                pending.update(offset=F('offset') + length, updated_at=timezone.now())
+            finally:
+                locks.unlock(f)
+    finally:
+        os.remove(chunk_path)
+
+    upload.offset = offset + length
+    if upload.offset == upload.size:
+        finish(upload)
+    return upload
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finish(upload):
+    path = partial_path(upload)
+    if upload.sha256 and file_sha256(path) != upload.sha256.lower():
+        discard(upload)
+        raise UploadError('File checksum mismatch, upload discarded', status=422)
+
+    field = GarbageReport._meta.get_field('video')
+    name = default_storage.get_available_name(field.generate_filename(None, upload.filename))
+    if hasattr(default_storage, 'adopt'):
+        # Content-addressed: hashed and renamed into the store, no copy
+        name = default_storage.adopt(path, name, digest=upload.sha256.lower() or None)
+    else:
+        try:
+            target = default_storage.path(name)
+        except NotImplementedError:
+            with open(path, 'rb') as f:
+                name = default_storage.save(name, File(f))
+            os.remove(path)
+        else:
+            # Same filesystem: a rename instead of another full copy
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+
+    with transaction.atomic():
+        report = GarbageReport.objects.filter(pk=upload.report_id)
+        previous = report.values_list('video', flat=True).first()
+        report.update(video=name)
+        storage.release({previous, name})
+        listcache.invalidate_reports(report.values_list('user_id', 'assigned_worker_id'))
+        upload.status = 'COMPLETE'
+        upload.save(update_fields=['status', 'updated_at'])
@@ -6,11 +6,16 @@ router = DefaultRouter()
 router.register('reports', views.GarbageReportViewSet, basename='garbage-reports')
 
 urlpatterns = [
+    path('reports/tiles/<int:z>/<int:x>/<int:y>/', views.report_tile, name='report-tile'),
+    path('reports/export/', views.export_reports, name='report-export'),
     path('', include(router.urls)),
     path('login/', views.login, name='login'),
     path('send-otp/', views.send_otp, name='send-otp'),
     path('verify-otp/', views.verify_otp, name='verify-otp'),
     path('unviewed-reports/', views.get_unviewed_reports_count, name='unviewed-reports'),
+    path('analytics/zones/', views.zone_analytics, name='zone-analytics'),
+    path('unviewed-reports/stream/', views.unviewed_reports_stream, name='unviewed-reports-stream'),
+    path('video-uploads/<uuid:upload_id>/', views.VideoUploadView.as_view(), name='video-upload'),
 ]
 
 
@@ -1,19 +1,45 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly, IsAuthenticated
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password
-import random
-import time
-from .models import GarbageReport, WorkerProfile
+from .models import GarbageReport, VideoUpload, WorkerProfile
 from .serializers import UserSerializer, GarbageReportSerializer
+from .pagination import ReportCursorPagination
+from .images import process_report_images
+from .uploads import MAX_CHUNK_SIZE, UploadError, append_chunk, validate_new_upload
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_etags
+from django.core.cache import cache
+from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
+from django.views.decorators.http import require_safe
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import APIException, AuthenticationFailed, ValidationError as DRFValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from . import (
+    analytics, dedup, exports, geo, listcache, media, metrics, otp, ratelimit, rollups, tiles, transitions,
+    unviewed,
+)
+from .routers import reading_from_replica, replica_reads
+import asyncio
+import json
+import math
+import os
+from datetime import date
+from urllib.parse import quote
 
 
 
@@ -28,25 +54,11 @@ def send_otp(request):
         if User.objects.filter(email=email).exists():
             return Response({'error': 'Email already registered'}, status=400)
         
-        otp = str(random.randint(100000, 999999))
-        # Store OTP with timestamp
-        request.session['otp_data'] = {
-            'otp': otp,
-            'email': email,
-            'timestamp': time.time()
-        }
-        
         try:
-            send_mail(
-                'OTP for Garbage Reporting App',
-                f'Your OTP is: {otp}',
-                settings.EMAIL_HOST_USER,
-                [email],
-                fail_silently=False,
-            )
-        except Exception as e:
-            print(f"Email sending error: {str(e)}")
-            return Response({'error': 'Failed to send email'}, status=500)
+            # Emailed in the background, see api/otp.py
+            otp.issue(email, client_ip=ratelimit.client_ip(request))
+        except ratelimit.RateLimited as e:
+            return Response({'error': str(e)}, status=429, headers={'Retry-After': str(e.retry_after)})
         
         return Response({'message': 'OTP sent successfully'})
     except Exception as e:
@@ -66,51 +78,54 @@ def login(request):
                 'error': 'Email and password are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # Failed attempts are counted per account, see LOGIN_FAILURE_RATE
+        account = otp.email_id(email)
+        limit, window = getattr(settings, 'LOGIN_FAILURE_RATE', (10, 900))
         try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+            ratelimit.check('login', account, limit, window,
+                            message='Too many failed login attempts, try again later')
+        except ratelimit.RateLimited as e:
+            return Response({'error': str(e)}, status=429, headers={'Retry-After': str(e.retry_after)})
+        
+        # One query: api.backends.EmailBackend loads the worker profile too
+        user = authenticate(request, email=email, password=password)
+        if user is None:
+            ratelimit.record('login', account, window)
+            # Same answer (and, see EmailBackend, timing) whether or not the
+            # account exists, so logins can't be used to probe for emails
             return Response({
-                'error': 'No account found with this email'
-            }, status=status.HTTP_404_NOT_FOUND)
+                'error': 'Invalid credentials'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        ratelimit.reset('login', account, window)
         
         # Verify user type matches
+        worker_profile = None
         if user_type == 'worker':
-            try:
-                worker_profile = user.workerprofile
-                if not worker_profile.is_worker:
-                    return Response({
-                        'error': 'This account is not authorized as a J.E.'
-                    }, status=status.HTTP_403_FORBIDDEN)
-            except WorkerProfile.DoesNotExist:
+            worker_profile = getattr(user, 'workerprofile', None)
+            if worker_profile is None or not worker_profile.is_worker:
                 return Response({
                     'error': 'This account is not authorized as a J.E.'
                 }, status=status.HTTP_403_FORBIDDEN)
         
-        user = authenticate(username=user.username, password=password)
-        if user is not None:
-            refresh = RefreshToken.for_user(user)
-            response_data = {
-                'token': str(refresh.access_token),
-                'refresh': str(refresh),
-                'user': {
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email
-                }
+        refresh = RefreshToken.for_user(user)
+        response_data = {
+            'token': str(refresh.access_token),
+            'refresh': str(refresh),
+            'user': {
+                'id': user.id,
+                'username': user.username,
+                'email': user.email
             }
-            
-            # Add worker information if applicable
-            if user_type == 'worker':
-                response_data['user']['worker_profile'] = {
-                    'zone': user.workerprofile.zone,
-                    'is_worker': True
-                }
-            
-            return Response(response_data, status=status.HTTP_200_OK)
-        else:
-            return Response({
-                'error': 'Invalid credentials'
-            }, status=status.HTTP_401_UNAUTHORIZED)
+        }
+        
+        # Add worker information if applicable
+        if worker_profile is not None:
+            response_data['user']['worker_profile'] = {
+                'zone': worker_profile.zone,
+                'is_worker': True
+            }
+        
+        return Response(response_data, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({
             'error': f'Login failed: {str(e)}'
@@ -119,43 +134,32 @@ def login(request):
 @api_view(['POST'])
 def verify_otp(request):
     try:
+        email = request.data.get('email')
         received_otp = request.data.get('otp')
         password = request.data.get('password')
         
-        if not received_otp or not password:
-            return Response({'error': 'OTP and password are required'}, status=400)
-        
-        # Get stored OTP data
-        otp_data = request.session.get('otp_data')
-        if not otp_data:
-            return Response({'error': 'OTP expired or not found'}, status=400)
+        if not email or not received_otp or not password:
+            return Response({'error': 'Email, OTP and password are required'}, status=400)
         
-        stored_otp = otp_data.get('otp')
-        stored_email = otp_data.get('stored_email')
-        timestamp = otp_data.get('timestamp')
-        
-        # Check if OTP has expired (15 minutes validity)
-        if time.time() - timestamp > 900:  # 900 seconds = 15 minutes
-            del request.session['otp_data']
-            return Response({'error': 'OTP has expired'}, status=400)
-        
-        if received_otp != stored_otp:
-            return Response({'error': 'Invalid OTP'}, status=400)
+        user_data = {
+            'username': email.split('@')[0],
+            'email': email,
+            'password': make_password(password)  # Hash the password
+        }
+        serializer = UserSerializer(data=user_data)
+        # Validated first, so a rejected sign-up doesn't use up the code
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        try:
+            otp.verify(email, received_otp)
+        except otp.OTPError as e:
+            return Response({'error': str(e)}, status=400)
         
         # Create new user
         try:
-            user_data = {
-                'username': stored_email.split('@')[0],
-                'email': stored_email,
-                'password': make_password(password)  # Hash the password
-            }
-            serializer = UserSerializer(data=user_data)
-            if serializer.is_valid():
-                serializer.save()
-                # Clear the OTP data after successful verification
-                del request.session['otp_data']
-                return Response({'message': 'User registered successfully'})
-            return Response(serializer.errors, status=400)
+            serializer.save()
+            return Response({'message': 'User registered successfully'})
         except Exception as e:
             return Response({'error': f'Failed to create user: {str(e)}'}, status=400)
             
@@ -167,58 +171,196 @@ def verify_otp(request):
 @permission_classes([IsAuthenticated])
 def update_report_status(request, report_id):
     try:
-        report = GarbageReport.objects.get(id=report_id)
+        report = GarbageReport.objects.select_related('user', 'assigned_worker__user').get(id=report_id)
         new_status = request.data.get('status')
-        
-        if new_status not in dict(GarbageReport.STATUS_CHOICES):
-            return Response(
-                {'error': 'Invalid status'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-            
-        report.status = new_status
-        report.save()
-        
+
+        transitions.transition(report, new_status)
+
         serializer = GarbageReportSerializer(report)
         return Response(serializer.data)
-        
+
     except GarbageReport.DoesNotExist:
         return Response(
             {'error': 'Report not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    except transitions.InvalidTransition as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except transitions.TransitionConflict as e:
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
     
 
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Report was changed by someone else, reload and try again'
+
+
+BULK_MAX_REPORTS = 1000
+NEAR_DEFAULT_RADIUS = 500
+NEAR_MAX_RADIUS = 5000
+
+
+def parse_coordinates(value, count, name):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count or not all(math.isfinite(n) for n in numbers):
+        raise DRFValidationError({'error': f'Invalid {name}'})
+    return numbers
+
+
+def check_point(latitude, longitude, name):
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise DRFValidationError({'error': f'{name} is outside valid coordinates'})
+
+
 class GarbageReportViewSet(viewsets.ModelViewSet):
     serializer_class = GarbageReportSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ReportCursorPagination
     queryset = GarbageReport.objects.none()  # Add this line to provide a default queryset
 
     def perform_create(self, serializer):
-        # Set the user to the current authenticated user
-        serializer.save(user=self.request.user)
+        # Set the user to the current authenticated user. The zone notification
+        # outbox row is written by post_save inside the same transaction.
+        data = serializer.validated_data
+        extra = {'image_hash': dedup.image_hash(data['image']) if data.get('image') else ''}
+        duplicate_of = dedup.find_duplicate(data['latitude'], data['longitude'], extra['image_hash'])
+        if duplicate_of is not None:
+            # Linked to the open report instead of becoming new work
+            extra.update(duplicate_of_id=duplicate_of, status='CLOSED')
+        with transaction.atomic():
+            serializer.save(user=self.request.user, **extra)
+        self.process_images(serializer.instance)
+
+    def perform_update(self, serializer):
+        # status is read-only in the serializer; a requested change goes
+        # through the state machine like update_status
+        new_status = self.request.data.get('status')
+        report = serializer.instance
+        if new_status is not None and new_status != report.status:
+            try:
+                transitions.transition(report, new_status)
+            except transitions.InvalidTransition as e:
+                raise DRFValidationError({'error': str(e)})
+            except transitions.TransitionConflict as e:
+                raise Conflict({'error': str(e)})
+
+        if 'image' in serializer.validated_data:
+            serializer.save(image_thumbnail='', image_webp='')
+            self.process_images(serializer.instance, ['image'])
+        else:
+            serializer.save()
+
+    def process_images(self, report, fields=None):
+        """Thumbnails and recompression, unless a process_images worker does it"""
+        if not getattr(settings, 'IMAGE_PROCESSING_ASYNC', False):
+            process_report_images(report, fields)
+
 
+    def base_queryset(self):
+        """
+        Reports with everything the serializer reads joined in, so listing
+        costs one query regardless of page size
+        """
+        report_columns = [f.name for f in GarbageReport._meta.concrete_fields]
+        return GarbageReport.objects.select_related(
+            'user', 'assigned_worker__user'
+        ).only(
+            *report_columns,
+            'user__username',
+            'assigned_worker__zone',
+            'assigned_worker__user__username',
+        ).order_by('-reported_at', '-id')
 
     def get_queryset(self):
         user = self.request.user
 
         if not user.is_authenticated:
             # For unauthenticated users, return all reports
-            return GarbageReport.objects.all().select_related('user').order_by('-reported_at')
-        
+            return self.base_queryset()
+
         # Check if user is a worker
         try:
             worker_profile = user.workerprofile
             if worker_profile.is_worker:
                 # Workers see reports from their zone
-                return GarbageReport.objects.filter(
-                    assigned_worker=worker_profile
-                ).select_related('user').order_by('-reported_at')
+                return self.base_queryset().filter(assigned_worker=worker_profile)
+        except WorkerProfile.DoesNotExist:
+            pass
+
+        # Regular users see their own reports
+        return self.base_queryset().filter(user=user)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            queryset = self.filter_spatial(queryset)
+        return queryset
+
+    def filter_spatial(self, queryset):
+        """
+        ?bbox=min_lng,min_lat,max_lng,max_lat for a map viewport and
+        ?near=lat,lng&radius=metres around a point
+        """
+        params = self.request.query_params
+        if params.get('bbox'):
+            min_lng, min_lat, max_lng, max_lat = parse_coordinates(params['bbox'], 4, 'bbox')
+            check_point(min_lat, min_lng, 'bbox')
+            check_point(max_lat, max_lng, 'bbox')
+            if min_lat > max_lat or min_lng > max_lng:
+                raise DRFValidationError({'error': 'bbox must be min_lng,min_lat,max_lng,max_lat'})
+            queryset = queryset.filter(geo.bbox_q(min_lat, min_lng, max_lat, max_lng))
+
+        if params.get('near'):
+            latitude, longitude = parse_coordinates(params['near'], 2, 'near')
+            check_point(latitude, longitude, 'near')
+            radius = parse_coordinates(params.get('radius', str(NEAR_DEFAULT_RADIUS)), 1, 'radius')[0]
+            if not 0 < radius <= NEAR_MAX_RADIUS:
+                raise DRFValidationError({'error': f'radius must be between 0 and {NEAR_MAX_RADIUS} metres'})
+            queryset = queryset.filter(
+                geo.bbox_q(*geo.radius_bbox(latitude, longitude, radius))
+            ).alias(
+                distance=geo.distance_expression(latitude, longitude)
+            ).filter(distance__lte=radius)
+
+        return queryset
+
+    def list_scope(self):
+        """Which list cache scope the requesting user reads, see api/listcache.py"""
+        user = self.request.user
+        if not user.is_authenticated:
+            return listcache.ANONYMOUS
+        try:
+            if user.workerprofile.is_worker:
+                return f'worker:{user.workerprofile.id}'
         except WorkerProfile.DoesNotExist:
-            # Regular users see their own reports
-            return GarbageReport.objects.filter(
-                user=user
-            ).select_related('user').order_by('-reported_at')
+            pass
+        return f'user:{user.id}'
+
+    def list(self, request, *args, **kwargs):
+        key = listcache.page_key(self.list_scope(), request)
+        etag = listcache.etag_for(key)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache', 'Vary': 'Authorization'}
+        data = cache.get(key)
+        # Not modified only while the page is cached, so staleness stays bounded
+        if data is not None and etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if data is None:
+            with replica_reads():
+                response = super().list(request, *args, **kwargs)
+                # A lagging replica may not have the change that bumped the
+                # version yet; don't keep that page for long
+                timeout = listcache.REPLICA_TIMEOUT if reading_from_replica() else listcache.TIMEOUT
+            data = response.data
+            cache.set(key, data, timeout)
+        return Response(data, headers=headers)
+
+    def retrieve(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().retrieve(request, *args, **kwargs)
 
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -232,7 +374,13 @@ class GarbageReportViewSet(viewsets.ModelViewSet):
                 {'error': 'Invalid status'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if not transitions.can_transition(report.status, new_status):
+            return Response(
+                {'error': f'Cannot change status from {report.status} to {new_status}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        changes = {}
         # Validate completion image for COMPLETED status
         if new_status == 'COMPLETED':
             if not completion_image:
@@ -240,21 +388,40 @@ class GarbageReportViewSet(viewsets.ModelViewSet):
                     {'error': 'Completion image is required to mark as completed'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            report.completion_image = completion_image
-            report.completed_at = timezone.now()
+            field = GarbageReport._meta.get_field('completion_image')
+            name = field.generate_filename(report, completion_image.name)
+            changes['completion_image'] = field.storage.save(name, completion_image)
+            changes['completion_thumbnail'] = changes['completion_webp'] = ''
+            changes['completed_at'] = timezone.now()
 
-        report.status = new_status
         if worker_notes:
-            report.worker_notes = worker_notes
-        report.save()
+            changes['worker_notes'] = worker_notes
+
+        try:
+            transitions.transition(report, new_status, **changes)
+        except transitions.TransitionConflict as e:
+            if 'completion_image' in changes:
+                field.storage.delete(changes['completion_image'])
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        if completion_image:
+            self.process_images(report, ['completion_image'])
         
         return Response(GarbageReportSerializer(report).data)
 
     @action(detail=True, methods=['post'])
     def mark_viewed(self, request, pk=None):
         report = self.get_object()
-        report.is_viewed = True
-        report.save()
+        try:
+            transitions.mark_viewed(report)
+        except transitions.TransitionConflict:
+            # Status moved underneath us; viewing still applies to the new state
+            report.refresh_from_db(fields=['status', 'is_viewed'])
+            report._unviewed_worker_id = report.unviewed_worker_id()
+            try:
+                transitions.mark_viewed(report)
+            except transitions.TransitionConflict as e:
+                return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         return Response({'status': 'success'})
 
     @action(detail=True, methods=['post'])
@@ -267,27 +434,447 @@ class GarbageReportViewSet(viewsets.ModelViewSet):
                 {'error': 'Not authorized to close this report'},
                 status=status.HTTP_403_FORBIDDEN
             )
-            
-        report.status = 'CLOSED'
-        report.save()
+
+        try:
+            transitions.transition(report, 'CLOSED')
+        except transitions.InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except transitions.TransitionConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(GarbageReportSerializer(report).data)
+
+    @action(detail=True, methods=['post'])
+    def unlink_duplicate(self, request, pk=None):
+        """Reopen a report wrongly closed as a duplicate as work of its own"""
+        report = self.get_object()
+
+        # Like closing, only the report creator decides this; admins use
+        # the admin action
+        if report.user != request.user:
+            return Response(
+                {'error': 'Not authorized to reopen this report'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            with transaction.atomic():
+                transitions.unlink_duplicate(report)
+        except transitions.InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except transitions.TransitionConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         return Response(GarbageReportSerializer(report).data)
 
+    @action(detail=True, methods=['post'])
+    def video_upload(self, request, pk=None):
+        """Start a resumable video upload; chunks go to VideoUploadView"""
+        report = self.get_object()
+        if report.user != request.user:
+            return Response(
+                {'error': 'Not authorized to upload a video for this report'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        filename = request.data.get('filename')
+        content_type = request.data.get('content_type')
+        try:
+            size = int(request.data.get('size'))
+            validate_new_upload(filename, content_type, size)
+        except (TypeError, ValueError):
+            return Response({'error': 'Size is required'}, status=status.HTTP_400_BAD_REQUEST)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=e.status)
+
+        upload = VideoUpload.objects.create(
+            report=report,
+            filename=os.path.basename(filename),
+            content_type=content_type,
+            size=size,
+            sha256=request.data.get('sha256') or '',
+        )
+        return Response(video_upload_data(upload), status=status.HTTP_201_CREATED)
+
+    BULK_FILTERS = {
+        'status': 'status',
+        'zone': 'zone',
+        'is_viewed': 'is_viewed',
+        'reported_before': 'reported_at__lt',
+        'reported_after': 'reported_at__gte',
+    }
+
+    def get_bulk_targets(self, request):
+        """
+        Resolve {"ids": [...]} or {"filter": {...}} against the caller's own
+        queryset, so bulk operations see exactly the reports the per-report
+        endpoints would. Returns (requested ids, queryset of permitted ids)
+        or a Response describing the error.
+        """
+        ids = request.data.get('ids')
+        filters = request.data.get('filter')
+        scope = self.get_queryset().order_by()
+
+        if ids is not None:
+            if not isinstance(ids, list) or not ids:
+                return Response({'error': 'ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                ids = [int(i) for i in ids]
+            except (TypeError, ValueError):
+                return Response({'error': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+            scope = scope.filter(id__in=ids)
+        elif isinstance(filters, dict) and filters:
+            unknown = set(filters) - set(self.BULK_FILTERS)
+            if unknown:
+                return Response(
+                    {'error': f"Unsupported filters: {', '.join(sorted(unknown))}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            scope = scope.filter(**{self.BULK_FILTERS[k]: v for k, v in filters.items()})
+        else:
+            return Response({'error': 'Either ids or filter is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            permitted = list(scope.values_list('id', flat=True)[:BULK_MAX_REPORTS + 1])
+        except (ValueError, ValidationError) as e:
+            return Response({'error': f'Invalid filter: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(permitted) > BULK_MAX_REPORTS:
+            return Response(
+                {'error': f'At most {BULK_MAX_REPORTS} reports per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return (ids if ids is not None else permitted), permitted
+
+    def bulk_response(self, requested, done, errors=None):
+        errors = errors or {}
+        results = []
+        for report_id in requested:
+            if report_id in done:
+                results.append({'id': report_id, 'success': True})
+            else:
+                results.append({'id': report_id, 'success': False, 'error': errors.get(report_id, 'Not found')})
+        return Response({
+            'results': results,
+            'succeeded': len(done),
+            'failed': len(results) - len(done),
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        targets = self.get_bulk_targets(request)
+        if isinstance(targets, Response):
+            return targets
+        requested, permitted = targets
+
+        with transaction.atomic():
+            reports = GarbageReport.objects.filter(id__in=permitted)
+            with unviewed.tracking(reports), rollups.tracking(reports):
+                reports.delete()
+        return self.bulk_response(requested, set(permitted))
+
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        new_status = request.data.get('status')
+        if new_status not in dict(GarbageReport.STATUS_CHOICES):
+            return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
+        if new_status == 'COMPLETED':
+            return Response(
+                {'error': 'Completion image is required to mark as completed'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        targets = self.get_bulk_targets(request)
+        if isinstance(targets, Response):
+            return targets
+        requested, permitted = targets
+
+        errors = {}
+        done = set()
+        geohashes = set()
+        owners = set()
+        rows = GarbageReport.objects.filter(id__in=permitted).values_list(
+            'id', 'status', 'user_id', 'assigned_worker_id', 'geohash'
+        )
+        for report_id, current, user_id, worker_id, geohash in rows:
+            if new_status == 'CLOSED' and user_id != request.user.id:
+                # Same rule as close_report: only the reporter may close
+                errors[report_id] = 'Not authorized to close this report'
+            elif not transitions.can_transition(current, new_status):
+                errors[report_id] = f'Cannot change status from {current} to {new_status}'
+            else:
+                done.add(report_id)
+                geohashes.add(geohash)
+                owners.add((user_id, worker_id))
+
+        updates = {'status': new_status}
+        worker_notes = request.data.get('worker_notes')
+        if worker_notes:
+            updates['worker_notes'] = worker_notes
+
+        with transaction.atomic():
+            reports = GarbageReport.objects.filter(id__in=done)
+            with unviewed.tracking(reports), rollups.tracking(reports):
+                # Conditional like transitions.transition, in case a status
+                # changed since it was checked above
+                updated = reports.filter(status__in=transitions.sources_for(new_status)).update(**updates)
+            tiles.invalidate(geohashes)
+            listcache.invalidate_reports(owners)
+            if updated != len(done):
+                changed = done - set(reports.filter(status=new_status).values_list('id', flat=True))
+                errors.update({report_id: 'Report was changed by someone else' for report_id in changed})
+                done -= changed
+        return self.bulk_response(requested, done, errors)
+
+    @action(detail=False, methods=['post'])
+    def bulk_mark_viewed(self, request):
+        targets = self.get_bulk_targets(request)
+        if isinstance(targets, Response):
+            return targets
+        requested, permitted = targets
+
+        with transaction.atomic():
+            reports = GarbageReport.objects.filter(id__in=permitted)
+            with unviewed.tracking(reports):
+                reports.update(is_viewed=True)
+            listcache.invalidate_reports(reports.values_list('user_id', 'assigned_worker_id').distinct())
+        return self.bulk_response(requested, set(permitted))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_reports(request):
+    """
+    Stream reports as ?output=csv|ndjson|geojson, filtered by ?zone=,
+    ?status= and ?from=/?to= (YYYY-MM-DD, inclusive)
+    """
+    params = request.query_params
+    output = params.get('output', 'csv')
+    try:
+        start, end = (
+            date.fromisoformat(value) if value else None
+            for value in (params.get('from'), params.get('to'))
+        )
+        queryset = exports.export_queryset(params.get('zone'), params.get('status'), start, end)
+        chunks = exports.stream(output, queryset)
+    except ValueError:
+        return Response({'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    except exports.ExportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(chunks, content_type=exports.CONTENT_TYPES[output])
+    filename = f"reports-{timezone.localdate().isoformat()}.{output}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+def report_tile(request, z, x, y):
+    """Clustered report counts by status for one z/x/y map tile"""
+    if not tiles.valid_tile(z, x, y):
+        return Response({'error': 'Invalid tile'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(tiles.get_tile(z, x, y))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def zone_analytics(request):
+    """Per-zone and per-worker dashboard figures, ?from= and ?to= as YYYY-MM-DD"""
+    try:
+        start, end = (
+            date.fromisoformat(value) if value else None
+            for value in (request.query_params.get('from'), request.query_params.get('to'))
+        )
+    except ValueError:
+        return Response({'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(analytics.zone_analytics(start, end))
+
+
+def video_upload_data(upload):
+    return {
+        'id': str(upload.id),
+        'report': upload.report_id,
+        'offset': upload.offset,
+        'size': upload.size,
+        'status': upload.status,
+        'max_chunk_size': MAX_CHUNK_SIZE,
+    }
+
+
+class VideoUploadView(APIView):
+    """
+    HEAD/GET returns the acknowledged offset. PUT appends the raw request body
+    as the next chunk; send Upload-Offset and Upload-Checksum (hex SHA-256).
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = []  # The body is read straight from the request stream
+
+    def get_upload(self, request, upload_id):
+        try:
+            return VideoUpload.objects.get(id=upload_id, report__user=request.user)
+        except VideoUpload.DoesNotExist:
+            return None
+
+    def get(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(video_upload_data(upload), headers={'Upload-Offset': str(upload.offset)})
+
+    def head(self, request, upload_id):
+        return self.get(request, upload_id)
+
+    def put(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'Content-Length and Upload-Offset headers are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            upload = append_chunk(
+                upload, request.stream, length, offset, request.headers.get('Upload-Checksum')
+            )
+        except UploadError as e:
+            # Nothing from a rejected chunk is kept, the offset is unchanged
+            return Response(
+                {'error': str(e), 'offset': upload.offset},
+                status=e.status,
+                headers={'Upload-Offset': str(upload.offset)}
+            )
+        return Response(video_upload_data(upload), headers={'Upload-Offset': str(upload.offset)})
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_unviewed_reports_count(request):
     """Get count of unviewed reports for a worker"""
-    try:
-        worker_profile = request.user.workerprofile
-        count = GarbageReport.objects.filter(
-            assigned_worker=worker_profile,
-            is_viewed=False,
-            status='SENT'  # Only count reports with SENT status
-        ).count()
-        return Response({'count': count})
-    except WorkerProfile.DoesNotExist:
+    count = unviewed.get_count(request.user)
+    if count == unviewed.NOT_A_WORKER:
         return Response(
             {'error': 'User is not a worker'},
             status=status.HTTP_403_FORBIDDEN
-        )  
+        )
+    return Response({'count': count})
 
-    
+
+def authenticate_stream_request(request):
+    """
+    JWT auth for the event stream. EventSource cannot set headers, so the
+    access token may also be passed as ?token=
+    """
+    auth = JWTAuthentication()
+    try:
+        result = auth.authenticate(request)
+        if result is None and request.GET.get('token'):
+            token = auth.get_validated_token(request.GET['token'])
+            result = (auth.get_user(token), token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+async def unviewed_reports_stream(request):
+    """
+    Server-sent events stream of a worker's unviewed count. Sends the count on
+    connect and again whenever it changes, for UNVIEWED_STREAM_MAX_DURATION
+    seconds; then the stream ends and EventSource reconnects. Needs an ASGI
+    server (see backend/asgi.py): WSGI would buffer the whole stream on a
+    worker thread, so there clients are told to poll /api/unviewed-reports/.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Event stream needs the ASGI server, poll /api/unviewed-reports/ instead'},
+            status=501
+        )
+    user = await sync_to_async(authenticate_stream_request)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    count = await sync_to_async(unviewed.get_count)(user)
+    if count == unviewed.NOT_A_WORKER:
+        return JsonResponse({'error': 'User is not a worker'}, status=403)
+
+    interval = getattr(settings, 'UNVIEWED_STREAM_INTERVAL', 2)
+    heartbeat = getattr(settings, 'UNVIEWED_STREAM_HEARTBEAT', 15)
+    max_duration = getattr(settings, 'UNVIEWED_STREAM_MAX_DURATION', 300)
+
+    async def events():
+        last = None
+        idle = elapsed = 0
+        while elapsed < max_duration:
+            count = await sync_to_async(unviewed.get_count)(user)
+            if count != last:
+                yield f"event: count\ndata: {json.dumps({'count': count})}\n\n"
+                last = count
+                idle = 0
+            elif idle >= heartbeat:
+                yield ": keepalive\n\n"
+                idle = 0
+            await asyncio.sleep(interval)
+            idle += interval
+            elapsed += interval
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Files under MEDIA_URL: signed, cacheable and seekable, see api/media.py"""
+    try:
+        if media.SIGNED:
+            media.check_signature(path, request.GET)
+        file_path, stat = media.open_media(path)
+        etag, cache_control = media.validators(path, stat)
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(stat.st_mtime),
+            'Cache-Control': cache_control,
+            'Accept-Ranges': 'bytes',
+        }
+        if media.not_modified(request, etag, stat):
+            return HttpResponseNotModified(headers=headers)
+
+        content_type = media.content_type(path)
+        if media.ACCEL == 'x-accel-redirect':
+            # nginx sends the file, Range included, from an internal location
+            headers['X-Accel-Redirect'] = media.ACCEL_PREFIX + quote(path)
+            return HttpResponse(content_type=content_type, headers=headers)
+        if media.ACCEL == 'x-sendfile':
+            headers['X-Sendfile'] = file_path
+            return HttpResponse(content_type=content_type, headers=headers)
+
+        span = media.byte_range(request, etag, stat, stat.st_size)
+    except media.MediaError as e:
+        return JsonResponse({'error': str(e)}, status=e.status, headers=e.headers)
+
+    if span is None:
+        return FileResponse(open(file_path, 'rb'), content_type=content_type, headers=headers)
+    start, end = span
+    headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    headers['Content-Length'] = str(end - start + 1)
+    return StreamingHttpResponse(
+        media.read_range(file_path, start, end - start + 1),
+        status=206, content_type=content_type, headers=headers,
+    )
+
+
+@require_safe
+def metrics_view(request):
+    """
+    Prometheus scrape of api/metrics.py. Needs METRICS_TOKEN as a bearer
+    token, and is closed while none is set: behind the proxy every request
+    comes from a local address, and DEBUG is on in the shipped settings.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return JsonResponse({'error': 'Set METRICS_TOKEN to enable metrics'}, status=403)
+    header = request.headers.get('Authorization', '')
+    if not constant_time_compare(header, f'Bearer {token}'):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,256 @@
+"""
+Zone lookup for the campus zone polygons in zone.json.
+
+The GeoJSON is parsed once per process into a ZoneIndex. Every polygon part
+of every feature gets a bounding box and is bucketed into a uniform grid, so a
+lookup only runs the exact ray cast against the one or two polygons whose
+grid cell and bounding box contain the point.
+"""
+import json
+import os
+import threading
+
+from django.conf import settings
+
+GRID_SIZE = 32
+
+
+def point_in_ring(x, y, ring):
+    """
+    Determine if a point is inside a closed ring using ray casting
+    """
+    n = len(ring)
+    inside = False
+
+    p1x, p1y = ring[0]
+    for i in range(1, n + 1):
+        p2x, p2y = ring[i % n]
+        if y > min(p1y, p2y):
+            if y <= max(p1y, p2y):
+                if x <= max(p1x, p2x):
+                    if p1y != p2y:
+                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+                        if p1x == p2x or x <= xinters:
+                            inside = not inside
+        p1x, p1y = p2x, p2y
+
+    return inside
+
+
+def points_in_ring_np(xs, ys, ring):
+    """
+    NumPy version of point_in_ring over arrays of points, one edge at a time
+    """
+    import numpy as np
+
+    inside = np.zeros(xs.shape, dtype=bool)
+    n = len(ring)
+    for i in range(1, n + 1):
+        p1x, p1y = ring[i - 1]
+        p2x, p2y = ring[i % n]
+        if p1y == p2y:
+            continue
+        crosses = (ys > min(p1y, p2y)) & (ys <= max(p1y, p2y)) & (xs <= max(p1x, p2x))
+        if p1x != p2x:
+            xinters = (ys - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+            crosses &= xs <= xinters
+        inside ^= crosses
+    return inside
+
+
+class ZonePolygon:
+    """
+    One polygon part of a zone feature: an exterior ring plus any holes
+    """
+
+    def __init__(self, zone_number, order, rings):
+        self.zone_number = zone_number
+        self.order = order
+        self.exterior = [tuple(p[:2]) for p in rings[0]]
+        self.holes = [[tuple(p[:2]) for p in ring] for ring in rings[1:]]
+        xs = [p[0] for p in self.exterior]
+        ys = [p[1] for p in self.exterior]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def bbox_contains(self, x, y):
+        min_x, min_y, max_x, max_y = self.bbox
+        return min_x <= x <= max_x and min_y <= y <= max_y
+
+    def contains(self, x, y):
+        if not self.bbox_contains(x, y):
+            return False
+        if not point_in_ring(x, y, self.exterior):
+            return False
+        return not any(point_in_ring(x, y, hole) for hole in self.holes)
+
+
+class ZoneIndex:
+    """
+    Grid index over all zone polygons, built once from a GeoJSON document
+    """
+
+    def __init__(self, geojson, grid_size=GRID_SIZE):
+        self.polygons = []
+        for order, feature in enumerate(geojson.get('features', [])):
+            zone_number = feature['properties']['Zone_No']
+            geometry = feature['geometry']
+            if geometry['type'] == 'Polygon':
+                parts = [geometry['coordinates']]
+            elif geometry['type'] == 'MultiPolygon':
+                parts = geometry['coordinates']
+            else:
+                continue
+            for rings in parts:
+                if rings and rings[0]:
+                    self.polygons.append(ZonePolygon(zone_number, order, rings))
+
+        self.grid_size = grid_size
+        self.cells = {}
+        if not self.polygons:
+            self.bbox = None
+            return
+
+        self.bbox = (
+            min(p.bbox[0] for p in self.polygons),
+            min(p.bbox[1] for p in self.polygons),
+            max(p.bbox[2] for p in self.polygons),
+            max(p.bbox[3] for p in self.polygons),
+        )
+        min_x, min_y, max_x, max_y = self.bbox
+        self.cell_width = (max_x - min_x) / grid_size or 1.0
+        self.cell_height = (max_y - min_y) / grid_size or 1.0
+
+        for polygon in self.polygons:
+            col_start, row_start = self._cell(polygon.bbox[0], polygon.bbox[1])
+            col_end, row_end = self._cell(polygon.bbox[2], polygon.bbox[3])
+            for col in range(col_start, col_end + 1):
+                for row in range(row_start, row_end + 1):
+                    self.cells.setdefault((col, row), []).append(polygon)
+
+        # Keep feature order so overlapping zones resolve like a linear scan
+        for candidates in self.cells.values():
+            candidates.sort(key=lambda p: p.order)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _cell(self, x, y):
+        min_x, min_y = self.bbox[0], self.bbox[1]
+        col = int((x - min_x) / self.cell_width)
+        row = int((y - min_y) / self.cell_height)
+        return (
+            min(max(col, 0), self.grid_size - 1),
+            min(max(row, 0), self.grid_size - 1),
+        )
+
+    def candidates(self, x, y):
+        """Polygons whose grid cell and bounding box contain the point"""
+        if self.bbox is None:
+            return []
+        min_x, min_y, max_x, max_y = self.bbox
+        if not (min_x <= x <= max_x and min_y <= y <= max_y):
+            return []
+        return [p for p in self.cells.get(self._cell(x, y), []) if p.bbox_contains(x, y)]
+
+    def locate(self, longitude, latitude):
+        """Return the zone number containing the point, or None"""
+        for polygon in self.candidates(longitude, latitude):
+            if polygon.contains(longitude, latitude):
+                return polygon.zone_number
+        return None
+
+    def locate_many(self, longitudes, latitudes):
+        """
+        Vectorized lookup for many points at once. Requires NumPy.
+        Returns an integer array of zone numbers, 0 where no zone matches.
+        """
+        import numpy as np
+
+        xs = np.asarray(longitudes, dtype=float)
+        ys = np.asarray(latitudes, dtype=float)
+        zones = np.zeros(xs.shape, dtype=int)
+
+        for polygon in sorted(self.polygons, key=lambda p: p.order):
+            min_x, min_y, max_x, max_y = polygon.bbox
+            pending = np.flatnonzero(
+                (zones == 0) & (xs >= min_x) & (xs <= max_x) & (ys >= min_y) & (ys <= max_y)
+            )
+            if not pending.size:
+                continue
+            px, py = xs[pending], ys[pending]
+            inside = points_in_ring_np(px, py, polygon.exterior)
+            for hole in polygon.holes:
+                inside &= ~points_in_ring_np(px, py, hole)
+            zones[pending[inside]] = polygon.zone_number
+
+        return zones
+
+
+_zone_index = None
+_zone_index_lock = threading.Lock()
+
+
+def get_zone_geojson_path():
+    return getattr(settings, 'ZONE_GEOJSON_PATH', os.path.join(settings.BASE_DIR, 'zone.json'))
+
+
+def get_zone_index():
+    """Return the process-wide ZoneIndex, loading zone.json on first use"""
+    global _zone_index
+    if _zone_index is None:
+        with _zone_index_lock:
+            if _zone_index is None:
+                _zone_index = ZoneIndex.from_file(get_zone_geojson_path())
+    return _zone_index
+
+
+def reset_zone_index():
+    """Drop the cached index so the next lookup re-reads zone.json"""
+    global _zone_index
+    with _zone_index_lock:
+        _zone_index = None
+
+
+GEOMETRY_TABLE = 'api_zone_geometry'
+
+
+def postgis_available(connection):
+    """True when connection is PostgreSQL with the PostGIS extension installed"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")
+        return cursor.fetchone() is not None
+
+
+class PostGISZoneLocator:
+    """
+    Zone lookup against the GiST-indexed zone table written by the
+    load_zone_geometries command. Same result as ZoneIndex.locate; useful
+    when the zones change often or are shared with other services.
+    """
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    def locate(self, longitude, latitude):
+        from django.db import connections
+
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT zone_number FROM {GEOMETRY_TABLE} "
+                "WHERE ST_Covers(geom, ST_SetSRID(ST_MakePoint(%s, %s), 4326)) "
+                "ORDER BY position LIMIT 1",
+                [longitude, latitude],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def get_zone_locator():
+    """PostGIS lookup when ZONE_LOOKUP_BACKEND = 'postgis', the in-memory index otherwise"""
+    if getattr(settings, 'ZONE_LOOKUP_BACKEND', 'memory') == 'postgis':
+        return PostGISZoneLocator()
+    return get_zone_index()
@@ -3,6 +3,10 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server, e.g. ``uvicorn backend.asgi:application``, for
+the unviewed-count event stream (/api/unviewed-reports/stream/) to work; under
+runserver or WSGI that endpoint answers 501 and clients poll instead.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -96,12 +98,87 @@ SECURE_CONTENT_TYPE_NOSNIFF = True  # Prevents MIME type sniffing
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PostgreSQL when POSTGRES_HOST is set, SQLite otherwise (local development).
+# POSTGRES_REPLICA_HOST adds a read replica, see api/routers.py.
+if os.environ.get('POSTGRES_HOST'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'cleanandgreen'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ['POSTGRES_HOST'],
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # Keep connections open between requests, and check them before
+            # reuse so a restarted server doesn't fail the next request
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
     }
-}
+    if os.environ.get('DB_POOL_MAX_SIZE'):
+        # psycopg 3 connection pool per worker process; replaces CONN_MAX_AGE
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ['DB_POOL_MAX_SIZE']),
+            'timeout': 10,
+        }
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # WAL lets readers run alongside the writer; IMMEDIATE takes
+                # the write lock when a transaction starts, and writers wait
+                # up to timeout seconds for it instead of failing with
+                # "database is locked". Every atomic() block then holds that
+                # lock, so keep them short: mail is sent and upload chunks
+                # are received outside any transaction, and nothing may
+                # wait on the network or a client while one is open.
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+
+# Shared cache for OTPs, rate limits, list pages and counters. Without
+# REDIS_URL every process has its own local memory cache, which is only
+# right for a single-process development server.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Zone -> worker mapping shared between processes, see api/directory.py
+ZONE_DIRECTORY_CACHE = 'default'
+
+# 'postgis' looks zones up in the api_zone_geometry table (see the
+# load_zone_geometries command) instead of the in-memory index
+ZONE_LOOKUP_BACKEND = os.environ.get('ZONE_LOOKUP_BACKEND', 'memory')
 
 
 # Password validation
@@ -123,6 +200,35 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+AUTHENTICATION_BACKENDS = [
+    # Email login for the API, see api/backends.py
+    'api.backends.EmailBackend',
+    # Username login for the admin
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Iterations of the default PBKDF2 hasher; lower it to trade hash strength
+# for login throughput (see the benchmark_login command). Stored hashes
+# are upgraded or downgraded to the configured count on the next login.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 0)) or None
+PASSWORD_HASHERS = [
+    'api.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Failed logins allowed per account: (attempts, window in seconds)
+LOGIN_FAILURE_RATE = (10, 900)
+
+# Reverse proxies in front of the app, and the header they append the client
+# address to (api/ratelimit.py client_ip). 0, the default, uses REMOTE_ADDR:
+# without a proxy the header comes from the client and can't be trusted.
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+CLIENT_IP_HEADER = os.environ.get('CLIENT_IP_HEADER', 'X-Forwarded-For')
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -142,6 +248,28 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are stored once per distinct content, see api/storage.py
+STORAGES = {
+    'default': {'BACKEND': 'api.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# Unreferenced blobs younger than this are left to the gc_media command
+BLOB_GRACE_PERIOD = 3600
+
+# Media links are signed and expire (api/media.py). MEDIA_ACCEL hands the
+# transfer to the front proxy: 'x-accel-redirect' (nginx, with an internal
+# location at MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT) or 'x-sendfile'.
+MEDIA_SIGNED_URLS = True
+MEDIA_URL_TTL = 6 * 3600
+MEDIA_ACCEL = os.environ.get('MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Per-view latency, query and payload metrics (api/metrics.py), scraped from
+# /metrics with METRICS_TOKEN as a bearer token (closed without one). Slower
+# requests are logged with their slowest queries.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_SLOW_REQUEST_SECONDS = 1.0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
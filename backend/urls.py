@@ -4,18 +4,24 @@ from rest_framework.routers import DefaultRouter
 from api import views
 from api.views import GarbageReportViewSet, send_otp, verify_otp, login, update_report_status
 from django.conf import settings
-from django.conf.urls.static import static
 
 router = DefaultRouter()
 router.register(r'reports', GarbageReportViewSet, basename='garbage-reports')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/reports/tiles/<int:z>/<int:x>/<int:y>/', views.report_tile, name='report-tile'),
+    path('api/reports/export/', views.export_reports, name='report-export'),
     path('api/', include(router.urls)),
     path('api/send-otp/', send_otp),
     path('api/verify-otp/', verify_otp),
     path('api/login/', login),
     path('api/reports/<int:report_id>/status/', update_report_status),
     path('api/unviewed-reports/', views.get_unviewed_reports_count, name='unviewed-reports'),
-
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('api/analytics/zones/', views.zone_analytics, name='zone-analytics'),
+    path('api/unviewed-reports/stream/', views.unviewed_reports_stream, name='unviewed-reports-stream'),
+    path('api/video-uploads/<uuid:upload_id>/', views.VideoUploadView.as_view(), name='video-upload'),
+    # Signed, range-capable media; handed to the proxy when MEDIA_ACCEL is set
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", views.serve_media, name='media'),
+    path('metrics', views.metrics_view, name='metrics'),
+]
@@ -5,24 +5,26 @@ def delete_reports(report_ids, access_token):
         'Authorization': f'Bearer {access_token}'
     }
     
+    # One request for the whole batch instead of one DELETE per report
+    url = 'http://10.96.28.189:8000/api/reports/bulk_delete/'
+    try:
+        response = requests.post(url, json={'ids': report_ids}, headers=headers)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Error deleting reports: {str(e)}")
+        return [
+            {'report_id': report_id, 'status': None, 'error': str(e)}
+            for report_id in report_ids
+        ]
+
     results = []
-    for report_id in report_ids:
-        url = f'http://10.96.28.189:8000/api/reports/{report_id}/'
-        try:
-            response = requests.delete(url, headers=headers)
-            results.append({
-                'report_id': report_id,
-                'status': response.status_code,
-                'success': response.ok
-            })
-            print(f"Deleting report {report_id}: {'Success' if response.ok else 'Failed'} (Status: {response.status_code})")
-        except Exception as e:
-            print(f"Error deleting report {report_id}: {str(e)}")
-            results.append({
-                'report_id': report_id,
-                'status': None,
-                'error': str(e)
-            })
+    for result in response.json()['results']:
+        results.append({
+            'report_id': result['id'],
+            'status': response.status_code,
+            'success': result['success']
+        })
+        print(f"Deleting report {result['id']}: {'Success' if result['success'] else 'Failed'} ({result.get('error', 'OK')})")
     
     return results
 